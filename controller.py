@@ -0,0 +1,5 @@
+# controller.py
+
+from traffic_flow import alias
+
+alias(__name__, 'traffic_flow.controller')
@@ -0,0 +1,5 @@
+# hierarchy.py
+
+from traffic_flow import alias
+
+alias(__name__, 'traffic_flow.hierarchy')
@@ -0,0 +1,5 @@
+# map_generator.py
+
+from traffic_flow import alias
+
+alias(__name__, 'traffic_flow.map_generator')
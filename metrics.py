@@ -0,0 +1,5 @@
+# metrics.py
+
+from traffic_flow import alias
+
+alias(__name__, 'traffic_flow.metrics')
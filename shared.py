@@ -0,0 +1,5 @@
+# shared.py
+
+from traffic_flow import alias
+
+alias(__name__, 'traffic_flow.shared')
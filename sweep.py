@@ -0,0 +1,5 @@
+# sweep.py
+
+from traffic_flow import alias
+
+alias(__name__, 'traffic_flow.sweep')
@@ -0,0 +1,65 @@
+# api.py
+
+"""
+The engine without the command line or the viewer: layouts, demand,
+simulation and the GA, importable by services and worker processes without
+loading Tk. Nothing here keeps module state; every call builds its own
+CarMap, so calls on different layouts or threads do not share cars.
+
+    >>> from traffic_flow.api import loadLayout, Demand, evaluate, optimize
+    >>> mapLayout = loadLayout('grids')
+    >>> cars = Demand(mapLayout).uniform(100)
+    >>> g = optimize(mapLayout, cars, 20, 10)
+    >>> evaluate(mapLayout, cars, g.bestGenes(1)[0])
+"""
+
+from .layout import Layout, RoadGraph, getLayout
+from .car import CarMap
+from .simulate import Simulation, Scenario
+from .ga import Gene, GeneInfo, GeneEvolve
+from .generation import Generation
+from .demand import Demand, saveDemand, loadDemand
+from .reroute import Router
+from .controller import ActuatedController
+from .hierarchy import ContractionHierarchy, loadHierarchy
+from .descent import CoordinateDescent
+
+# The classes and functions above are re-exported for callers of this module.
+__all__ = [
+    'Layout', 'RoadGraph', 'getLayout', 'CarMap', 'Simulation', 'Scenario', 'Gene', 'GeneInfo', 'GeneEvolve',
+    'Generation', 'Demand', 'saveDemand', 'loadDemand', 'Router', 'ActuatedController', 'ContractionHierarchy',
+    'loadHierarchy', 'CoordinateDescent', 'loadLayout', 'evaluate', 'optimize',
+]
+
+
+def loadLayout(name):
+    """The layout called `name` (see `layout.getLayout`); unlike it, raises if there is none."""
+    mapLayout = getLayout(name)
+    if mapLayout is None:
+        raise Exception(f"The layout '{name}' can't be found.")
+    return mapLayout
+
+
+def evaluate(mapLayout, cars, geneStr, reroute=False, actuated=False, limit=10000):
+    """
+    Simulate `cars`, (start, end) cell pairs, under the lights of `geneStr`.
+    Returns (total, average) travel time, or (-1, -1) after `limit` ticks.
+    """
+    carmap = CarMap(mapLayout, None)
+    scenario = Scenario(carmap, cars, Router(carmap) if reroute else None,
+                        ActuatedController if actuated else None)
+    return scenario.evaluate(Gene(mapLayout.getTrafficLights(), False, geneStr), limit)
+
+
+def optimize(mapLayout, cars, geneNumber, roundNumber, reroute=False, actuated=False, **options):
+    """
+    Evolve `geneNumber` genes for `roundNumber` generations and return the
+    finished Generation (`best`, `curve`, `bestGenes`, `stopReason`).
+    `options` are passed on to Generation; nothing is printed by default.
+    """
+    options.setdefault('verbose', 0)
+    carmap = CarMap(mapLayout, None)
+    g = Generation(mapLayout, carmap, cars, geneNumber, roundNumber, Router(carmap) if reroute else None,
+                   ActuatedController if actuated else None, **options)
+    g.run()
+    return g
@@ -0,0 +1,301 @@
+# car.py
+
+import heapq
+from .layout import getLayout
+from .game import Info
+
+class TrafficLight:
+    """
+    A traffic light in the map.
+    """
+
+    def __init__(self, number, pos):
+        self.number = number
+        self.pos = pos
+        self.isGreen = False
+
+    def update(self, isGreen):
+        self.isGreen = isGreen
+
+
+class Car:
+    """
+    A car in the map.
+    """
+
+    def __init__(self, number, pos, way, roadIndex):
+        self.number = number
+        self.pos = pos
+        self.way = way
+        self.roadIndex = roadIndex
+        self.display = True
+
+    def noDisplay(self):
+        self.display = False
+
+
+class CarMap:
+    """
+    A map to store the positions of cars.
+    """
+
+    SUCCESS = 'success'
+    BLOCKED_BY_OTHER_CAR = 'blocked by other car'
+    BLOCKED_BY_TRAFFIC_LIGHT = 'blocked by traffic light'
+    NOT_SELECT_ROAD = 'not select road'
+    NOT_AT_THE_END_OF_ROAD = 'not at the end of road'
+
+    def __init__(self, mapLayout, geneInfo):
+        if isinstance(mapLayout, str):
+            mapLayout = getLayout(mapLayout)
+
+        self.mapInfo = mapLayout.mapInfo
+        self.intersections = mapLayout.intersections
+        self.crossroads = mapLayout.crossroads
+        self.roads = mapLayout.roads
+        self.graph = mapLayout.compile()
+        self.cars = []
+        self.trafficlights = []
+        self.geneInfo = geneInfo
+        self.controller = geneInfo
+        self.initialTrafficLights()
+        self.data = [[None for _ in range(r.getDistance())] for r in self.roads]
+        self.occupancy = [0] * len(self.roads)
+        self.inflow = [0] * len(self.roads)
+        self.outflow = [0] * len(self.roads)
+        self.watch = [-1] * len(self.roads)
+        self.queues = [0] * len(self.roads)
+        self.queueChanged = set()
+        self.greens = 0
+        self.turnedGreen = []
+        self.lightsShown = False
+        self.hierarchy = None
+
+    def initialCars(self, cars):
+        for c in cars:
+            (x, y) = c
+            roadIndex = self.getRoadIndex(x, y)
+            if roadIndex is None:
+                return False
+            (r, i) = roadIndex
+            if self.data[r][i] is not None:
+                raise Exception(f'Position {(x, y)} has been occupied.')
+            number = len(self.cars)
+            car = Car(number, c, self.roads[r].getWayByIndex(i), (r, i))
+            self.data[r][i] = car
+            self.occupancy[r] += 1
+            if 0 <= self.watch[r] <= i:
+                self.queues[r] += 1
+                self.queueChanged.add(r)
+            self.cars.append(car)
+        return True
+
+    def clearAllCars(self):
+        self.cars.clear()
+        self.data = [[None for _ in range(r.getDistance())] for r in self.roads]
+        self.occupancy = [0] * len(self.roads)
+        self.countDetectors()
+
+    def setDetectors(self, zone):
+        """
+        Count the cars in the last `zone` cells of every road into an intersection.
+        Roads whose count changed are collected in `queueChanged`.
+        """
+        self.watch = [-1] * len(self.roads)
+        for it in self.intersections:
+            for r in it.getInRoads():
+                self.watch[r] = max(0, self.roads[r].getDistance() - zone)
+        self.countDetectors()
+
+    def countDetectors(self):
+        self.queues = [0] * len(self.roads)
+        self.queueChanged = set()
+        for car in self.cars:
+            if car.display:
+                r, i = car.roadIndex
+                if 0 <= self.watch[r] <= i:
+                    self.queues[r] += 1
+                    self.queueChanged.add(r)
+
+    def getInfo(self, x, y):
+        return self.mapInfo.get(x, y)
+
+    def getRoadIndex(self, x, y):
+        info = self.getInfo(x, y)
+        if info[0] != Info.ROAD:
+            return None
+        index = self.roads[info[1]].getIndexOfRoad((x, y))
+        return (info[1], index)
+
+    def getDirection(self, start, end):
+        (startRoad, si) = self.getRoadIndex(*start)
+        (endRoad, ei) = self.getRoadIndex(*end)
+        sameway = startRoad == endRoad and si > ei
+
+        if self.hierarchy is not None:
+            distance, direction = self.hierarchy.route(startRoad, endRoad, sameway)
+        else:
+            distance, direction = self.search(startRoad, endRoad, sameway)
+
+        length = self.graph.length
+        result = [(r, length[r]) for r in direction]
+        distance += result[0][1] - si - result[-1][1] + ei
+        result[0] = (result[0][0], result[0][1] - si)
+        result[-1] = (result[-1][0], ei)
+
+        return distance, result
+
+    def search(self, startRoad, endRoad, sameway):
+        """Dijkstra over the whole road graph; `sameway` goes around back to `startRoad`."""
+        distance = 0
+        prev = {}
+        pq = [(0, startRoad)]
+        twice = sameway
+
+        length, succ, succOffset = self.graph.length, self.graph.succ, self.graph.succOffset
+        while pq:
+            (dist, number) = heapq.heappop(pq)
+            if number == endRoad:
+                if twice:
+                    twice = False
+                else:
+                    distance = dist
+                    break
+
+            for k in range(succOffset[number], succOffset[number + 1]):
+                rn = succ[k]
+                if rn not in prev:
+                    prev[rn] = number
+                    heapq.heappush(pq, (dist + length[rn], rn))
+
+        now = endRoad
+        direction = [now]
+        twice = sameway
+
+        while True:
+            if now == startRoad:
+                if twice:
+                    twice = False
+                else:
+                    break
+            now = prev[now]
+            direction.append(now)
+
+        direction.reverse()
+        return distance, direction
+
+    def move(self, number):
+        car = self.cars[number]
+        r, i = car.roadIndex
+        road = self.roads[r]
+        pos = road.getPosByIndex(i + 1)
+        if pos is None:
+            return self.NOT_SELECT_ROAD, road.getEnd()
+        if self.data[r][i + 1] is not None:
+            return self.BLOCKED_BY_OTHER_CAR, self.data[r][i + 1].number
+
+        car.pos = pos
+        car.way = road.getWayByIndex(i + 1)
+        car.roadIndex = (r, i + 1)
+        self.data[r][i] = None
+        self.data[r][i + 1] = car
+        if i + 1 == self.watch[r]:
+            self.queues[r] += 1
+            self.queueChanged.add(r)
+        return self.SUCCESS, pos
+
+    def moveTo(self, number, roadNumber, tick):
+        car = self.cars[number]
+        r, i = car.roadIndex
+        road = self.roads[r]
+
+        if road.getDistance() != i + 1:
+            return self.NOT_AT_THE_END_OF_ROAD
+
+        if self.graph.isLight[r] and not self.controller.isGreen(r, tick):
+            return self.BLOCKED_BY_TRAFFIC_LIGHT
+
+        if self.data[roadNumber][0] is not None:
+            return self.BLOCKED_BY_OTHER_CAR, self.data[roadNumber][0].number
+
+        road = self.roads[roadNumber]
+        car.pos = road.getPosByIndex(0)
+        car.way = road.getWayByIndex(0)
+        car.roadIndex = (roadNumber, 0)
+        self.data[r][i] = None
+        self.data[roadNumber][0] = car
+        self.occupancy[r] -= 1
+        self.occupancy[roadNumber] += 1
+        self.outflow[r] += 1
+        self.inflow[roadNumber] += 1
+        if self.watch[r] >= 0:
+            self.queues[r] -= 1
+            self.queueChanged.add(r)
+        if self.watch[roadNumber] == 0:
+            self.queues[roadNumber] += 1
+            self.queueChanged.add(roadNumber)
+        return self.SUCCESS, car.pos
+
+    def remove(self, number):
+        car = self.cars[number]
+        car.noDisplay()
+        r, i = car.roadIndex
+        self.data[r][i] = None
+        self.occupancy[r] -= 1
+        if 0 <= self.watch[r] <= i:
+            self.queues[r] -= 1
+            self.queueChanged.add(r)
+
+    def initialTrafficLights(self):
+        for i in self.intersections:
+            for r in i.getInRoads():
+                road = self.roads[r]
+                pos = road.getPosByIndex(road.getDistance() - 1)
+                self.trafficlights.append(TrafficLight(r, pos))
+
+    def updateTrafficLights(self, tick):
+        """
+        Take the green roads of this tick from the controller as one bit mask,
+        `greens`. The roads whose light just turned green are kept in
+        `turnedGreen`; TrafficLight objects are only updated, for the lights
+        that flipped, after `showLights`.
+        """
+        self.controller.update(tick)
+        greens = self.controller.greenMask(tick)
+        flipped = greens ^ self.greens
+        self.greens = greens
+        self.turnedGreen = turnedGreen = []
+        turned = flipped & greens
+        while turned:
+            low = turned & -turned
+            turnedGreen.append(low.bit_length() - 1)
+            turned ^= low
+        if self.lightsShown:
+            while flipped:
+                low = flipped & -flipped
+                self.lightOf[low.bit_length() - 1].update(greens & low != 0)
+                flipped ^= low
+
+    def showLights(self):
+        """Keep `TrafficLight.isGreen` up to date, for displays reading the lights directly."""
+        self.lightsShown = True
+        self.lightOf = dict((tl.number, tl) for tl in self.trafficlights)
+        for tl in self.trafficlights:
+            tl.update((self.greens >> tl.number) & 1 == 1)
+
+    def updateGeneInfo(self, geneInfo):
+        self.geneInfo = geneInfo
+        self.controller = geneInfo
+
+    def setController(self, controller):
+        """Let `controller` decide the lights instead of the fixed gene cycles."""
+        self.controller = controller
+
+    def setHierarchy(self, hierarchy):
+        """Answer `getDirection` from a ContractionHierarchy of this map instead of searching it whole."""
+        self.hierarchy = hierarchy
+
+
+if __name__ == '__main__':
+    cm = CarMap('face', None)
+    print(cm.getDirection((16, 12), (30, 12)))
@@ -0,0 +1,100 @@
+# controller.py
+
+import heapq
+
+
+class ActuatedController(object):
+    """
+    Queue-responsive traffic lights for a CarMap.
+
+    Every intersection serves its in-roads in turn, like the fixed cycles of a
+    gene, but a phase ends early when its road has no queue left (gap-out) and
+    is kept while no other road is waiting. The gene's durations are the
+    maximum green of each phase, so the GA tunes the upper bounds. A phase
+    always lasts at least `minGreen` ticks.
+
+    Queues are the cars on the last `zone` cells of a road, counted by the
+    CarMap as cars move. Only intersections whose queues changed or whose
+    timer ran out are decided again in a tick.
+    """
+
+    def __init__(self, carMap, gene, minGreen=3, zone=5):
+        self.cm = carMap
+        self.minGreen = minGreen
+        self.phases = {}
+        self.maxGreen = {}
+        self.roadToLight = gene.roadToLight
+        for n, roads in gene.roadInfo.items():
+            self.phases[n] = roads
+            self.maxGreen[n] = gene.lightInfo[n]
+        self.phase = dict((n, 0) for n in self.phases)
+        self.start = dict((n, 0) for n in self.phases)
+        self.scheduled = dict((n, 0) for n in self.phases)
+        self.timers = []
+        self.switches = 0
+        self.mask = 0
+        for roads in self.phases.values():
+            if roads:
+                self.mask |= 1 << roads[0]
+        carMap.setDetectors(zone)
+        self.dirty = set(self.phases)
+
+    def update(self, tick):
+        """Decide the intersections whose queues changed or whose timer fired."""
+        dirty = self.dirty
+        for r in self.cm.queueChanged:
+            n = self.roadToLight.get(r)
+            if n is not None:
+                dirty.add(n)
+        self.cm.queueChanged.clear()
+
+        timers = self.timers
+        while timers and timers[0][0] <= tick:
+            (t, n) = heapq.heappop(timers)
+            if self.scheduled[n] == t:
+                dirty.add(n)
+
+        for n in dirty:
+            self.decide(n, tick)
+        dirty.clear()
+
+    def schedule(self, n, tick):
+        if self.scheduled[n] != tick:
+            self.scheduled[n] = tick
+            heapq.heappush(self.timers, (tick, n))
+
+    def decide(self, n, tick):
+        roads = self.phases[n]
+        current = self.phase[n]
+        elapsed = tick - self.start[n]
+        if elapsed < self.minGreen:
+            self.schedule(n, self.start[n] + self.minGreen)
+            return
+
+        queues = self.cm.queues
+        waiting = None
+        for k in range(1, len(roads)):
+            candidate = (current + k) % len(roads)
+            if queues[roads[candidate]] > 0:
+                waiting = candidate
+                break
+        if waiting is None:
+            # Nobody else is waiting: rest in green.
+            return
+
+        if elapsed >= self.maxGreen[n][current] or queues[roads[current]] == 0:
+            self.mask ^= (1 << roads[current]) | (1 << roads[waiting])
+            self.phase[n] = waiting
+            self.start[n] = tick
+            self.switches += 1
+            self.schedule(n, tick + self.minGreen)
+        else:
+            self.schedule(n, self.start[n] + self.maxGreen[n][current])
+
+    def greenMask(self, tick):
+        """The roads with a green light, bit `r` for road `r`."""
+        return self.mask
+
+    def isGreen(self, road, tick):
+        n = self.roadToLight[road]
+        return self.phases[n][self.phase[n]] == road
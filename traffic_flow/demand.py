@@ -0,0 +1,171 @@
+# demand.py
+
+import json
+import random
+import sys
+from array import array
+
+MAGIC = b'TFDEMAND1\n'
+
+
+class Demand(object):
+    """
+    Trips (start cell, end cell) for a layout, drawn over a flat index of its
+    road cells: cell `k` of the index is at (cellX[k], cellY[k]), and the cells
+    of road `r` are numbered from `roadOffset[r]` on. Start cells are always
+    distinct; end cells may repeat but never equal their start.
+
+    Sampling works on whole index ranges at once with `sample` and `choices`
+    of a `random.Random` (the `random` module by default), so its cost grows
+    with the number of trips, not with how full the map gets.
+    """
+
+    def __init__(self, layout):
+        self.cellX = array('i')
+        self.cellY = array('i')
+        self.roadOffset = array('i', [0])
+        for road in layout.roads:
+            for (x, y) in road.getPositions():
+                self.cellX.append(x)
+                self.cellY.append(y)
+            self.roadOffset.append(len(self.cellX))
+        self.cellN = len(self.cellX)
+
+    def pairs(self, starts, ends):
+        x, y = self.cellX, self.cellY
+        return [((x[s], y[s]), (x[e], y[e])) for s, e in zip(starts, ends)]
+
+    def uniform(self, number, rng=random):
+        """`number` trips between uniformly drawn cells."""
+        if number > self.cellN:
+            raise Exception(f'{number} cars do not fit on {self.cellN} road cells.')
+        if self.cellN < 2:
+            raise Exception('The layout needs at least two road cells.')
+        starts = distinct(self.cellN, number, rng)
+        # Draw among the other cells: shift every draw at or after the start by one.
+        ends = rng.choices(range(self.cellN - 1), k=number)
+        ends = [e + (e >= s) for s, e in zip(starts, ends)]
+        return self.pairs(starts, ends)
+
+    def gridZones(self, rows, cols, width, height):
+        """Zone of every cell when the map is cut into `rows` x `cols` rectangles, numbered row by row."""
+        zoneW = (width + cols - 1) // cols
+        zoneH = (height + rows - 1) // rows
+        return array('i', [(y // zoneH) * cols + x // zoneW for x, y in zip(self.cellX, self.cellY)])
+
+    def fromMatrix(self, number, zones, matrix, rng=random):
+        """
+        `number` trips following an origin-destination matrix: `zones` gives
+        the zone of every cell and `matrix[o][d]` the relative number of trips
+        from zone `o` to zone `d`.
+        """
+        zoneN = len(matrix)
+        cells = [array('i') for _ in range(zoneN)]
+        for k, z in enumerate(zones):
+            cells[z].append(k)
+        weights = [w for row in matrix for w in row]
+        for od, w in enumerate(weights):
+            if w > 0 and (not cells[od // zoneN] or not cells[od % zoneN]):
+                raise Exception(f'Zone {od // zoneN if not cells[od // zoneN] else od % zoneN} has trips but no road cells.')
+
+        # The zone pairs come out of `choices` in random order; each trip takes
+        # the next start of its origin zone and the next end of its destination.
+        ods = rng.choices(range(zoneN * zoneN), weights=weights, k=number)
+        leaving = [0] * zoneN
+        arriving = [0] * zoneN
+        for od in ods:
+            leaving[od // zoneN] += 1
+            arriving[od % zoneN] += 1
+        origins = []
+        destinations = []
+        for z in range(zoneN):
+            if leaving[z] > len(cells[z]):
+                raise Exception(f'{leaving[z]} cars do not fit on the {len(cells[z])} road cells of zone {z}.')
+            origins.append(iter([cells[z][k] for k in distinct(len(cells[z]), leaving[z], rng)]))
+            destinations.append(iter(rng.choices(cells[z], k=arriving[z]) if arriving[z] else ()))
+        starts = [next(origins[od // zoneN]) for od in ods]
+        ends = [next(destinations[od % zoneN]) for od in ods]
+
+        # A trip ending on its start cell stays within one zone: draw again there.
+        for t in [t for t, (s, e) in enumerate(zip(starts, ends)) if s == e]:
+            zone = cells[zones[starts[t]]]
+            if len(zone) == 1:
+                raise Exception(f'Zone {zones[starts[t]]} has no cell to go to from its only cell.')
+            while ends[t] == starts[t]:
+                ends[t] = rng.choice(zone)
+        return self.pairs(starts, ends)
+
+    def weighted(self, number, zones, originWeights, destinationWeights=None, rng=random):
+        """Trips whose origin and destination zones are drawn independently with the given zone weights."""
+        if destinationWeights is None:
+            destinationWeights = originWeights
+        matrix = [[o * d for d in destinationWeights] for o in originWeights]
+        return self.fromMatrix(number, zones, matrix, rng)
+
+
+def distinct(n, k, rng=random):
+    """
+    `k` distinct numbers of range(n) in random order. Up to half of the range,
+    drawing with `choices` and topping up the repeats is faster than `sample`.
+    """
+    if k > n // 2:
+        return rng.sample(range(n), k)
+    seen = dict.fromkeys(rng.choices(range(n), k=k))
+    while len(seen) < k:
+        seen.update(dict.fromkeys(rng.choices(range(n), k=k - len(seen))))
+    return list(seen)
+
+
+def saveDemand(trips, filename):
+    """Write trips as raw machine integers (start x, start y, end x, end y) after a one-line JSON header."""
+    flat = array('i')
+    for (sx, sy), (ex, ey) in trips:
+        flat.extend((sx, sy, ex, ey))
+    with open(filename, 'wb') as f:
+        f.write(MAGIC)
+        f.write(json.dumps({'byteorder': sys.byteorder, 'trips': len(trips)}).encode() + b'\n')
+        flat.tofile(f)
+
+
+def loadDemand(filename):
+    """Read the trips written by `saveDemand`, as ((start x, y), (end x, y)) pairs."""
+    with open(filename, 'rb') as f:
+        if f.readline() != MAGIC:
+            raise Exception(f'{filename} is not a demand file.')
+        header = json.loads(f.readline())
+        flat = array('i')
+        flat.frombytes(f.read())
+    if header['byteorder'] != sys.byteorder:
+        flat.byteswap()
+    if len(flat) != header['trips'] * 4:
+        raise Exception(f'{filename} is truncated.')
+    return [((flat[k], flat[k + 1]), (flat[k + 2], flat[k + 3])) for k in range(0, len(flat), 4)]
+
+
+if __name__ == '__main__':
+    """
+    > python demand.py 100000 saved/demand.bin
+    """
+    from time import time
+    from .map_generator import generateLayout
+
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    mapLayout = generateLayout('grid', rows=100, cols=100)
+    startTime = time()
+    demand = Demand(mapLayout)
+    print(f'{demand.cellN} road cells indexed in {time() - startTime:.3f}s')
+
+    startTime = time()
+    trips = demand.uniform(number)
+    print(f'{len(trips)} uniform trips in {time() - startTime:.3f}s')
+
+    zones = demand.gridZones(3, 3, mapLayout.width, mapLayout.height)
+    startTime = time()
+    trips = demand.weighted(number, zones, [1, 1, 1, 1, 2, 1, 1, 1, 1])
+    print(f'{len(trips)} trips weighted to the centre in {time() - startTime:.3f}s')
+
+    if len(sys.argv) > 2:
+        saveDemand(trips, sys.argv[2])
+        startTime = time()
+        assert loadDemand(sys.argv[2]) == trips
+        print(f'Saved to {sys.argv[2]} and read back in {time() - startTime:.3f}s')
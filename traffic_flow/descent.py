@@ -0,0 +1,324 @@
+# descent.py
+
+from time import time
+from .car import CarMap, Car as MapCar
+from .simulate import Simulation, Car, RouteTable
+from .ga import Gene, GeneInfo
+
+
+class TracedSimulation(Simulation):
+    """A Simulation keeping, for every car, the (tick, road) of each road it moved onto."""
+
+    def __init__(self, startEndList, carMap, routes=None):
+        Simulation.__init__(self, startEndList, carMap, routes=routes)
+        self.entries = [[] for _ in range(self.carN)]
+
+    def makeAMove(self, i, nextRoad):
+        state = Simulation.makeAMove(self, i, nextRoad)
+        if nextRoad != -1 and state[0] == CarMap.SUCCESS:
+            self.entries[i].append((self.tick, nextRoad))
+        return state
+
+
+class VisitCar(Car):
+    """A car following a given list of roads, from cell `si` of the first to cell `ei` of the last."""
+
+    def __init__(self, routes, roads, si, ei):
+        self.routes = routes
+        self.lengths = routes.lengths
+        self.setRoute(*routes.follow(roads, si, ei))
+        self.route = routes.roads
+        self.timeStamp = 0
+
+
+class RegionalSimulation(Simulation):
+    """
+    The cars of a region only, on a CarMap holding no other cars.
+
+    Each visit (entryTick, roads, si, ei) is a car coming into the region at
+    `entryTick` on cell `si` of `roads[0]`, as recorded by a run of the whole
+    map, and leaving it onto the last road, outside the region, which is taken
+    to be free. A car finding the entry cell taken waits outside until it clears.
+    Once nothing moves the clock skips to the next entry.
+    """
+
+    def __init__(self, carMap, routes, visits):
+        self.carN = len(visits)
+        self.cm = carMap
+        self.router = None
+        self.metrics = None
+        self.sleeping = True
+        self.routes = routes
+        self.entryTicks = [v[0] for v in visits]
+        self.cars = [VisitCar(routes, roads, si, ei) for (_, roads, si, ei) in visits]
+        carMap.cars = []
+        for i, (_, roads, si, _) in enumerate(visits):
+            car = MapCar(i, None, None, (roads[0], si))
+            car.noDisplay()
+            carMap.cars.append(car)
+        self.pending = sorted(range(self.carN), key=lambda i: self.entryTicks[i], reverse=True)
+        self.waiting = []
+        self.carCnt = self.carN
+        self.tick = 0
+        self.active = []
+        self.asleep = bytearray(self.carN)
+        self.lightWaiter = {}
+        self.waiters = {}
+        self.woken = []
+        self.changed = False
+
+    def place(self, i):
+        """Put car `i` on its entry cell if it is free."""
+        cm = self.cm
+        car = cm.cars[i]
+        r, k = car.roadIndex
+        if cm.data[r][k] is not None:
+            return False
+        road = cm.roads[r]
+        car.pos = road.getPosByIndex(k)
+        car.way = road.getWayByIndex(k)
+        car.display = True
+        cm.data[r][k] = car
+        cm.occupancy[r] += 1
+        return True
+
+    def step(self):
+        pending = self.pending
+        if pending and not (self.active or self.woken or self.waiting or self.lightWaiter):
+            self.tick = max(self.tick, self.entryTicks[pending[-1]])
+            self.cm.greens = self.cm.controller.greenMask(self.tick)
+        while pending and self.entryTicks[pending[-1]] <= self.tick:
+            self.waiting.append(pending.pop())
+        if self.waiting:
+            waiting = []
+            for i in self.waiting:
+                if self.place(i):
+                    self.cars[i].timeStamp = self.tick
+                    self.woken.append(i)
+                else:
+                    waiting.append(i)
+            self.waiting = waiting
+        Simulation.step(self)
+
+    def cost(self, limit):
+        """
+        Run until every car has left the region, or past tick `limit`, and
+        clear the map. Returns the ticks spent in the region by all cars,
+        counting a car still inside at `limit` until then.
+        """
+        self.runTicks(False, limit)
+        cm = self.cm
+        total = 0
+        for i, (car, c) in enumerate(zip(self.cars, cm.cars)):
+            if car.isArrived():
+                total += car.timeStamp - self.entryTicks[i]
+            else:
+                total += limit - self.entryTicks[i]
+                if c.display:
+                    r, k = c.roadIndex
+                    cm.data[r][k] = None
+                    cm.occupancy[r] -= 1
+        cm.cars = []
+        return total
+
+
+class CoordinateDescent(object):
+    """
+    Tunes the lights one intersection at a time instead of evolving whole genes.
+
+    The region of an intersection is every node within `radius` roads of it;
+    its roads are those ending at these nodes. For each intersection in turn,
+    each light duration is moved by `step` ticks both ways and the candidates
+    are scored by simulating the region alone, fed with the cars coming in as
+    they did in the latest run of the whole map (see RegionalSimulation). The
+    best candidate is kept when it saves time in the region.
+
+    Moves are checked every `validateEvery` kept moves by simulating the whole
+    map, which also records the flows into the regions for the next moves; if
+    the average travel time got worse, the lights go back to the last checked
+    ones. The run stops after `rounds` passes over the intersections, or after
+    a pass without moves. `best` and `curve` hold the checked averages.
+    """
+
+    MIN_DURATION = 2
+    MAX_DURATION = 20
+
+    def __init__(self, mapLayout, cars, geneStr=None, radius=1, step=3, rounds=5, validateEvery=10,
+                 limit=10000, verbose=1):
+        self.trafficInfo = mapLayout.getTrafficLights()
+        gene = Gene(self.trafficInfo, geneStr is None, geneStr or "")
+        self.durations = dict((n, list(d)) for n, d in gene.lightInfo.items())
+        self.cars = cars
+        self.radius = radius
+        self.step = step
+        self.rounds = rounds
+        self.validateEvery = validateEvery
+        self.limit = limit
+        self.verbose = verbose
+
+        self.carmap = CarMap(mapLayout, None)
+        self.regionMap = CarMap(mapLayout, None)
+        self.graph = self.carmap.graph
+        self.routes = RouteTable(self.carmap)
+        self.starts = [self.carmap.getRoadIndex(*start) for (start, _) in cars]
+        self.ends = [self.carmap.getRoadIndex(*end) for (_, end) in cars]
+        self.neighbours = [set() for _ in range(self.graph.nodeN)]
+        self.inRoads = [[] for _ in range(self.graph.nodeN)]
+        for r in range(self.graph.roadN):
+            a, b = self.graph.roadStart[r], self.graph.roadEnd[r]
+            self.neighbours[a].add(b)
+            self.neighbours[b].add(a)
+            self.inRoads[b].append(r)
+        self.regions = {}
+
+        self.best = None
+        self.bestDurations = None
+        self.curve = []
+        self.moves = 0
+        self.unchecked = 0
+        self.evaluations = 0
+        self.validations = 0
+        self.regionalTime = 0
+        self.validationTime = 0
+
+    def geneStr(self, durations=None):
+        durations = self.durations if durations is None else durations
+        return ''.join(f"{d:02d}" for n, _ in self.trafficInfo for d in durations[n])
+
+    def region(self, n):
+        """The lights of the intersections around intersection `n` and the roads ending in the region."""
+        region = self.regions.get(n)
+        if region is None:
+            nodes = {n}
+            frontier = [n]
+            for _ in range(self.radius):
+                frontier = [b for a in frontier for b in self.neighbours[a] if b not in nodes]
+                nodes.update(frontier)
+            roads = set(r for m in nodes for r in self.inRoads[m])
+            lights = [(m, inRoads) for m, inRoads in self.trafficInfo if m in nodes]
+            region = self.regions[n] = (lights, roads)
+        return region
+
+    def record(self, sim):
+        """Keep the path of every car of a finished TracedSimulation, indexed by road."""
+        self.paths = []
+        self.leave = []
+        self.passing = [[] for _ in range(self.graph.roadN)]
+        for i, (car, entries) in enumerate(zip(sim.cars, sim.entries)):
+            path = [(0, self.starts[i][0])] + entries
+            for k, (_, r) in enumerate(path):
+                self.passing[r].append((i, k))
+            self.paths.append(path)
+            self.leave.append(car.timeStamp)
+
+    def visits(self, roads):
+        """The visits of the recorded cars to the region of `roads`, for RegionalSimulation, and their last tick."""
+        visits = []
+        last = 0
+        for r in sorted(roads):
+            for i, k in self.passing[r]:
+                path = self.paths[i]
+                if k > 0 and path[k - 1][1] in roads:
+                    continue
+                entry = path[k][0]
+                si = self.starts[i][1] if k == 0 else 0
+                route = [r]
+                k += 1
+                while k < len(path) and path[k][1] in roads:
+                    route.append(path[k][1])
+                    k += 1
+                if k < len(path):
+                    route.append(path[k][1])
+                    ei = 0
+                    last = max(last, path[k][0])
+                else:
+                    ei = self.ends[i][1]
+                    last = max(last, self.leave[i])
+                if len(route) > 1 or si != ei:
+                    visits.append((entry, route, si, ei))
+        return visits, last
+
+    def regional(self, lights, visits, span, n=None, choice=None):
+        """Ticks spent in the region by the visiting cars, with the durations `choice` at intersection `n`."""
+        self.evaluations += 1
+        geneStr = ''.join(f"{d:02d}" for m, _ in lights for d in (choice if m == n else self.durations[m]))
+        self.regionMap.updateGeneInfo(GeneInfo(Gene(lights, False, geneStr)))
+        sim = RegionalSimulation(self.regionMap, self.routes, visits)
+        return sim.cost(min(self.limit, 2 * span + 100))
+
+    def improve(self, n):
+        """Move one light duration of intersection `n` if the region gains by it."""
+        lights, roads = self.region(n)
+        visits, span = self.visits(roads)
+        if not visits:
+            return False
+        startTime = time()
+        best = self.regional(lights, visits, span)
+        choice = None
+        current = self.durations[n]
+        for k in range(len(current)):
+            for d in (current[k] - self.step, current[k] + self.step):
+                if not self.MIN_DURATION <= d <= self.MAX_DURATION:
+                    continue
+                candidate = current[:k] + [d] + current[k + 1:]
+                cost = self.regional(lights, visits, span, n, candidate)
+                if cost < best:
+                    best, choice = cost, candidate
+        self.regionalTime += time() - startTime
+        if choice is None:
+            return False
+        self.durations[n] = choice
+        self.moves += 1
+        self.unchecked += 1
+        return True
+
+    def validate(self):
+        """Simulate the whole map; keep the moves since the last check if the average improved."""
+        startTime = time()
+        self.validations += 1
+        sim = TracedSimulation(self.cars, self.carmap, self.routes)
+        self.carmap.updateGeneInfo(GeneInfo(Gene(self.trafficInfo, False, self.geneStr())))
+        finished = sim.runTicks(False, self.limit)
+        self.carmap.clearAllCars()
+        average = sim.totalTime()[1] if finished else -1
+        kept = average != -1 and (self.best is None or average < self.best)
+        if kept:
+            self.best = average
+            self.bestDurations = dict((n, list(d)) for n, d in self.durations.items())
+            self.record(sim)
+        elif self.bestDurations is not None:
+            self.durations = dict((n, list(d)) for n, d in self.bestDurations.items())
+        elif average == -1:
+            raise Exception(f'The cars did not arrive within {self.limit} ticks under the starting lights.')
+        self.curve.append(self.best)
+        self.validationTime += time() - startTime
+        if self.verbose >= 1:
+            print(f"[{self.validations}] {average:.2f} after {self.unchecked} moves, "
+                  f"{'kept' if kept else 'reverted'}; best {self.best:.2f}")
+        self.unchecked = 0
+        return kept
+
+    def order(self):
+        """The intersections, busiest first by cars passing their in-roads."""
+        traffic = dict((n, sum(len(self.passing[r]) for r in roads)) for n, roads in self.trafficInfo)
+        return sorted((n for n, _ in self.trafficInfo), key=lambda n: -traffic[n])
+
+    def run(self):
+        """Tune the lights and return the best checked gene string."""
+        self.validate()
+        for round in range(self.rounds):
+            moved = 0
+            for n in self.order():
+                if self.improve(n):
+                    moved += 1
+                    if self.unchecked >= self.validateEvery:
+                        self.validate()
+            if self.unchecked:
+                self.validate()
+            if self.verbose >= 1:
+                print(f"Round {round + 1}: {moved} moves, {self.evaluations} regional runs "
+                      f"({self.regionalTime:.2f}s), {self.validations} full runs ({self.validationTime:.2f}s)")
+            if not moved:
+                break
+        self.durations = self.bestDurations
+        return self.geneStr()
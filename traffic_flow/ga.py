@@ -0,0 +1,319 @@
+# ga.py
+
+import heapq
+from random import randint
+
+
+class Gene:
+    """
+    Represents a genetic configuration for traffic light durations.
+    Can be generated randomly or from a gene string.
+    """
+
+    def __init__(self, trafficInfo, randomGenerate=True, geneStr=""):
+        self.geneStr = ""
+        self.geneLen = 0
+        self.trafficInfo = trafficInfo
+        self.matched = {}
+        self.roadToLight = {}
+        self.roadInfo = {}
+        self.lightInfo = {}
+
+        if randomGenerate:
+            self.buildUpGene()
+        else:
+            self.buildFromStr(geneStr)
+
+    def buildUpGene(self):
+        """
+        Builds a gene string with random durations for traffic lights.
+        """
+        for trafficLight, intersections in self.trafficInfo:
+            self.geneLen += len(intersections)
+            lightlist = []
+
+            for _ in range(len(intersections)):
+                duration = randint(2, 20)
+                lightlist.append(duration)
+                self.geneStr += f"{duration:02d}"
+
+            self.lightInfo[trafficLight] = lightlist
+            self.roadInfo[trafficLight] = intersections
+
+            for road in intersections:
+                self.roadToLight[road] = trafficLight
+
+    def buildFromStr(self, geneStr):
+        """
+        Builds the gene information from a predefined gene string.
+        """
+        self.geneStr = geneStr
+        index = 0
+
+        for trafficLight, intersections in self.trafficInfo:
+            self.geneLen += len(intersections)
+            lightlist = []
+
+            for _ in range(len(intersections)):
+                duration = int(geneStr[index * 2 : index * 2 + 2])
+                lightlist.append(duration)
+                index += 1
+
+            self.lightInfo[trafficLight] = lightlist
+            self.roadInfo[trafficLight] = intersections
+
+            for road in intersections:
+                self.roadToLight[road] = trafficLight
+
+
+class GeneInfo:
+    """
+    Determines if a light is green for a road at a given simulation tick.
+
+    The gene is compiled into the phase durations and green road of every
+    intersection, the road as a bit over road numbers, so the green roads of
+    the whole network at a tick are one bit mask. Going forward, a heap holds
+    the ticks at which intersections next switch, `due` the intersections of
+    each, and only the intersections that switch are looked at: their old and
+    new road bits are XORed into the mask, so a tick costs as much as its
+    switches. `flipped` holds the roads that changed since the previous tick
+    asked. Going back, the mask is rebuilt from every intersection.
+    """
+
+    def __init__(self, gene):
+        self.gene = gene
+        self.phases = []
+        self.fixed = 0
+        for intersection, roadlist in gene.roadInfo.items():
+            if len(roadlist) == 1:
+                self.fixed |= 1 << roadlist[0]
+                continue
+            durations = gene.lightInfo[intersection]
+            self.phases.append((durations, [1 << road for road in roadlist], sum(durations)))
+        self.phase = [0] * len(self.phases)
+        self.switches = []
+        self.due = {}
+        self.tick = None
+        self.mask = 0
+        self.flipped = 0
+
+    def update(self, tick):
+        """Fixed cycles need no per-tick work."""
+        pass
+
+    def schedule(self, switch, k):
+        due = self.due.get(switch)
+        if due is None:
+            self.due[switch] = [k]
+            heapq.heappush(self.switches, switch)
+        else:
+            due.append(k)
+
+    def seek(self, tick):
+        """Rebuild the mask at `tick` from every intersection."""
+        mask = self.fixed
+        self.switches = []
+        self.due = {}
+        for k, (durations, bits, cycle) in enumerate(self.phases):
+            p = 0
+            switch = tick - tick % cycle + durations[0]
+            while switch <= tick:
+                p += 1
+                switch += durations[p]
+            self.phase[k] = p
+            mask |= bits[p]
+            self.schedule(switch, k)
+        return mask
+
+    def advance(self, tick):
+        """Move the mask forward to `tick` through the switches due by then."""
+        mask = self.mask
+        switches = self.switches
+        phases = self.phases
+        phase = self.phase
+        dues = self.due
+        while switches and switches[0] <= tick:
+            at = heapq.heappop(switches)
+            for k in dues.pop(at):
+                durations, bits, cycle = phases[k]
+                p = phase[k]
+                old = bits[p]
+                switch = at
+                if tick - switch >= cycle:
+                    switch += (tick - switch) // cycle * cycle
+                while switch <= tick:
+                    p += 1
+                    if p == len(bits):
+                        p = 0
+                    switch += durations[p]
+                mask ^= old ^ bits[p]
+                phase[k] = p
+                due = dues.get(switch)
+                if due is None:
+                    dues[switch] = [k]
+                    heapq.heappush(switches, switch)
+                else:
+                    due.append(k)
+        return mask
+
+    def greenMask(self, tick):
+        """The roads with a green light at `tick`, bit `r` for road `r`."""
+        if tick != self.tick:
+            mask = self.seek(tick) if self.tick is None or tick < self.tick else self.advance(tick)
+            self.flipped = mask ^ self.mask
+            self.mask = mask
+            self.tick = tick
+        return self.mask
+
+    def isGreen(self, road, tick):
+        return (self.greenMask(tick) >> road) & 1 == 1
+
+    def firstDifference(self, other, limit, floor=0):
+        """
+        The first tick from 1 on at which `other`, a GeneInfo of the same
+        layout, shows different green roads, or `limit` + 1 if the two agree
+        up to `limit`. Only intersections with different durations are
+        compared, phase by phase rather than tick by tick. The search stops
+        early once the answer is known to be at most `floor`.
+        """
+        first = limit + 1
+        for n, roads in self.gene.roadInfo.items():
+            a, b = self.gene.lightInfo[n], other.gene.lightInfo[n]
+            if a != b:
+                first = phaseDifference(roads, a, b, first)
+                if first <= floor:
+                    break
+        return first
+
+
+def phaseDifference(roads, a, b, bound):
+    """
+    The first tick from 1 on, below `bound`, at which the cycles with
+    durations `a` and `b` over `roads` give a different road, else `bound`.
+    """
+    cycleA, cycleB = sum(a), sum(b)
+    n = len(roads)
+    i = j = 0
+    endA, endB = a[0], b[0]
+    start = 0
+    atZero = False
+    while start < bound:
+        while endA <= start:
+            i = (i + 1) % n
+            endA += a[i]
+        while endB <= start:
+            j = (j + 1) % n
+            endB += b[j]
+        end = min(endA, endB)
+        if i != j:
+            if end > max(start, 1):
+                return max(start, 1)
+            # Only tick 0 differs, which is never simulated: it comes back one hyperperiod later.
+            atZero = True
+        start = end
+        if start % cycleA == 0 and start % cycleB == 0:
+            return min(start, bound) if atZero else bound
+    return bound
+
+
+class GeneEvolve:
+    """
+    Handles the evolution logic for two genes.
+    """
+
+    MAX_MUTATE_RATE = 0.8
+    STAGNATION_STEP = 0.1
+
+    @classmethod
+    def evolve(cls, g1, g2, mutateRate=0.2, stagnation=0):
+        """
+        Combines and mutates two parent genes to create a new gene.
+        `stagnation` is the number of generations without improvement; the
+        mutation rate grows with it to leave a plateau.
+        """
+        newGen = cls.merge(g1, g2)
+        geneStr = cls.mutate(newGen, cls.adaptRate(mutateRate, stagnation))
+        return Gene(g1.trafficInfo, randomGenerate=False, geneStr=geneStr)
+
+    @classmethod
+    def adaptRate(cls, mutateRate, stagnation):
+        return min(cls.MAX_MUTATE_RATE, mutateRate + cls.STAGNATION_STEP * stagnation)
+
+    @classmethod
+    def distance(cls, g1, g2):
+        """Share of traffic light durations that differ between two genes."""
+        n = len(g1.geneStr) // 2
+        if n == 0:
+            return 0.0
+        diff = sum(1 for i in range(0, n * 2, 2) if g1.geneStr[i:i + 2] != g2.geneStr[i:i + 2])
+        return diff / n
+
+    @classmethod
+    def diversity(cls, genes):
+        """Average distance between every pair of genes, from 0 (all equal) to 1."""
+        pairs = [(a, b) for i, a in enumerate(genes) for b in genes[i + 1:]]
+        if not pairs:
+            return 0.0
+        return sum(cls.distance(a, b) for a, b in pairs) / len(pairs)
+
+    @classmethod
+    def transfer(cls, geneStr, oldLights, newLights):
+        """
+        Carry a gene string over to another layout. Lights are given by
+        `Layout.getLightPositions`; an intersection keeps the durations of the
+        old intersection sharing one of its cells, road by road, and every
+        light without a match gets a random duration.
+        Returns the new gene string and the number of durations kept.
+        """
+        durations = {}
+        owner = {}
+        index = 0
+        for n, (positions, roads) in enumerate(oldLights):
+            for pos in positions:
+                owner[pos] = n
+            for road in roads:
+                durations[(n, road)] = geneStr[index * 2 : index * 2 + 2]
+                index += 1
+
+        newGen = ""
+        kept = 0
+        for positions, roads in newLights:
+            match = next((owner[pos] for pos in positions if pos in owner), None)
+            for road in roads:
+                duration = durations.get((match, road))
+                if duration is None:
+                    duration = f"{randint(2, 20):02d}"
+                else:
+                    kept += 1
+                newGen += duration
+        return newGen, kept
+
+    @classmethod
+    def merge(cls, g1, g2):
+        """
+        Merges two gene strings by selecting half of their traits.
+        """
+        newGen = ""
+        genLen = len(g1.geneStr)
+        geneStrs = [g1.geneStr, g2.geneStr]
+
+        for i in range(genLen // 2):
+            selected = randint(0, 1)
+            newGen += geneStrs[selected][i * 2 : i * 2 + 2]
+
+        return newGen
+
+    @classmethod
+    def mutate(cls, geneStr, mutateRate):
+        """
+        Applies mutations to a gene string by randomly changing durations.
+        """
+        num_mutations = randint(0, int((len(geneStr) / 2) * mutateRate))
+        geneList = list(geneStr)
+
+        for _ in range(num_mutations):
+            pos = randint(0, (len(geneStr) // 2) - 1)
+            new_val = f"{randint(2, 20):02d}"
+            geneList[pos * 2 : pos * 2 + 2] = list(new_val)
+
+        return ''.join(geneList)
@@ -0,0 +1,415 @@
+# generation.py
+
+import json
+from bisect import bisect_left
+from random import randint
+from time import time
+from .simulate import Scenario
+from .ga import Gene, GeneInfo, GeneEvolve
+
+
+class Generation:
+    """
+    Handles the evolution of traffic light genes over multiple generations.
+
+    The run ends after `roundNumber` generations, or earlier when
+    - `patience`: the best average has not improved for that many generations,
+    - `minDiversity`: the new genes are more alike than this (see `GeneEvolve.diversity`),
+    - `timeBudget`: that many seconds have passed,
+    - `evalBudget`: that many genes have been simulated.
+    The reason is kept in `stopReason`.
+
+    A run can be warm-started from `seeds`, gene strings of an earlier run
+    (see `GeneEvolve.transfer` when the layout changed). `previousCurve`, the
+    best average of each generation of that run, is used to report how many
+    generations the seeds saved. `checkpoint` is called with the Generation
+    after every generation.
+
+    `verbose` sets what is printed: 0 nothing, 1 one line per generation and
+    the stop reason, 2 also every gene. With `telemetry`, a file name, one
+    JSON object per line is appended for the start, every generation and the
+    stop of the run (see `generationRecord`); a callable gets each record as
+    a dict instead.
+
+    With `snapshotEvery`, genes resume from snapshots of the selected genes
+    of the previous generation where their lights agree (see `Scenario`).
+
+    With `raceTicks`, genes are raced instead of each run to the end: all run
+    for `raceTicks` ticks, then the ones still in the race for twice as long
+    from where they stopped, and so on. A gene leaves the race once enough
+    genes are better to fill the selection: finished genes by their travel
+    time, unfinished ones by a lower bound of it (see `Scenario.race`), so the
+    selection is the same as without racing. With `raceConfidence` below 1,
+    an unfinished gene also counts as better when its bound is lower by a
+    margin that ordered earlier genes right in that share of the cases (see
+    `raceMargin`): genes leave earlier, but the selection may differ. Only
+    finished genes count in the fitness statistics.
+    """
+
+    def __init__(self, mapLayout, carmap, cars, geneNumber, roundNumber, router=None, controller=None,
+                 patience=None, minDiversity=None, timeBudget=None, evalBudget=None,
+                 seeds=(), previousCurve=(), checkpoint=None, verbose=1, telemetry=None, snapshotEvery=None,
+                 raceTicks=None, raceConfidence=0.95):
+        if raceTicks is not None and (router is not None or controller is not None or snapshotEvery is not None):
+            raise Exception('Racing needs fixed light cycles without a router or snapshots.')
+        self.mapLayout = mapLayout
+        self.carmap = carmap
+        self.cars = cars
+        self.scenario = Scenario(carmap, cars, router, controller, snapshotEvery=snapshotEvery)
+        self.geneNumber = geneNumber
+        self.roundNumber = roundNumber
+        self.patience = patience
+        self.minDiversity = minDiversity
+        self.timeBudget = timeBudget
+        self.evalBudget = evalBudget
+        self.previousCurve = list(previousCurve)
+        self.checkpoint = checkpoint
+        self.verbose = verbose
+        self.telemetry = telemetry
+        self.telemetryFile = None
+        self.genes = []
+        self.parents = []
+        self.curve = []
+        self.savedGenerations = None
+        self.results = []
+        self.best = None
+        self.stagnation = 0
+        self.evaluations = 0
+        self.generations = 0
+        self.stopReason = None
+        self.raceTicks = raceTicks
+        self.raceConfidence = raceConfidence
+        self.raceSamples = {}
+        self.dropped = 0
+        self.initialFirstGenes(seeds)
+
+    def initialFirstGenes(self, seeds=()):
+        """
+        Generates the initial set of genes: the seeds, then mutated seeds for up
+        to three quarters of the population, then random genes.
+        """
+        trafficInfo = self.mapLayout.getTrafficLights()
+        seeds = list(seeds)[: self.geneNumber]
+        self.seedNumber = len(seeds)
+        for geneStr in seeds:
+            self.genes.append(Gene(trafficInfo, randomGenerate=False, geneStr=geneStr))
+
+        while len(self.genes) < self.geneNumber:
+            if seeds and len(self.genes) < self.geneNumber * 3 // 4:
+                geneStr = GeneEvolve.mutate(seeds[randint(0, len(seeds) - 1)], 0.2)
+                self.genes.append(Gene(trafficInfo, randomGenerate=False, geneStr=geneStr))
+            else:
+                self.genes.append(Gene(trafficInfo))
+
+    def run(self):
+        """
+        Runs the evolutionary process across multiple generations.
+        """
+        self.startTime = time()
+        self.stopReason = f'reached {self.roundNumber} generations'
+        if self.telemetry is not None and not callable(self.telemetry):
+            self.telemetryFile = open(self.telemetry, 'a')
+        self.record({'event': 'start', 'genes': self.geneNumber, 'rounds': self.roundNumber,
+                     'seeds': self.seedNumber, 'cars': len(self.cars)})
+        try:
+            self.runGenerations()
+        finally:
+            self.log(1, f'Stopped after {self.generations} generations and {self.evaluations} evaluations: {self.stopReason}')
+            if self.previousCurve and self.curve:
+                self.log(1, self.warmStartReport())
+            self.record({'event': 'stop', 'reason': self.stopReason, 'generations': self.generations,
+                         'evaluations': self.evaluations, 'wall': time() - self.startTime,
+                         'best': self.best, 'savedGenerations': self.savedGenerations})
+            if self.telemetryFile is not None:
+                self.telemetryFile.close()
+                self.telemetryFile = None
+        return self.results
+
+    def runGenerations(self):
+        for i in range(self.roundNumber):
+            result = []
+            timeouts = 0
+            generationStart = time()
+            ticks = (self.scenario.simulatedTicks, self.scenario.resumedTicks)
+            self.log(2, f'Generation {i + 1}:')
+            dropped = self.dropped
+
+            if self.raceTicks is None:
+                for g, parents in zip(self.genes, self.parents or [None] * len(self.genes)):
+                    if self.budgetSpent():
+                        break
+                    self.log(2, f'\tGene String {g.geneStr}')
+                    total, average = self.scenario.evaluate(g, 10000, parents)
+                    self.evaluations += 1
+                    self.log(2, f'\tTotal: {total} Average: {average}\n')
+
+                    if average == -1:
+                        timeouts += 1
+                        continue
+
+                    result.append((average, g))
+            else:
+                timeouts = self.race(result)
+            dropped = self.dropped - dropped
+            simulateTime = time() - generationStart
+            evaluations = len(result) + timeouts + dropped
+
+            if not result:
+                if not self.budgetSpent():
+                    self.stopReason = 'no gene finished within the tick limit'
+                break
+
+            selectStart = time()
+            # FIX REQUIRED: Sort by average because Gene objects are not directly comparable
+            result.sort(key=lambda x: x[0])
+
+            selected = result[: (self.geneNumber // 2 + 1)]
+            self.scenario.keep(g.geneStr for (_, g) in selected)
+            self.generations += 1
+            self.curve.append(selected[0][0])
+            self.addResults(selected)
+            self.updateStagnation(selected[0][0])
+            stop = self.shouldStop()
+            if not stop:
+                self.evolve(selected)
+            diversity = None
+            if not stop and (self.minDiversity is not None or self.telemetry is not None):
+                diversity = GeneEvolve.diversity(self.genes)
+            selectTime = time() - selectStart
+
+            checkpointTime = 0.0
+            if not stop and self.checkpoint is not None:
+                checkpointStart = time()
+                self.checkpoint(self)
+                checkpointTime = time() - checkpointStart
+
+            wall = time() - generationStart
+            fitness = [average for (average, _) in result]
+            self.log(1, f'Generation {self.generations}: best {fitness[0]:.2f}, median {quantile(fitness, 0.5):.2f}, '
+                        f'{evaluations} evaluations in {wall:.2f}s ({evaluations / max(simulateTime, 1e-9):.1f}/s), '
+                        f'{timeouts} timeouts' + (f', {dropped} left the race' if self.raceTicks else ''))
+            self.record(self.generationRecord(fitness, evaluations, timeouts, diversity,
+                                              wall, simulateTime, selectTime, checkpointTime, ticks, dropped))
+
+            if stop:
+                break
+            if self.minDiversity is not None and diversity < self.minDiversity:
+                self.stopReason = f'gene diversity fell below {self.minDiversity}'
+                break
+
+    def generationRecord(self, fitness, evaluations, timeouts, diversity, wall, simulateTime, selectTime, checkpointTime,
+                         ticks, dropped=0):
+        """
+        The telemetry of one generation. Times are in seconds: `simulate` for
+        the evaluations, `select` for sorting, breeding and the diversity of
+        the new genes, `checkpoint` for saving. `fitness` summarises the
+        averages of the genes that finished; `diversity` is None when it was
+        not computed because the run stopped. `simulatedTicks` and
+        `resumedTicks` count the ticks run and skipped by resuming from
+        snapshots; `ticks` are the counters when the generation started.
+        `dropped` counts the genes that left a race unfinished.
+        """
+        sim = self.scenario.sim
+        return {
+            'event': 'generation',
+            'generation': self.generations,
+            'elapsed': time() - self.startTime,
+            'wall': wall,
+            'simulate': simulateTime,
+            'select': selectTime,
+            'checkpoint': checkpointTime,
+            'evaluations': evaluations,
+            'evalsPerSec': evaluations / simulateTime if simulateTime > 0 else None,
+            'timeouts': timeouts,
+            'dropped': dropped,
+            'simulatedTicks': self.scenario.simulatedTicks - ticks[0],
+            'resumedTicks': self.scenario.resumedTicks - ticks[1],
+            'fitness': {'min': fitness[0], 'q25': quantile(fitness, 0.25), 'median': quantile(fitness, 0.5),
+                        'q75': quantile(fitness, 0.75), 'max': fitness[-1]},
+            'best': self.best,
+            'stagnation': self.stagnation,
+            'mutateRate': GeneEvolve.adaptRate(0.2, self.stagnation),
+            'diversity': diversity,
+            'routes': len(sim.routes.entries),
+            'routeCells': len(sim.routes.roads),
+            'reroutes': sim.router.reroutes if sim.router is not None else None,
+        }
+
+    def race(self, result):
+        """
+        Race the genes (see the class), adding the finished ones to `result`
+        as (average, gene). Returns the number of genes that timed out.
+        """
+        need = self.geneNumber // 2 + 1
+        carN = len(self.cars)
+        timeouts = 0
+        # Each runner: [gene, geneInfo, snapshot, bounds by rung].
+        runners = []
+        for g in self.genes:
+            if self.budgetSpent():
+                break
+            self.evaluations += 1
+            runners.append([g, GeneInfo(g), None, []])
+
+        until = self.raceTicks
+        rung = 0
+        while runners:
+            last = until >= 10000
+            live = []
+            for runner in runners:
+                g, geneInfo, snapshot, bounds = runner
+                total, finished, runner[2] = self.scenario.race(geneInfo, g, 10000 if last else until, snapshot)
+                if finished:
+                    average = total / carN
+                    result.append((average, g))
+                    self.log(2, f'\tGene String {g.geneStr}\n\tTotal: {total} Average: {average} after {rung} rungs\n')
+                    for k, bound in enumerate(bounds):
+                        samples = self.raceSamples.setdefault(k, [])
+                        samples.append((bound, average))
+                        del samples[:-100]
+                elif last:
+                    timeouts += 1
+                else:
+                    bounds.append(total / carN)
+                    live.append(runner)
+
+            runners = self.stillRacing(live, result, rung, need)
+            self.dropped += len(live) - len(runners)
+            until *= 2
+            rung += 1
+        return timeouts
+
+    def stillRacing(self, live, result, rung, need):
+        """
+        The unfinished genes of `live` that may still be among the `need` best.
+        A gene is out once `need` genes are better: finished genes whose time
+        is below its lower bound, and, when calibrated (see `raceMargin`),
+        unfinished genes whose bound is below its own by more than the margin.
+        """
+        finished = sorted(average for (average, _) in result)
+        margin = self.raceMargin(rung)
+        bounds = sorted(runner[3][-1] for runner in live)
+        racing = []
+        for runner in live:
+            bound = runner[3][-1]
+            better = bisect_left(finished, bound)
+            if margin is not None:
+                better += bisect_left(bounds, bound / (1 + margin))
+            if better < need:
+                racing.append(runner)
+        return racing
+
+    def raceMargin(self, rung):
+        """
+        The smallest relative difference of the bounds at `rung` beyond which
+        the better bound finished first in at least `raceConfidence` of the
+        pairs of earlier genes; None when not known yet or if confidence is 1.
+        """
+        samples = self.raceSamples.get(rung, ())
+        if self.raceConfidence >= 1 or len(samples) < 10:
+            return None
+        pairs = []
+        for (b1, f1) in samples:
+            for (b2, f2) in samples:
+                if b1 > b2:
+                    pairs.append((b1 / b2 - 1, f1 < f2))
+        pairs.sort(reverse=True)
+        margin = None
+        wrong = 0
+        for k, (difference, swapped) in enumerate(pairs, start=1):
+            wrong += swapped
+            if wrong <= (1 - self.raceConfidence) * k:
+                margin = difference
+        return margin
+
+    def log(self, level, message):
+        if self.verbose >= level:
+            print(message)
+
+    def record(self, data):
+        if self.telemetryFile is not None:
+            self.telemetryFile.write(json.dumps(data) + '\n')
+            self.telemetryFile.flush()
+        elif self.telemetry is not None:
+            self.telemetry(data)
+
+    def warmStartReport(self):
+        """
+        Compare the first generation with the run the seeds came from: beating
+        its first k generations saves k - 1 of them.
+        """
+        first = self.curve[0]
+        reached = next((k for k, best in enumerate(self.previousCurve) if best <= first), len(self.previousCurve))
+        self.savedGenerations = max(reached - 1, 0)
+        if reached == 0:
+            return (f'Warm start: generation 1 ({first:.2f}) did not beat generation 1 of the previous run, '
+                    f'no generations saved')
+        if reached == len(self.previousCurve):
+            which = 'every generation'
+        else:
+            which = 'generation 1' if reached == 1 else f'the first {reached} generations'
+        saved = self.savedGenerations
+        return (f'Warm start: generation 1 ({first:.2f}) beat {which} of the previous run, '
+                f"{saved} generation{'' if saved == 1 else 's'} saved")
+
+    def bestGenes(self, number):
+        """The best distinct gene strings found so far, best first."""
+        genes = []
+        for average, geneStr in sorted(self.results[::2]):
+            if geneStr not in genes:
+                genes.append(geneStr)
+        return genes[:number]
+
+    def updateStagnation(self, best):
+        if self.best is None or best < self.best:
+            self.best = best
+            self.stagnation = 0
+        else:
+            self.stagnation += 1
+
+    def budgetSpent(self):
+        if self.evalBudget is not None and self.evaluations >= self.evalBudget:
+            self.stopReason = f'used the budget of {self.evalBudget} evaluations'
+            return True
+        if self.timeBudget is not None and time() - self.startTime >= self.timeBudget:
+            self.stopReason = f'used the time budget of {self.timeBudget}s'
+            return True
+        return False
+
+    def shouldStop(self):
+        if self.patience is not None and self.stagnation >= self.patience:
+            self.stopReason = f'no improvement for {self.patience} generations'
+            return True
+        return self.budgetSpent()
+
+    def evolve(self, result):
+        """
+        Produces a new generation from top-performing genes.
+        """
+        newGenes = []
+        parents = []
+        length = len(result) - 1
+
+        for _ in range(self.geneNumber):
+            g1, g2 = randint(0, length), randint(0, length)
+            newGene = GeneEvolve.evolve(result[g1][1], result[g2][1], stagnation=self.stagnation)
+            newGenes.append(newGene)
+            parents.append((result[g1][1].geneStr, result[g2][1].geneStr))
+
+        self.genes = newGenes
+        self.parents = parents
+
+    def addResults(self, result):
+        """
+        Stores the best and worst performing gene strings of each generation.
+        """
+        self.results.append((result[0][0], result[0][1].geneStr))      # Best
+        self.results.append((result[-1][0], result[-1][1].geneStr))    # Worst
+
+
+def quantile(values, q):
+    """The `q` quantile of sorted `values`, interpolating between neighbours."""
+    k = (len(values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
@@ -0,0 +1,433 @@
+# golden.py
+
+"""
+Golden traces: the cell of every car and the green lights after every tick
+of the reference engine, `Simulation`, for seeded scenarios on the layouts
+in traffic_flow/layouts/ and on the GENERATED ones. Any other engine has to
+reproduce them exactly; `compare` reports the first tick and car where it
+does not.
+A ContractionHierarchy picks other routes among those of the same length,
+so the engines routing with one have their own traces, recorded by the
+reference engine routing with one too.
+"""
+
+import json
+import os
+import random
+import sys
+import zlib
+from array import array
+from optparse import OptionParser
+
+from .layout import getLayout, LAYOUTS
+from .car import CarMap
+from .simulate import Simulation, Scenario
+from .ga import Gene, GeneInfo
+from .demand import Demand
+from .hierarchy import ContractionHierarchy, fingerprint
+
+MAGIC = b'TFTRACE1\n'
+
+
+# The crossroads of the layouts in traffic_flow/layouts/ have a single in-road
+# each, so no two cars ever compete for a road there and the car order is never
+# tested; these generated maps have crossroads joining four roads.
+GENERATED = {
+    'arterial12': ('arterial', {'rows': 12, 'cols': 12, 'seed': 1}),
+    'random12': ('random', {'rows': 12, 'cols': 12, 'crossroads': 0.5, 'seed': 1}),
+}
+
+
+def cellOffsets(graph):
+    """The flat number of the first cell of every road, as in `demand.Demand`."""
+    offsets = [0]
+    for length in graph.length:
+        offsets.append(offsets[-1] + length)
+    return offsets
+
+
+class Trace(object):
+    """
+    One run: `cells[t]` holds the cell of every car after tick `t` (-1 once it
+    arrived), `greens[t]` the green roads of tick `t` as a bit mask and
+    `arrivals` the arrival tick of every car (-1 if it did not arrive).
+    `header` holds what is needed to run it again: layout, cars, gene, limit.
+    """
+
+    def __init__(self, header):
+        self.header = header
+        self.cells = []
+        self.greens = []
+        self.arrivals = None
+
+    def add(self, tick, cells, greens):
+        if tick != len(self.cells):
+            raise Exception(f'Tick {tick} recorded after tick {len(self.cells) - 1}.')
+        self.cells.append(cells)
+        self.greens.append(greens or 0)
+
+    def save(self, filename):
+        """
+        Write the trace after a one-line JSON header, zlib compressed: every
+        frame of cells as its difference to the frame before, the green masks
+        XORed with the mask before, then the arrivals.
+        """
+        carN = len(self.header['cars'])
+        size = (self.header['roads'] + 7) // 8
+        body = array('i')
+        before = array('i', [0]) * carN
+        for cells in self.cells:
+            body.extend(c - b for c, b in zip(cells, before))
+            before = cells
+        greens = bytearray()
+        before = 0
+        for mask in self.greens:
+            greens += (mask ^ before).to_bytes(size, 'little')
+            before = mask
+        body.extend(self.arrivals)
+        header = dict(self.header, byteorder=sys.byteorder, ticks=len(self.cells))
+        with open(filename, 'wb') as f:
+            f.write(MAGIC)
+            f.write(json.dumps(header).encode() + b'\n')
+            f.write(zlib.compress(body.tobytes() + bytes(greens), 9))
+
+
+def loadTrace(filename):
+    """Read a trace written by `Trace.save`."""
+    with open(filename, 'rb') as f:
+        if f.readline() != MAGIC:
+            raise Exception(f'{filename} is not a trace.')
+        header = json.loads(f.readline())
+        data = zlib.decompress(f.read())
+    carN = len(header['cars'])
+    ticks = header['ticks']
+    size = (header['roads'] + 7) // 8
+    split = 4 * carN * (ticks + 1)
+    body = array('i')
+    body.frombytes(data[:split])
+    if header.pop('byteorder') != sys.byteorder:
+        body.byteswap()
+    del header['ticks']
+    header['cars'] = [(tuple(s), tuple(e)) for s, e in header['cars']]
+
+    trace = Trace(header)
+    cells = array('i', [0]) * carN
+    for t in range(ticks):
+        cells = array('i', [c + d for c, d in zip(cells, body[t * carN:(t + 1) * carN])])
+        trace.cells.append(cells)
+    mask = 0
+    for t in range(ticks):
+        mask ^= int.from_bytes(data[split + t * size:split + (t + 1) * size], 'little')
+        trace.greens.append(mask)
+    trace.arrivals = body[ticks * carN:]
+    return trace
+
+
+class ReferenceEngine(object):
+    """
+    `Simulation` on a new CarMap. Engines give the `frames` of a run, one
+    (tick, cells, greens) per tick from the tick they start at, then its
+    `arrivals`; greens is None where the engine has no light state.
+    `hierarchy` tells whether it routes with a ContractionHierarchy.
+    """
+
+    hierarchy = False
+
+    def __init__(self, mapLayout, cars, geneStr):
+        self.gene = Gene(mapLayout.getTrafficLights(), False, geneStr)
+        self.cm = self.makeCarMap(mapLayout, GeneInfo(self.gene))
+        self.offsets = cellOffsets(self.cm.graph)
+        self.sim = Simulation(cars, self.cm)
+
+    def makeCarMap(self, mapLayout, geneInfo):
+        cm = CarMap(mapLayout, geneInfo)
+        if self.hierarchy:
+            cm.setHierarchy(ContractionHierarchy(cm.graph))
+        return cm
+
+    def start(self, limit):
+        pass
+
+    def frames(self, limit):
+        self.start(limit)
+        sim, cm = self.sim, self.cm
+        # No light is looked at before the first tick.
+        yield sim.tick, self.cells(), cm.greens if sim.tick else None
+        while sim.carCnt and sim.tick <= limit:
+            sim.step()
+            yield sim.tick, self.cells(), cm.greens
+
+    def cells(self):
+        offsets = self.offsets
+        return array('i', [offsets[c.roadIndex[0]] + c.roadIndex[1] if c.display else -1 for c in self.cm.cars])
+
+    def arrivals(self):
+        return [car.timeStamp if car.isArrived() else -1 for car in self.sim.cars]
+
+
+def otherGene(geneStr):
+    """`geneStr` with the last light one tick longer, or shorter at the top of the range."""
+    if not geneStr:
+        return geneStr
+    last = int(geneStr[-2:])
+    return geneStr[:-2] + f"{last + 1 if last < 20 else last - 1:02d}"
+
+
+class ScenarioEngine(ReferenceEngine):
+    """A Scenario put back to the start with `reset` after running another gene."""
+
+    def __init__(self, mapLayout, cars, geneStr):
+        self.trafficInfo = mapLayout.getTrafficLights()
+        self.gene = Gene(self.trafficInfo, False, geneStr)
+        self.cm = self.makeCarMap(mapLayout, None)
+        self.offsets = cellOffsets(self.cm.graph)
+        self.scenario = self.makeScenario(cars)
+        self.sim = self.scenario.sim
+
+    def makeScenario(self, cars):
+        return Scenario(self.cm, cars)
+
+    def start(self, limit):
+        self.scenario.evaluate(Gene(self.trafficInfo, False, otherGene(self.gene.geneStr)), limit)
+        self.scenario.reset()
+        self.cm.updateGeneInfo(GeneInfo(self.gene))
+
+
+class SnapshotEngine(ScenarioEngine):
+    """A Scenario with snapshots, resuming from a run of a gene whose last light differs."""
+
+    def makeScenario(self, cars):
+        return Scenario(self.cm, cars, snapshotEvery=8)
+
+    def start(self, limit):
+        parent = otherGene(self.gene.geneStr)
+        self.scenario.evaluate(Gene(self.trafficInfo, False, parent), limit)
+        geneInfo = GeneInfo(self.gene)
+        snapshot, _ = self.scenario.resumePoint(geneInfo, limit, [parent])
+        if snapshot is None:
+            self.scenario.reset()
+        else:
+            self.sim.restore(snapshot)
+        self.cm.updateGeneInfo(geneInfo)
+
+
+class HierarchyReferenceEngine(ReferenceEngine):
+    """The reference engine routing with a ContractionHierarchy, to record the traces of the hierarchy engines."""
+
+    hierarchy = True
+
+
+class HierarchyEngine(ScenarioEngine):
+    """A ScenarioEngine routing with a ContractionHierarchy."""
+
+    hierarchy = True
+
+
+class PartitionedEngine(object):
+    """`partition.PartitionedSimulation` with two regions in this process, where their cars can be read."""
+
+    hierarchy = False
+
+    def __init__(self, mapLayout, cars, geneStr):
+        from .partition import PartitionedSimulation
+
+        cm = CarMap(mapLayout, GeneInfo(Gene(mapLayout.getTrafficLights(), False, geneStr)))
+        self.offsets = cellOffsets(cm.graph)
+        self.sim = PartitionedSimulation(cars, cm, workers=2, processes=False)
+        self.immigrants = [[] for _ in self.sim.workers]
+
+    def frames(self, limit):
+        sim = self.sim
+        try:
+            yield sim.tick, self.cells(), None
+            while sim.carCnt and sim.tick <= limit:
+                sim.tick += 1
+                self.immigrants = sim.step(self.immigrants)
+                yield sim.tick, self.cells(), None
+        finally:
+            sim.close()
+
+    def cells(self):
+        offsets = self.offsets
+        cells = array('i', [-1]) * self.sim.carN
+        for worker in self.sim.workers:
+            region = worker.region
+            for r, cars in region.onRoad.items():
+                for car in cars:
+                    cells[car] = offsets[r] + region.index[car]
+            routes = region.routes
+        for batch in self.immigrants:
+            for (car, _, cursor) in batch:
+                cells[car] = offsets[routes[cursor]]
+        return cells
+
+    def arrivals(self):
+        return [t if t else -1 for t in self.sim.timeStamps]
+
+
+ENGINES = {
+    'reference': ReferenceEngine,
+    'scenario': ScenarioEngine,
+    'snapshot': SnapshotEngine,
+    'partition': PartitionedEngine,
+    'hierarchy': HierarchyEngine,
+}
+
+
+def goldenLayout(name):
+    """The layout `name` from traffic_flow/layouts/ or GENERATED."""
+    if name in GENERATED:
+        from .map_generator import generateLayout
+
+        pattern, kwargs = GENERATED[name]
+        return generateLayout(pattern, **kwargs)
+    mapLayout = getLayout(name)
+    if mapLayout is None:
+        raise Exception(f"The layout '{name}' can't be found.")
+    return mapLayout
+
+
+def makeScenario(name, seed, number):
+    """Seeded cars, at most a quarter of the road cells, and random lights on layout `name`."""
+    mapLayout = goldenLayout(name)
+    rng = random.Random(seed)
+    demand = Demand(mapLayout)
+    cars = demand.uniform(min(number, demand.cellN // 4), rng)
+    geneStr = ''.join(f"{rng.randint(2, 20):02d}" for _, roads in mapLayout.getTrafficLights() for _ in roads)
+    return mapLayout, cars, geneStr
+
+
+def record(engine, mapLayout, header):
+    """Run `engine` on the scenario of `header` into a Trace."""
+    trace = Trace(header)
+    run = engine(mapLayout, header['cars'], header['gene'])
+    for tick, cells, greens in run.frames(header['limit']):
+        trace.add(tick, cells, greens)
+    trace.arrivals = array('i', run.arrivals())
+    return trace
+
+
+def describe(offsets, cell):
+    if cell == -1:
+        return 'arrived'
+    r = max(k for k in range(len(offsets) - 1) if offsets[k] <= cell)
+    return f'road {r} cell {cell - offsets[r]}'
+
+
+def compare(golden, engine, mapLayout):
+    """
+    Run `engine` on the scenario of the `golden` trace. Returns None if it
+    matches, else (tick, car, message) for the first difference; car is
+    None for a light or the end of the run.
+    """
+    header = golden.header
+    if header.get('hierarchy', False) != engine.hierarchy:
+        raise Exception(f"A trace recorded {'with' if header.get('hierarchy', False) else 'without'} "
+                        f"a hierarchy can't check an engine routing {'with' if engine.hierarchy else 'without'} one.")
+    run = engine(mapLayout, header['cars'], header['gene'])
+    offsets = cellOffsets(mapLayout.compile())
+    last = None
+    for tick, cells, greens in run.frames(header['limit']):
+        last = tick
+        if tick >= len(golden.cells):
+            return tick, None, f'still running after tick {len(golden.cells) - 1}'
+        expected = golden.cells[tick]
+        if cells != expected:
+            car = next(k for k, (a, b) in enumerate(zip(cells, expected)) if a != b)
+            return tick, car, f'{describe(offsets, cells[car])}, expected {describe(offsets, expected[car])}'
+        if greens is not None and greens != golden.greens[tick]:
+            flipped = greens ^ golden.greens[tick]
+            road = (flipped & -flipped).bit_length() - 1
+            return tick, None, f"light of road {road} {'green' if greens >> road & 1 else 'red'}, expected the other"
+    if last != len(golden.cells) - 1:
+        return last, None, f'stopped, expected to run until tick {len(golden.cells) - 1}'
+    arrivals = run.arrivals()
+    for car, (a, b) in enumerate(zip(arrivals, golden.arrivals)):
+        if a != b:
+            return last, car, f'arrived at tick {a}, expected {b}'
+    return None
+
+
+def traceName(directory, name, seed, hierarchy=False):
+    return os.path.join(directory, f"{name}-{seed}{'-ch' if hierarchy else ''}.trace")
+
+
+def allLayouts():
+    """The layouts in traffic_flow/layouts/ that have roads to drive on, and the GENERATED ones."""
+    names = sorted(f[:-4] for f in os.listdir(LAYOUTS) if f.endswith('.lay'))
+    return [name for name in names if getLayout(name).roads] + sorted(GENERATED)
+
+
+def parseArgs(argv):
+    def ints(text):
+        return [int(v) for v in text.split(',')]
+
+    parser = OptionParser()
+    parser.add_option('-l', '--layouts', dest='layouts', type='str', default=None)
+    parser.add_option('--seeds', dest='seeds', type='str', default='1,2,3')
+    parser.add_option('-n', '--number', dest='number', type='int', default=150)
+    parser.add_option('--limit', dest='limit', type='int', default=3000)
+    parser.add_option('--dir', dest='directory', type='str', default='saved/golden')
+    parser.add_option('-e', '--engines', dest='engines', type='str', default='scenario,snapshot,partition,hierarchy')
+    parser.add_option('--record', action='store_true', dest='record', default=False)
+
+    options, otherjunk = parser.parse_args(argv)
+    if otherjunk:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    for e in options.engines.split(','):
+        if e not in ENGINES:
+            raise Exception(f"Unknown engine '{e}', choose from {', '.join(ENGINES)}.")
+    layouts = options.layouts.split(',') if options.layouts else allLayouts()
+    return options, layouts, ints(options.seeds)
+
+
+def main(argv=None):
+    """
+    > python golden.py --record
+    > python golden.py -e scenario,snapshot,partition,hierarchy
+    """
+    options, layouts, seeds = parseArgs(sys.argv[1:] if argv is None else argv)
+
+    if options.record:
+        os.makedirs(options.directory, exist_ok=True)
+        for name in layouts:
+            for seed in seeds:
+                mapLayout, cars, geneStr = makeScenario(name, seed, options.number)
+                for engine in (ReferenceEngine, HierarchyReferenceEngine):
+                    header = {'layout': name, 'seed': seed, 'fingerprint': fingerprint(mapLayout.compile()),
+                              'roads': len(mapLayout.roads), 'limit': options.limit, 'gene': geneStr, 'cars': cars,
+                              'hierarchy': engine.hierarchy}
+                    trace = record(engine, mapLayout, header)
+                    filename = traceName(options.directory, name, seed, engine.hierarchy)
+                    trace.save(filename)
+                    print(f'{filename}: {len(cars)} cars, {len(trace.cells) - 1} ticks, '
+                          f'{os.path.getsize(filename)} bytes')
+        return
+
+    failed = 0
+    for name in layouts:
+        mapLayout = goldenLayout(name)
+        for seed in seeds:
+            for hierarchy in (False, True):
+                engines = [e for e in options.engines.split(',') if ENGINES[e].hierarchy == hierarchy]
+                if not engines:
+                    continue
+                filename = traceName(options.directory, name, seed, hierarchy)
+                golden = loadTrace(filename)
+                if fingerprint(mapLayout.compile()) != golden.header['fingerprint']:
+                    raise Exception(f'{filename} was recorded on another version of {name}; record it again.')
+                for e in engines:
+                    difference = compare(golden, ENGINES[e], mapLayout)
+                    if difference is None:
+                        print(f'{e} {filename}: same')
+                    else:
+                        failed += 1
+                        tick, car, message = difference
+                        print(f"{e} {filename}: tick {tick}{'' if car is None else f', car {car}'}: {message}")
+    if failed:
+        print(f'{failed} runs differ')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
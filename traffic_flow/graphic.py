@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+
+from math import ceil
+from tkinter import *
+from .game import Info
+
+FIELD, ROAD, INTERSECTION, CROSSROAD = 0, 1, 2, 3
+COLORS = {FIELD: "#eee", ROAD: "#333", INTERSECTION: "#333", CROSSROAD: "#222"}
+
+# Pixels per map cell, from far out to close up.
+SCALES = [1 / 8, 1 / 4, 1 / 2, 1, 2, 4, 8, 12, 16, 24, 32]
+# Below this many pixels per cell cars are drawn as density blocks.
+DETAIL_SCALE = 4
+# Size in pixels of one density block.
+DENSITY_PIXELS = 8
+
+
+def densityBlocks(cars, x0, y0, x1, y1, block):
+    """Count the cars, given as (x, y, way), inside [x0, x1) x [y0, y1) per `block` x `block` cells."""
+    counts = {}
+    for x, y, way in cars:
+        if x0 <= x < x1 and y0 <= y < y1:
+            key = ((x - x0) // block, (y - y0) // block)
+            counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def densityColor(count, block):
+    """From light orange for a single car to dark red for a block full of traffic."""
+    d = min(1.0, count / max(1.0, block * block / 4))
+    return f"#{255 - int(80 * d):02x}{int(200 * (1 - d)):02x}{int(120 * (1 - d)):02x}"
+
+
+class Graphic:
+    def __init__(self, graphInfo, carList, trafficlightList, gridsize=10, viewWidth=1000, viewHeight=700, snapshots=None):
+        """
+        Initialize the graphic window with traffic flow visualization.
+
+        With `snapshots`, a `snapshot.SnapshotBuffer`, every frame shows the
+        latest published tick instead of reading `carList` while it changes.
+        Without them the lights are read from `trafficlightList`, which the
+        CarMap only keeps up to date after `CarMap.showLights()`.
+
+        The static map is rendered once into an image with one pixel per cell;
+        the canvas shows a scaled viewport of it. Drag to pan, use the mouse
+        wheel or +/- to zoom and the arrow keys to scroll. Only cars and lights
+        inside the viewport are drawn.
+        """
+        self.master = Tk()
+        self.master.title("Traffic Flow Optimization")
+
+        # Create frames for the layout
+        self.frame1 = Frame(self.master)
+        self.frame1.pack()
+        self.frame2 = Frame(self.master)
+        self.frame2.pack()
+
+        # Initialize graph dimensions and data
+        wid = graphInfo.width
+        hei = graphInfo.height
+        data = [[0] * hei for _ in range(wid)]
+
+        self.mapWidth = wid
+        self.mapHeight = hei
+        self.scale = min(SCALES, key=lambda s: abs(s - gridsize))
+        self.width = min(wid * gridsize, viewWidth)
+        self.height = min(hei * gridsize, viewHeight)
+        self.originX = 0
+        self.originY = 0
+        self.cars = carList
+        self.trafficlights = trafficlightList
+        self.snapshots = snapshots
+        self.snapshot = None
+
+        # Create canvas for drawing
+        self.canvas = Canvas(self.frame1, width=self.width, height=self.height, background=COLORS[FIELD])
+        self.canvas.pack()
+
+        # Initialize data from the provided graph info
+        self.initDataFromInfo(graphInfo, data)
+        self.data = data
+        self.drawRoadAndBuilding(data, wid, hei)
+
+        # Add buttons for stop/play and quit
+        self.stopButton = Button(self.frame2, text="Stop/Play", command=self.stopOrContinue)
+        self.stopButton.grid(row=0, column=0)
+
+        self.quitButton = Button(self.frame2, text="Quit", command=self.quit)
+        self.quitButton.grid(row=0, column=1)
+
+        self.isStop = False
+        self.graphicItem = []
+        self.graphicItemShadow = []
+        self.graphicItemShadow2 = []
+        self.overlayItem = []
+        self.densityShown = False
+        self.bindViewport()
+        self.drawViewport()
+
+    def run(self, fps=20):
+        """Start the main event loop with specified frames per second."""
+        self.fps = fps
+        self.frameTime = 1000 // self.fps
+        self.frame1.after(self.frameTime, self.updateElement)
+        self.master.mainloop()
+
+    def initDataFromInfo(self, graphInfo, data):
+        """Initialize data array based on the provided graph information."""
+        for x in range(graphInfo.width):
+            for y in range(graphInfo.height):
+                info = graphInfo.get(x, y)
+                dataType = info[0] if isinstance(info, tuple) else info
+                if dataType == Info.CROSSROAD:
+                    data[x][y] = CROSSROAD
+                elif dataType == Info.INTERSECTION:
+                    data[x][y] = INTERSECTION
+                elif dataType == Info.ROAD:
+                    data[x][y] = ROAD
+                else:
+                    data[x][y] = FIELD
+
+    def drawRoadAndBuilding(self, data, wid, hei):
+        """Render roads and buildings once into an image with one pixel per cell."""
+        rows = []
+        for y in range(hei):
+            rows.append("{" + " ".join(COLORS[data[x][y]] for x in range(wid)) + "}")
+        self.background = PhotoImage(master=self.master, width=wid, height=hei)
+        self.background.put(" ".join(rows), to=(0, 0))
+        self.view = PhotoImage(master=self.master, width=self.width, height=self.height)
+        self.viewItem = self.canvas.create_image(0, 0, anchor=NW, image=self.view)
+
+    def bindViewport(self):
+        self.canvas.bind("<ButtonPress-1>", self.startDrag)
+        self.canvas.bind("<B1-Motion>", self.drag)
+        self.canvas.bind("<MouseWheel>", lambda e: self.zoomAt(1 if e.delta > 0 else -1, e.x, e.y))
+        self.canvas.bind("<Button-4>", lambda e: self.zoomAt(1, e.x, e.y))
+        self.canvas.bind("<Button-5>", lambda e: self.zoomAt(-1, e.x, e.y))
+        self.master.bind("<plus>", lambda e: self.zoomAt(1, self.width / 2, self.height / 2))
+        self.master.bind("<equal>", lambda e: self.zoomAt(1, self.width / 2, self.height / 2))
+        self.master.bind("<minus>", lambda e: self.zoomAt(-1, self.width / 2, self.height / 2))
+        self.master.bind("<Left>", lambda e: self.pan(-self.width / 4, 0))
+        self.master.bind("<Right>", lambda e: self.pan(self.width / 4, 0))
+        self.master.bind("<Up>", lambda e: self.pan(0, -self.height / 4))
+        self.master.bind("<Down>", lambda e: self.pan(0, self.height / 4))
+
+    def visibleCells(self):
+        """The cell range (x0, y0, x1, y1) shown in the viewport, end exclusive."""
+        x0 = int(self.originX)
+        y0 = int(self.originY)
+        x1 = min(self.mapWidth, x0 + int(ceil(self.width / self.scale)) + 1)
+        y1 = min(self.mapHeight, y0 + int(ceil(self.height / self.scale)) + 1)
+        return x0, y0, x1, y1
+
+    def clampOrigin(self):
+        maxX = max(0, self.mapWidth - self.width / self.scale)
+        maxY = max(0, self.mapHeight - self.height / self.scale)
+        self.originX = min(max(0, self.originX), maxX)
+        self.originY = min(max(0, self.originY), maxY)
+
+    def toScreen(self, x, y):
+        return (x - int(self.originX)) * self.scale, (y - int(self.originY)) * self.scale
+
+    def startDrag(self, event):
+        self.dragFrom = (event.x, event.y)
+
+    def drag(self, event):
+        dx = self.dragFrom[0] - event.x
+        dy = self.dragFrom[1] - event.y
+        self.dragFrom = (event.x, event.y)
+        self.pan(dx, dy)
+
+    def pan(self, dx, dy):
+        """Move the viewport by (dx, dy) pixels."""
+        self.originX += dx / self.scale
+        self.originY += dy / self.scale
+        self.drawViewport()
+
+    def zoomAt(self, step, px, py):
+        """Zoom one level in (step 1) or out (step -1), keeping the cell under (px, py) in place."""
+        level = SCALES.index(self.scale) + step
+        if not 0 <= level < len(SCALES):
+            return
+        cellX = self.originX + px / self.scale
+        cellY = self.originY + py / self.scale
+        self.scale = SCALES[level]
+        self.originX = cellX - px / self.scale
+        self.originY = cellY - py / self.scale
+        self.drawViewport()
+
+    def drawViewport(self):
+        """Copy the visible part of the background into the view, scaled."""
+        self.clampOrigin()
+        x0, y0, x1, y1 = self.visibleCells()
+        self.view.blank()
+        if self.scale >= 1:
+            self.master.tk.call(self.view, 'copy', self.background, '-from', x0, y0, x1, y1,
+                                '-zoom', int(self.scale), int(self.scale))
+        else:
+            self.master.tk.call(self.view, 'copy', self.background, '-from', x0, y0, x1, y1,
+                                '-subsample', int(1 / self.scale), int(1 / self.scale))
+
+        # Intersection markings are only visible close up.
+        for item in self.overlayItem:
+            self.canvas.delete(item)
+        self.overlayItem = []
+        if self.scale >= 8:
+            s = self.scale
+            for x in range(x0, x1):
+                for y in range(y0, y1):
+                    if self.data[x][y] == INTERSECTION:
+                        pos_x, pos_y = self.toScreen(x, y)
+                        self.overlayItem.append(self.canvas.create_line(pos_x, pos_y, pos_x+s, pos_y+s, fill="#b93"))
+                        self.overlayItem.append(self.canvas.create_line(pos_x+s, pos_y, pos_x, pos_y+s, fill="#b93"))
+
+    def carStates(self):
+        """(x, y, way) of every car to draw."""
+        if self.snapshots is None:
+            return [(car.pos[0], car.pos[1], car.way) for car in self.cars if car.display]
+        if self.snapshot is None:
+            return []
+        return self.snapshot.carStates()
+
+    def lightStates(self):
+        """(position, isGreen) of every traffic light."""
+        if self.snapshots is None:
+            return [(light.pos, light.isGreen) for light in self.trafficlights]
+        if self.snapshot is None:
+            return []
+        return [(light.pos, green == 1) for light, green in zip(self.trafficlights, self.snapshot.lights)]
+
+    def updateElement(self):
+        """Update the elements on the canvas (traffic lights, cars, etc.)."""
+        gridsize = self.scale
+        if self.snapshots is not None:
+            self.snapshot = self.snapshots.latest()
+        x0, y0, x1, y1 = self.visibleCells()
+
+        # Clear previous shadow items
+        for item in self.graphicItemShadow2:
+            self.canvas.delete(item)
+
+        if gridsize < DETAIL_SCALE:
+            # Far out: shade blocks of cells by how many cars they hold.
+            for item in self.graphicItemShadow + self.graphicItem:
+                self.canvas.delete(item)
+            self.graphicItemShadow2 = []
+            self.graphicItemShadow = []
+            self.graphicItem = []
+            self.densityShown = True
+            block = max(1, int(DENSITY_PIXELS / gridsize))
+            size = block * gridsize
+            for (bx, by), count in densityBlocks(self.carStates(), x0, y0, x1, y1, block).items():
+                pos_x, pos_y = bx * size, by * size
+                self.graphicItem.append(self.canvas.create_rectangle(
+                    pos_x, pos_y, pos_x+size, pos_y+size, fill=densityColor(count, block), width=0))
+            if not self.isStop:
+                self.frame1.after(self.frameTime, self.updateElement)
+            return
+
+        if self.graphicItem and self.densityShown:
+            for item in self.graphicItem:
+                self.canvas.delete(item)
+            self.graphicItem = []
+        self.densityShown = False
+
+        self.graphicItemShadow2 = self.graphicItemShadow
+        self.graphicItemShadow = self.graphicItem
+        self.graphicItem = []
+
+        # Update traffic lights
+        for (x, y), isGreen in self.lightStates():
+            if not (x0 <= x < x1 and y0 <= y < y1):
+                continue
+            pos_x, pos_y = self.toScreen(x, y)
+            colorToDraw = "#f00" if not isGreen else "#0c0"
+            coords = [pos_x+1, pos_y+1, pos_x+gridsize-1, pos_y+gridsize-1]
+            self.graphicItem.append(self.canvas.create_rectangle(coords, fill=colorToDraw))
+
+        # Update shadow items
+        for item in self.graphicItemShadow2:
+            self.canvas.itemconfig(item, fill="#433")
+        for item in self.graphicItemShadow:
+            self.canvas.itemconfig(item, fill="#543")
+
+        # Update cars
+        for x, y, way in self.carStates():
+            if not (x0 <= x < x1 and y0 <= y < y1):
+                continue
+            pos_x, pos_y = self.toScreen(x, y)
+
+            if way == "N":
+                coords = [pos_x+gridsize/2, pos_y+2, pos_x+2, pos_y+gridsize-2, pos_x+gridsize/2, pos_y+2+gridsize/2, pos_x+gridsize-2, pos_y+gridsize-2]
+            elif way == "W":
+                coords = [pos_x+2, pos_y+gridsize/2, pos_x+gridsize-2, pos_y+gridsize-2, pos_x+2+gridsize/2, pos_y+gridsize/2, pos_x+gridsize-2, pos_y+2]
+            elif way == "S":
+                coords = [pos_x+gridsize/2, pos_y+gridsize-2, pos_x+gridsize-2, pos_y+2, pos_x+gridsize/2, pos_y-2+gridsize/2, pos_x+2, pos_y+2]
+            else:
+                coords = [pos_x+gridsize-2, pos_y+gridsize/2, pos_x+2, pos_y+2, pos_x-2+gridsize/2, pos_y+gridsize/2, pos_x+2, pos_y+gridsize-2]
+            self.graphicItem.append(self.canvas.create_polygon(coords, fill="#f96"))
+
+        # Update at the next frame
+        if not self.isStop:
+            self.frame1.after(self.frameTime, self.updateElement)
+
+    def stopOrContinue(self):
+        """Toggle between stopping and continuing the animation."""
+        self.isStop = not self.isStop
+        if not self.isStop:
+            self.frame1.after(self.frameTime, self.updateElement)
+
+    def quit(self):
+        """Quit the program."""
+        print("Program End!")
+        self.master.destroy()
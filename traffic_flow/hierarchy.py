@@ -0,0 +1,326 @@
+# hierarchy.py
+
+import heapq
+import json
+import sys
+import zlib
+from array import array
+
+MAGIC = b'TFROUTES1\n'
+INF = float('inf')
+
+
+class ContractionHierarchy(object):
+    """
+    A contraction hierarchy over the nodes of a RoadGraph, for the shortest
+    routes of `CarMap.getDirection` on layouts too large to search whole.
+
+    Entering a road costs its length, and any road leaving a node can follow
+    any road entering it, so the cost of a route from road `s` to road `t` is
+    the distance between the end node of `s` and the start node of `t` plus
+    the length of `t`. Nodes are contracted one at a time, least important
+    first; when a node is taken out, its neighbours get a shortcut wherever
+    it was on their only shortest connection. Every node keeps its edges to
+    the nodes contracted after it, CSR style like the RoadGraph:
+    - `up`: edges leaving the node, to `upTarget` at `upWeight`;
+    - `down`: edges entering the node, from `downSource` at `downWeight`;
+    - `upVia`, `downVia`: the node a shortcut bypasses, or `~road` for an
+      edge that is a road.
+    A query searches upwards from both ends and meets at the most important
+    node of the route, so it settles a few hundred nodes even on city-sized
+    grids. Distances are exactly those of a full search; among routes of the
+    same length the one returned may differ, so runs routed with it are kept
+    apart from the others (`main.Result.hierarchy`, the `-ch` golden traces).
+    """
+
+    ARRAYS = ('rank', 'upOffset', 'upTarget', 'upWeight', 'upVia',
+              'downOffset', 'downSource', 'downWeight', 'downVia')
+
+    def __init__(self, graph, arrays=None, witnessLimit=60):
+        self.graph = graph
+        self.nodeN = graph.nodeN
+        self.fingerprint = fingerprint(graph)
+        if arrays is None:
+            arrays = self.contract(graph, witnessLimit)
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+
+    def arrays(self):
+        return dict((name, getattr(self, name)) for name in self.ARRAYS)
+
+    def contract(self, graph, witnessLimit):
+        """Order and contract every node; returns the arrays of the hierarchy."""
+        n = graph.nodeN
+        out = [{} for _ in range(n)]
+        into = [{} for _ in range(n)]
+        for r in range(graph.roadN):
+            u, x = graph.roadStart[r], graph.roadEnd[r]
+            if u != x and graph.length[r] < out[u].get(x, (INF,))[0]:
+                out[u][x] = into[x][u] = (graph.length[r], ~r)
+
+        # Contracted neighbours and the depth below each node, to spread the contraction evenly.
+        deleted = [0] * n
+        level = [0] * n
+        heap = [(self.priority(v, out, into, deleted, level, witnessLimit)[0], v) for v in range(n)]
+        heapq.heapify(heap)
+        rank = array('i', [0] * n)
+        up = [None] * n
+        down = [None] * n
+        order = 0
+        while heap:
+            (_, v) = heapq.heappop(heap)
+            # Priorities go stale as neighbours are contracted: check again before taking it.
+            p, shortcuts = self.priority(v, out, into, deleted, level, witnessLimit)
+            if heap and p > heap[0][0]:
+                heapq.heappush(heap, (p, v))
+                continue
+
+            rank[v] = order
+            order += 1
+            up[v] = sorted(out[v].items())
+            down[v] = sorted(into[v].items())
+            for x in out[v]:
+                del into[x][v]
+                deleted[x] += 1
+                level[x] = max(level[x], level[v] + 1)
+            for u in into[v]:
+                del out[u][v]
+                deleted[u] += 1
+                level[u] = max(level[u], level[v] + 1)
+            for (u, x, cost) in shortcuts:
+                if cost < out[u].get(x, (INF,))[0]:
+                    out[u][x] = into[x][u] = (cost, v)
+            out[v] = into[v] = None
+
+        a = dict((name, array('i')) for name in self.ARRAYS)
+        a['rank'] = rank
+        for (edges, offset, other, weight, via) in ((up, 'upOffset', 'upTarget', 'upWeight', 'upVia'),
+                                                    (down, 'downOffset', 'downSource', 'downWeight', 'downVia')):
+            a[offset].append(0)
+            for v in range(n):
+                for (x, (w, m)) in edges[v]:
+                    a[other].append(x)
+                    a[weight].append(w)
+                    a[via].append(m)
+                a[offset].append(len(a[other]))
+        return a
+
+    def priority(self, v, out, into, deleted, level, witnessLimit):
+        """
+        How much contracting `v` now would cost: mostly the shortcuts it needs
+        less the edges it removes. Also returns the shortcuts.
+        """
+        shortcuts = []
+        for u, (wu, _) in into[v].items():
+            targets = dict((x, wu + wx) for x, (wx, _) in out[v].items() if x != u)
+            if not targets:
+                continue
+            dist = witness(u, v, out, targets, witnessLimit)
+            for x, cost in targets.items():
+                if dist.get(x, INF) > cost:
+                    shortcuts.append((u, x, cost))
+        return 4 * (len(shortcuts) - len(into[v]) - len(out[v])) + deleted[v] + 2 * level[v], shortcuts
+
+    def search(self, source, target):
+        """
+        Bidirectional upward search between two nodes. Returns the distance,
+        the node where the searches met and the parents of both sides.
+        """
+        upOffset, upTarget, upWeight, upVia = self.upOffset, self.upTarget, self.upWeight, self.upVia
+        downOffset, downSource, downWeight, downVia = self.downOffset, self.downSource, self.downWeight, self.downVia
+
+        forward, fparent = {source: 0}, {}
+        backward, bparent = {target: 0}, {}
+        fheap = [(0, source)]
+        bheap = [(0, target)]
+        best, meet = INF, None
+        while fheap or bheap:
+            # Always extend the side with the nearer node: once that is as far
+            # as the best meeting, neither side can find a shorter one.
+            if fheap and (not bheap or fheap[0][0] <= bheap[0][0]):
+                (d, x) = heapq.heappop(fheap)
+                if d >= best:
+                    break
+                if d > forward[x]:
+                    continue
+                if d + backward.get(x, INF) < best:
+                    best, meet = d + backward[x], x
+                for k in range(upOffset[x], upOffset[x + 1]):
+                    y, nd = upTarget[k], d + upWeight[k]
+                    if nd < forward.get(y, INF):
+                        forward[y] = nd
+                        fparent[y] = (x, upVia[k])
+                        heapq.heappush(fheap, (nd, y))
+            else:
+                (d, x) = heapq.heappop(bheap)
+                if d >= best:
+                    break
+                if d > backward[x]:
+                    continue
+                if d + forward.get(x, INF) < best:
+                    best, meet = d + forward[x], x
+                for k in range(downOffset[x], downOffset[x + 1]):
+                    y, nd = downSource[k], d + downWeight[k]
+                    if nd < backward.get(y, INF):
+                        backward[y] = nd
+                        bparent[y] = (x, downVia[k])
+                        heapq.heappush(bheap, (nd, y))
+        return best, meet, fparent, bparent
+
+    def distance(self, startRoad, endRoad, sameway=False):
+        """The cost of the roads entered after `startRoad` up to `endRoad`, like `route`."""
+        if startRoad == endRoad and not sameway:
+            return 0
+        g = self.graph
+        best = self.search(g.roadEnd[startRoad], g.roadStart[endRoad])[0]
+        if best == INF:
+            raise Exception(f'Road {endRoad} cannot be reached from road {startRoad}.')
+        return best + g.length[endRoad]
+
+    def route(self, startRoad, endRoad, sameway=False):
+        """
+        The distance and the roads from `startRoad` to `endRoad`, both
+        included. With `sameway` the route leaves `startRoad` and comes back
+        to it, as when the end lies behind the start on the same road.
+        """
+        if startRoad == endRoad and not sameway:
+            return 0, [startRoad]
+        g = self.graph
+        best, meet, fparent, bparent = self.search(g.roadEnd[startRoad], g.roadStart[endRoad])
+        if best == INF:
+            raise Exception(f'Road {endRoad} cannot be reached from road {startRoad}.')
+
+        edges = []
+        x = meet
+        while x in fparent:
+            (p, via) = fparent[x]
+            edges.append((p, x, via))
+            x = p
+        roads = [startRoad]
+        for (a, b, via) in reversed(edges):
+            self.unpack(a, b, via, roads)
+        x = meet
+        while x in bparent:
+            (y, via) = bparent[x]
+            self.unpack(x, y, via, roads)
+            x = y
+        roads.append(endRoad)
+        return best + g.length[endRoad], roads
+
+    def unpack(self, a, b, via, roads):
+        """Append the roads of the edge from node `a` to node `b` to `roads`, expanding shortcuts."""
+        stack = [(a, b, via)]
+        while stack:
+            (a, b, via) = stack.pop()
+            if via < 0:
+                roads.append(~via)
+                continue
+            # Both halves of a shortcut touch the node it bypasses, contracted before a and b.
+            stack.append((via, b, self.via(self.upOffset, self.upTarget, self.upVia, via, b)))
+            stack.append((a, via, self.via(self.downOffset, self.downSource, self.downVia, via, a)))
+
+    def via(self, offset, other, via, v, x):
+        for k in range(offset[v], offset[v + 1]):
+            if other[k] == x:
+                return via[k]
+        raise Exception(f'The hierarchy has no edge between nodes {v} and {x}.')
+
+    def save(self, filename):
+        """Write the arrays as raw machine integers after a one-line JSON header."""
+        header = {'byteorder': sys.byteorder, 'nodes': self.nodeN, 'fingerprint': self.fingerprint,
+                  'sizes': [len(getattr(self, name)) for name in self.ARRAYS]}
+        with open(filename, 'wb') as f:
+            f.write(MAGIC)
+            f.write(json.dumps(header).encode() + b'\n')
+            for name in self.ARRAYS:
+                getattr(self, name).tofile(f)
+
+
+def witness(source, skip, out, targets, limit):
+    """
+    Distances from `source` without passing `skip`, searched until every
+    target is settled, the costs of all routes through `skip` are exceeded or
+    `limit` nodes are settled. Missing a witness only costs a shortcut.
+    """
+    bound = max(targets.values())
+    left = len(targets)
+    dist = {source: 0}
+    heap = [(0, source)]
+    settled = 0
+    while heap and left and settled < limit:
+        (d, x) = heapq.heappop(heap)
+        if d > dist[x]:
+            continue
+        if d > bound:
+            break
+        settled += 1
+        if x in targets:
+            left -= 1
+        for y, (w, _) in out[x].items():
+            if y != skip and d + w < dist.get(y, INF):
+                dist[y] = d + w
+                heapq.heappush(heap, (d + w, y))
+    return dist
+
+
+def fingerprint(graph):
+    """A checksum of the road lengths and connections, to tell a hierarchy belongs to a graph."""
+    crc = 0
+    for name in ('length', 'roadStart', 'roadEnd'):
+        crc = zlib.crc32(getattr(graph, name), crc)
+    return crc
+
+
+def loadHierarchy(filename, graph):
+    """Read a hierarchy written by `ContractionHierarchy.save` for `graph`."""
+    with open(filename, 'rb') as f:
+        if f.readline() != MAGIC:
+            raise Exception(f'{filename} is not a routing hierarchy.')
+        header = json.loads(f.readline())
+        if header['nodes'] != graph.nodeN or header['fingerprint'] != fingerprint(graph):
+            raise Exception(f'{filename} was built for another layout.')
+        arrays = {}
+        for name, size in zip(ContractionHierarchy.ARRAYS, header['sizes']):
+            arrays[name] = array('i')
+            arrays[name].fromfile(f, size)
+    if header['byteorder'] != sys.byteorder:
+        for a in arrays.values():
+            a.byteswap()
+    return ContractionHierarchy(graph, arrays)
+
+
+if __name__ == '__main__':
+    """
+    > python hierarchy.py 100 saved/grid100.ch
+    """
+    import random
+    from time import time
+    from .map_generator import generateLayout
+    from .car import CarMap
+
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    mapLayout = generateLayout('grid', rows=size, cols=size)
+    carmap = CarMap(mapLayout, None)
+    graph = carmap.graph
+    startTime = time()
+    hierarchy = ContractionHierarchy(graph)
+    print(f'{graph.nodeN} nodes contracted in {time() - startTime:.2f}s, '
+          f'{len(hierarchy.upTarget) + len(hierarchy.downSource)} edges')
+    if len(sys.argv) > 2:
+        hierarchy.save(sys.argv[2])
+        startTime = time()
+        hierarchy = loadHierarchy(sys.argv[2], graph)
+        print(f'Saved to {sys.argv[2]} and read back in {time() - startTime:.3f}s')
+
+    cells = [p for road in mapLayout.roads for p in road.getPositions()]
+    pairs = [(random.choice(cells), random.choice(cells)) for _ in range(200)]
+    startTime = time()
+    full = [carmap.getDirection(s, e) for s, e in pairs]
+    fullTime = time() - startTime
+    carmap.setHierarchy(hierarchy)
+    startTime = time()
+    fast = [carmap.getDirection(s, e) for s, e in pairs]
+    fastTime = time() - startTime
+    assert [d for d, _ in full] == [d for d, _ in fast]
+    print(f'{len(pairs)} routes: {fullTime / len(pairs) * 1e6:.0f}us each searching the whole map, '
+          f'{fastTime / len(pairs) * 1e6:.0f}us with the hierarchy, same distances')
@@ -0,0 +1,277 @@
+# layout.py
+
+import os
+from array import array
+from .game import Info, Intersection, Crossroad, Road
+
+class Layout(object):
+    """
+    A Layout parses the map into a Graph.
+    """
+
+    def __init__(self, layoutText):
+        """Initialize the layout based on the provided layout text."""
+        self.width = len(layoutText[0])
+        self.height = len(layoutText)
+        self.mapInfo = Info(self.width, self.height)
+        self.intersections = []
+        self.crossroads = []
+        self.roads = []
+        self.layoutText = layoutText
+        self.graph = None
+        self.parseLayoutText(layoutText)
+
+    def parseLayoutText(self, layoutText):
+        """
+        Parse all intersections and crossroads first, then parse the roads in the map.
+        """
+        self.__parseMap(layoutText)
+        self.__parseMap2(layoutText)
+
+    def __parseMap(self, layoutText):
+        """Parse intersections and crossroads."""
+        for y in range(self.height):
+            for x in range(self.width):
+                layoutChar = layoutText[y][x]
+                if self.mapInfo.get(x, y) is not None:
+                    continue
+                if layoutChar == '%':
+                    self.mapInfo.setField(x, y)
+                elif layoutChar == 'I':
+                    number = len(self.intersections)
+                    positions = self.__parseIntersection(layoutText, x, y, number)
+                    self.intersections.append(Intersection(number, positions))
+                elif layoutChar == 'C':
+                    number = len(self.crossroads)
+                    positions = self.__parseCrossroad(layoutText, x, y, number)
+                    self.crossroads.append(Crossroad(number, positions))
+
+    def __parseIntersection(self, layoutText, x, y, number):
+        """Parse an intersection and its connected positions."""
+        return self.__parseNode(layoutText, x, y, 'I', lambda x, y: self.mapInfo.setIntersection(x, y, number))
+
+    def __parseCrossroad(self, layoutText, x, y, number):
+        """Parse a crossroad and its connected positions."""
+        return self.__parseNode(layoutText, x, y, 'C', lambda x, y: self.mapInfo.setCrossroad(x, y, number))
+
+    def __parseNode(self, layoutText, x, y, char, mark):
+        """
+        Collect the cells marked `char` connected to (x, y), depth first in the
+        same order as a recursive walk, without recursing on large nodes.
+        """
+        mark(x, y)
+        positions = [(x, y)]
+        stack = [iter(self.__getPosNearBy(x, y))]
+        while stack:
+            for (nextX, nextY) in stack[-1]:
+                if layoutText[nextY][nextX] != char: continue
+                if self.mapInfo.get(nextX, nextY) is not None: continue
+                mark(nextX, nextY)
+                positions.append((nextX, nextY))
+                stack.append(iter(self.__getPosNearBy(nextX, nextY)))
+                break
+            else:
+                stack.pop()
+        return positions
+
+    def __parseMap2(self, layoutText):
+        """Parse the roads connecting intersections and crossroads."""
+        for node in self.intersections + self.crossroads:
+            for pos in node.getPositions():
+                for (nextX, nextY) in self.__getPosNearBy(pos[0], pos[1]):
+                    if self.mapInfo.get(nextX, nextY) is not None: continue
+                    (testX, testY) = self.__getNextPos(nextX, nextY, layoutText[nextY][nextX])
+                    if not (testX == pos[0] and testY == pos[1]):
+                        number = len(self.roads)
+                        positions, ways = self.__parseRoad(layoutText, nextX, nextY, number)
+                        start = self.mapInfo.get(pos[0], pos[1])
+                        end = positions.pop()
+                        self.roads.append(Road(number, positions, ways, start, end))
+                        self.__setInOutRoad(number, start, end)
+
+    def __parseRoad(self, layoutText, x, y, number):
+        """Follow a road cell by cell and collect its positions; the last item is the end node."""
+        positions = []
+        ways = []
+        posInfo = None
+        while posInfo is None:
+            self.mapInfo.setRoad(x, y, number)
+            positions.append((x, y))
+            ways.append(layoutText[y][x])
+            x, y = self.__getNextPos(x, y, layoutText[y][x])
+            posInfo = self.mapInfo.get(x, y)
+        positions.append(posInfo)
+        return positions, ways
+
+    def __setInOutRoad(self, number, start, end):
+        """Set the start and end roads for intersections and crossroads."""
+        if start[0] == Info.INTERSECTION:
+            self.intersections[start[1]].addOutRoad(number)
+        elif start[0] == Info.CROSSROAD:
+            self.crossroads[start[1]].addOutRoad(number)
+        if end[0] == Info.INTERSECTION:
+            self.intersections[end[1]].addInRoad(number)
+        elif end[0] == Info.CROSSROAD:
+            self.crossroads[end[1]].addInRoad(number)
+
+    def __getPosNearBy(self, x, y):
+        """Get the positions adjacent to (x, y)."""
+        positions = []
+        move = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+        for m in move:
+            nextX = x + m[0]
+            nextY = y + m[1]
+            if 0 <= nextX < self.width and 0 <= nextY < self.height:
+                positions.append((nextX, nextY))
+        return positions
+
+    def __getNextPos(self, x, y, direction):
+        """Get the next position based on the direction."""
+        if direction == 'N':
+            return x, y - 1
+        elif direction == 'S':
+            return x, y + 1
+        elif direction == 'E':
+            return x + 1, y
+        elif direction == 'W':
+            return x - 1, y
+
+    def getTrafficLights(self):
+        """Get the traffic lights for each intersection."""
+        return [(i.number, i.getInRoads()) for i in self.intersections]
+
+    def getLightPositions(self):
+        """
+        The traffic lights of `getTrafficLights` by position: the cells of each
+        intersection and the last cell of each of its in-roads. Used to carry
+        genes over to an edited layout.
+        """
+        return [(i.getPositions(), [self.roads[r].getPosByIndex(self.roads[r].getDistance() - 1) for r in i.getInRoads()])
+                for i in self.intersections]
+
+    def compile(self):
+        """The road network as a RoadGraph, built once and shared by every user of the layout."""
+        if self.graph is None:
+            self.graph = RoadGraph(self)
+        return self.graph
+
+
+class RoadGraph(object):
+    """
+    A compiled, read-only view of a layout's road network as flat integer arrays.
+
+    Nodes are numbered intersections first, then crossroads. Lists per road or
+    per node are stored CSR style: the items of road `r` are
+    `succ[succOffset[r]:succOffset[r + 1]]`, in the order of the layout lists.
+    - `length`, `roadStart`, `roadEnd`, `isLight`: per road; `isLight` is 1 for
+      a road ending at an intersection.
+    - `nodeKind`: 0 for an intersection, 1 for a crossroad.
+    - `succ`, `pred`: the roads leaving the end node and entering the start node.
+    - `lights`: the in-roads of every intersection, in gene order.
+    """
+
+    ARRAYS = ('length', 'roadStart', 'roadEnd', 'isLight', 'nodeKind',
+              'succOffset', 'succ', 'predOffset', 'pred', 'lightOffset', 'lights')
+
+    def __init__(self, layout):
+        self.intersectionN = len(layout.intersections)
+        nodes = list(layout.intersections) + list(layout.crossroads)
+        self.nodeN = len(nodes)
+        self.roadN = len(layout.roads)
+
+        a = dict((name, array('i')) for name in self.ARRAYS)
+        a['nodeKind'].extend([0] * self.intersectionN + [1] * (self.nodeN - self.intersectionN))
+        for road in layout.roads:
+            a['length'].append(road.getDistance())
+            a['roadStart'].append(self.nodeId(road.getStart()))
+            a['roadEnd'].append(self.nodeId(road.getEnd()))
+            a['isLight'].append(1 if road.getEnd()[0] == Info.INTERSECTION else 0)
+
+        for name in ('succOffset', 'predOffset', 'lightOffset'):
+            a[name].append(0)
+        for r in range(self.roadN):
+            a['succ'].extend(nodes[a['roadEnd'][r]].getOutRoads())
+            a['succOffset'].append(len(a['succ']))
+            a['pred'].extend(nodes[a['roadStart'][r]].getInRoads())
+            a['predOffset'].append(len(a['pred']))
+        for it in layout.intersections:
+            a['lights'].extend(it.getInRoads())
+            a['lightOffset'].append(len(a['lights']))
+
+        self.__setArrays(a)
+
+    def __setArrays(self, arrays):
+        for name in self.ARRAYS:
+            setattr(self, name, memoryview(arrays[name]).toreadonly())
+
+    def __getstate__(self):
+        return {'intersectionN': self.intersectionN, 'nodeN': self.nodeN, 'roadN': self.roadN,
+                'arrays': self.arrays()}
+
+    def __setstate__(self, state):
+        arrays = state.pop('arrays')
+        self.__dict__.update(state)
+        self.__setArrays(arrays)
+
+    def nodeId(self, info):
+        nodeType, number = info
+        return number if nodeType == Info.INTERSECTION else self.intersectionN + number
+
+    def successors(self, r):
+        return self.succ[self.succOffset[r]:self.succOffset[r + 1]]
+
+    def predecessors(self, r):
+        return self.pred[self.predOffset[r]:self.predOffset[r + 1]]
+
+    def lightRoads(self, n):
+        """The in-roads of intersection `n`, one traffic light each."""
+        return self.lights[self.lightOffset[n]:self.lightOffset[n + 1]]
+
+    def successorLists(self):
+        """`succ` as one list per road, for loops that run many times over the same roads."""
+        return [self.succ[self.succOffset[r]:self.succOffset[r + 1]].tolist() for r in range(self.roadN)]
+
+    def predecessorLists(self):
+        return [self.pred[self.predOffset[r]:self.predOffset[r + 1]].tolist() for r in range(self.roadN)]
+
+    def arrays(self):
+        """Copies of the arrays by name, e.g. for `shared.SharedArrays.create` or export."""
+        return dict((name, array('i', getattr(self, name))) for name in self.ARRAYS)
+
+
+# The layouts shipped next to the code, whatever the working directory.
+LAYOUTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'layouts')
+
+
+# Call by Game?
+def getLayout(name):
+    """Load a layout from file with the given name, in LAYOUTS or else as a path."""
+    fullname = name if name.endswith('.lay') else name + '.lay'
+    layout = tryToLoad(os.path.join(LAYOUTS, fullname))
+    if layout is None:
+        layout = tryToLoad(fullname)
+    return layout
+
+def tryToLoad(fullname):
+    """Try loading the layout file and return a Layout object."""
+    if not os.path.exists(fullname):
+        return None
+    with open(fullname) as f:
+        return Layout([line.strip() for line in f])
+
+if __name__ == '__main__':
+    l = getLayout('double_cross')
+    # Uncomment below lines for debugging/inspecting the layout
+    # print('crossroads')
+    # for c in l.crossroads:
+    #     print(c.getPositions())
+    # print('intersections')
+    # for it in l.intersections:
+    #     print(it.getPositions())
+    #     print(it.getOutRoads())
+    # print('roads')
+    # for r in l.roads:
+    #     print(r.getPositions())
+    #     print(r.getStart())
+    #     print(r.getEnd())
+    print(l.getTrafficLights())
@@ -0,0 +1,330 @@
+# main.py
+
+import os
+import sys
+from optparse import OptionParser
+
+from .layout import getLayout
+from .car import CarMap
+from .simulate import Simulation
+from .ga import Gene, GeneInfo, GeneEvolve
+from .generation import Generation
+from .reroute import Router
+from .controller import ActuatedController
+from .metrics import RoadMetrics
+from .demand import Demand, saveDemand, loadDemand
+from .hierarchy import ContractionHierarchy, loadHierarchy
+from .descent import CoordinateDescent
+
+# Results are saved next to the traffic_flow package, whatever the working directory.
+SAVED = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'saved')
+
+
+def parseArgs(argv):
+    """
+    Parse the command-line arguments.
+    """
+    parser = OptionParser()
+    parser.add_option('-l', '--layout', dest='layout', type='str', default='single_cross')
+    parser.add_option('-n', '--number', dest='number', type='int', default=10)
+    parser.add_option('-z', '--zoom', dest='size', type='int', default=16)
+    parser.add_option('-d', '--delay', dest='delay', type='float', default=0.2)
+    parser.add_option('--fast', action='store_true', dest='fast', default=False)
+    parser.add_option('-g', '--generation', dest='generation', type='int', default=20)
+    parser.add_option('-a', '--amount', dest='amount', type='int', default=20)
+    parser.add_option('-s', '--save', dest='save', type='str', default='save.p')
+    parser.add_option('-r', '--load', dest='load', type='str', default='')
+    parser.add_option('--no_display', action='store_false', dest='display', default=True)
+    parser.add_option('--no_simulate', action='store_false', dest='simulate', default=True)
+    parser.add_option('--reroute', action='store_true', dest='reroute', default=False)
+    parser.add_option('--actuated', action='store_true', dest='actuated', default=False)
+    parser.add_option('-w', '--warm', dest='warm', type='str', default='')
+    parser.add_option('--patience', dest='patience', type='int', default=None)
+    parser.add_option('--min_diversity', dest='minDiversity', type='float', default=None)
+    parser.add_option('--time_budget', dest='timeBudget', type='float', default=None)
+    parser.add_option('--eval_budget', dest='evalBudget', type='int', default=None)
+    parser.add_option('-m', '--metrics', dest='metrics', type='str', default='')
+    parser.add_option('--metrics_every', dest='metricsEvery', type='int', default=10)
+    parser.add_option('-v', '--verbose', dest='verbose', type='int', default=1)
+    parser.add_option('--telemetry', dest='telemetry', type='str', default='')
+    parser.add_option('--demand', dest='demand', type='str', default='')
+    parser.add_option('--hierarchy', dest='hierarchy', type='str', default='')
+    parser.add_option('--snapshot_every', dest='snapshotEvery', type='int', default=None)
+    parser.add_option('--race_ticks', dest='raceTicks', type='int', default=None)
+    parser.add_option('--race_confidence', dest='raceConfidence', type='float', default=0.95)
+    parser.add_option('--descent', action='store_true', dest='descent', default=False)
+    parser.add_option('--radius', dest='radius', type='int', default=1)
+    parser.add_option('--validate_every', dest='validateEvery', type='int', default=10)
+
+    options, otherjunk = parser.parse_args(argv)
+    if otherjunk:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+
+    arguments = {
+        'layoutName': options.layout,
+        'layout': getLayout(options.layout),
+        'display': options.display,
+        'simulate': options.simulate,
+        'number': options.number,
+        'size': options.size,
+        'delay': options.delay,
+        'fast': options.fast,
+        'generation': options.generation,
+        'amount': options.amount,
+        'save': options.save,
+        'load': options.load,
+        'reroute': options.reroute,
+        'actuated': options.actuated,
+        'warm': options.warm,
+        'patience': options.patience,
+        'minDiversity': options.minDiversity,
+        'timeBudget': options.timeBudget,
+        'evalBudget': options.evalBudget,
+        'metrics': options.metrics,
+        'metricsEvery': options.metricsEvery,
+        'verbose': options.verbose,
+        'telemetry': options.telemetry or None,
+        'demand': options.demand,
+        'hierarchy': options.hierarchy,
+        'snapshotEvery': options.snapshotEvery,
+        'raceTicks': options.raceTicks,
+        'raceConfidence': options.raceConfidence,
+        'descent': options.descent,
+        'radius': options.radius,
+        'validateEvery': options.validateEvery,
+    }
+
+    if arguments['layout'] is None:
+        raise Exception(f"The layout '{options.layout}' can't be found.")
+
+    return arguments
+
+
+class Result:
+    def __init__(self, layout, cars, genes=(), lights=None, curve=(), hierarchy=False):
+        self.layout = layout
+        self.cars = cars
+        self.genes = list(genes)
+        self.lights = lights
+        self.curve = list(curve)
+        # Whether the cars were routed with --hierarchy, which picks other
+        # routes among those of the same length.
+        self.hierarchy = hierarchy
+
+
+def sameRouting(r, filename, hierarchy):
+    """Refuse to replay a saved run routed otherwise than this one: its cars would take other routes."""
+    if getattr(r, 'hierarchy', False) != hierarchy:
+        raise Exception(f"'{filename}' was run {'without' if hierarchy else 'with'} --hierarchy; "
+                        f"its cars take other routes, so run {'without' if hierarchy else 'with'} it too.")
+
+
+def checkpoint(g, args, mapLayout, cars):
+    """Save the best genes and the current population after every generation."""
+    genes = g.bestGenes(args['amount'] // 2 + 1)
+    genes += [x.geneStr for x in g.genes if x.geneStr not in genes]
+    save(Result(args['layoutName'], cars, genes, mapLayout.getLightPositions(), g.curve, args['hierarchy'] != ''),
+         args['save'])
+
+
+def warmStart(filename, mapLayout):
+    """
+    Seed genes from a saved run, carried over to `mapLayout` by intersection
+    position. Returns the seeds and the best average of each saved generation.
+    """
+    r = load(filename)
+    genes = getattr(r, 'genes', [])
+    if not genes:
+        raise Exception(f"'{filename}' holds no genes to start from.")
+    lights = getattr(r, 'lights', None)
+    if lights is None:
+        lights = getLayout(r.layout).getLightPositions()
+
+    newLights = mapLayout.getLightPositions()
+    seeds = []
+    kept = 0
+    for geneStr in genes:
+        seed, k = GeneEvolve.transfer(geneStr, lights, newLights)
+        seeds.append(seed)
+        kept += k
+    total = sum(len(roads) for _, roads in newLights) * len(seeds)
+    print(f'Warm start from {filename}: {len(seeds)} genes, {kept} of {total} durations kept')
+    return seeds, getattr(r, 'curve', [])
+
+
+def save(obj, filename):
+    import pickle
+
+    os.makedirs(SAVED, exist_ok=True)
+    with open(os.path.join(SAVED, filename), 'wb') as f:
+        pickle.dump(obj, f)
+
+
+def load(filename):
+    """Read a saved Result, also one pickled while main.py ran as a script."""
+    import pickle
+
+    class Unpickler(pickle.Unpickler):
+        def find_class(self, module, name):
+            if module in ('__main__', 'main') and name == 'Result':
+                return Result
+            return super().find_class(module, name)
+
+    with open(os.path.join(SAVED, filename), 'rb') as f:
+        return Unpickler(f).load()
+
+
+def run(args, simulation):
+    report(args, simulation, simulation.run(False, 100000))
+
+
+def display(args, mapLayout, carmap, simulation):
+    """
+    Run the simulation in a background thread, one tick every `delay` seconds
+    or as fast as possible with --fast, while the window draws its latest state.
+    The viewer and its Tk import are only loaded here.
+    """
+    from .graphic import Graphic
+    from .snapshot import SnapshotBuffer, SimulationThread
+
+    snapshots = SnapshotBuffer()
+    rate = None if args['fast'] or args['delay'] <= 0 else 1 / args['delay']
+    app = Graphic(mapLayout.mapInfo, carmap.cars, carmap.trafficlights, args['size'], snapshots=snapshots)
+    SimulationThread(simulation, snapshots, 100000, rate, lambda result: report(args, simulation, result)).start()
+    app.run()
+
+
+def report(args, simulation, result):
+    print(result)
+    if simulation.metrics is not None:
+        if args['metrics'].endswith('.csv'):
+            simulation.metrics.saveCSV(args['metrics'][:-4])
+        else:
+            simulation.metrics.save(args['metrics'])
+
+
+def makeMetrics(args, carmap):
+    if args['metrics'] == '':
+        return None
+    return RoadMetrics(carmap, args['metricsEvery'])
+
+
+def makeCars(args, mapLayout):
+    """
+    Random cars on distinct cells, or the cars saved in --demand; a missing
+    demand file is written with new random cars so later runs reuse them.
+    """
+    if args['demand'] and os.path.exists(args['demand']):
+        return loadDemand(args['demand'])
+    cars = Demand(mapLayout).uniform(args['number'])
+    if args['demand']:
+        saveDemand(cars, args['demand'])
+    return cars
+
+
+def makeHierarchy(args, carmap):
+    """
+    Route cars with the hierarchy saved in --hierarchy; a missing file is
+    built from the layout and written for later runs.
+    """
+    if args['hierarchy'] == '':
+        return
+    if os.path.exists(args['hierarchy']):
+        hierarchy = loadHierarchy(args['hierarchy'], carmap.graph)
+    else:
+        hierarchy = ContractionHierarchy(carmap.graph)
+        hierarchy.save(args['hierarchy'])
+    carmap.setHierarchy(hierarchy)
+
+
+def optimize(args):
+    """Evolve genes for the layout and save the best of them."""
+    mapLayout = args['layout']
+    carmap = CarMap(mapLayout, None)
+    makeHierarchy(args, carmap)
+    cars = makeCars(args, mapLayout)
+    router = Router(carmap) if args['reroute'] else None
+    controller = ActuatedController if args['actuated'] else None
+    seeds, previousCurve = warmStart(args['warm'], mapLayout) if args['warm'] else ([], [])
+    g = Generation(mapLayout, carmap, cars, args['amount'], args['generation'], router, controller,
+                   args['patience'], args['minDiversity'], args['timeBudget'], args['evalBudget'],
+                   seeds, previousCurve, lambda g: checkpoint(g, args, mapLayout, cars),
+                   args['verbose'], args['telemetry'], args['snapshotEvery'], args['raceTicks'], args['raceConfidence'])
+    results = g.run()
+
+    if args['verbose'] >= 1:
+        print("Best in each generation:\n")
+        for counter, r in enumerate(results[::2], start=1):
+            a, s = r
+            print(f"[{counter}] {a:.2f} {s}")
+
+        print('\n-----------------------------------------------------------\n')
+        print("Middle in each generation:\n")
+        for counter, r in enumerate(results[1::2], start=1):
+            a, s = r
+            print(f"[{counter}] {a:.2f} {s}")
+
+    checkpoint(g, args, mapLayout, cars)
+
+
+def descend(args):
+    """
+    Tune the lights one intersection at a time instead of with the GA, for at
+    most --generation passes over the intersections, and save the best gene.
+    """
+    if args['reroute'] or args['actuated']:
+        raise Exception('--descent needs fixed light cycles without rerouting.')
+    mapLayout = args['layout']
+    cars = makeCars(args, mapLayout)
+    seeds = warmStart(args['warm'], mapLayout)[0] if args['warm'] else [None]
+    cd = CoordinateDescent(mapLayout, cars, seeds[0], args['radius'], rounds=args['generation'],
+                           validateEvery=args['validateEvery'], verbose=args['verbose'])
+    makeHierarchy(args, cd.carmap)
+    geneStr = cd.run()
+    if args['verbose'] >= 1:
+        print(f"Best: {cd.best:.2f} {geneStr}")
+    save(Result(args['layoutName'], cars, [geneStr], mapLayout.getLightPositions(), cd.curve, args['hierarchy'] != ''),
+         args['save'])
+
+
+def simulateGene(args, mapLayout, gene, cars, show):
+    """Run the cars under one gene, in the viewer if `show`."""
+    carmap = CarMap(mapLayout, GeneInfo(gene))
+    makeHierarchy(args, carmap)
+    if cars is None:
+        cars = makeCars(args, mapLayout)
+    simulation = Simulation(cars, carmap, Router(carmap) if args['reroute'] else None, makeMetrics(args, carmap))
+    if args['actuated']:
+        carmap.setController(ActuatedController(carmap, gene))
+
+    if show:
+        display(args, mapLayout, carmap, simulation)
+    else:
+        run(args, simulation)
+
+
+def main(argv=None):
+    """
+    > python main.py
+    """
+    args = parseArgs(sys.argv[1:] if argv is None else argv)
+
+    if args['load'] == '':
+        if args['simulate'] and args['descent']:
+            descend(args)
+        elif args['simulate']:
+            optimize(args)
+        else:
+            mapLayout = args['layout']
+            simulateGene(args, mapLayout, Gene(mapLayout.getTrafficLights()), None, True)
+
+    else:
+        r = load(args['load'])
+        sameRouting(r, args['load'], args['hierarchy'] != '')
+        mapLayout = getLayout(r.layout)
+        geneStr = input('Input Gene String: ')
+        simulateGene(args, mapLayout, Gene(mapLayout.getTrafficLights(), False, geneStr), r.cars, args['display'])
+
+
+if __name__ == '__main__':
+    main()
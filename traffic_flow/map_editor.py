@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+
+from tkinter import *
+from tkinter import filedialog, messagebox
+import sys
+
+from .game import Info
+from .layout import Layout, LAYOUTS
+from .map_generator import expandGrid, countNeighbors, ROAD_DICT
+
+EMPTY, ROAD, CROSSROAD = 0, 1, 2
+COLORS = {EMPTY: "#efefef", ROAD: "#333", CROSSROAD: "#36c"}
+
+
+class EditorGrid(object):
+    """
+    The map being edited: one byte per editor cell, EMPTY, ROAD, or CROSSROAD
+    for a road cell whose junction should get no traffic lights.
+    Rows are bytearrays, so the grid can be passed to `expandGrid` as is.
+    """
+
+    def __init__(self, rows, cols):
+        self.rowN = rows
+        self.colN = cols
+        self.rows = [bytearray(cols) for _ in range(rows)]
+
+    def inside(self, i, j):
+        return 0 <= i < self.rowN and 0 <= j < self.colN
+
+    def set(self, i, j, value):
+        """Set one cell; returns True if it changed."""
+        if not self.inside(i, j) or self.rows[i][j] == value:
+            return False
+        self.rows[i][j] = value
+        return True
+
+    def brush(self, i, j, radius, value):
+        """Paint a square of side 2 * radius + 1 around (i, j); returns the changed cells."""
+        return self.fillRect(i - radius, j - radius, i + radius, j + radius, value)
+
+    def fillRect(self, i0, j0, i1, j1, value):
+        """Fill the rectangle between two corners (inclusive); returns the changed cells."""
+        changed = []
+        for i in range(max(0, min(i0, i1)), min(self.rowN, max(i0, i1) + 1)):
+            row = self.rows[i]
+            for j in range(max(0, min(j0, j1)), min(self.colN, max(j0, j1) + 1)):
+                if row[j] != value:
+                    row[j] = value
+                    changed.append((i, j))
+        return changed
+
+    def crossroads(self):
+        return [(i, j) for i in range(self.rowN) for j in range(self.colN) if self.rows[i][j] == CROSSROAD]
+
+    def toText(self):
+        return expandGrid(self.rows, self.crossroads())
+
+
+def validate(grid, layout):
+    """
+    Problems that would make the exported map unusable, as readable strings:
+    road cells that expand to nothing, road loops without a junction, and
+    nodes that cannot be reached from the rest of the network.
+    """
+    problems = []
+
+    for i in range(grid.rowN):
+        for j in range(grid.colN):
+            if grid.rows[i][j] == EMPTY:
+                continue
+            count, sideStr = countNeighbors(grid.rows, i, j)
+            if count < 3 and sideStr not in ROAD_DICT:
+                problems.append(f'Dangling road cell at row {i}, column {j}.')
+
+    layoutText = layout.layoutText
+    orphans = 0
+    for y in range(layout.height):
+        for x in range(layout.width):
+            if layoutText[y][x] != '%' and layout.mapInfo.get(x, y) is None:
+                orphans += 1
+    if orphans:
+        problems.append(f'{orphans} road cells form a loop without any junction.')
+
+    if not layout.roads:
+        problems.append('The map has no junctions, so it has no roads.')
+        return problems
+
+    # Nodes outside the largest strongly connected part of the network.
+    nodes = [(Info.INTERSECTION, n.number) for n in layout.intersections] + \
+            [(Info.CROSSROAD, n.number) for n in layout.crossroads]
+    forward = dict((n, []) for n in nodes)
+    backward = dict((n, []) for n in nodes)
+    for road in layout.roads:
+        if road.getEnd() not in backward:
+            x, y = road.getPositions()[-1]
+            problems.append(f'Road {road.number} runs off the network at ({x}, {y}).')
+            continue
+        forward[road.getStart()].append(road.getEnd())
+        backward[road.getEnd()].append(road.getStart())
+
+    def reach(start, edges):
+        seen = set([start])
+        stack = [start]
+        while stack:
+            for n in edges[stack.pop()]:
+                if n not in seen:
+                    seen.add(n)
+                    stack.append(n)
+        return seen
+
+    best = set()
+    left = set(nodes)
+    while left and len(left) > len(best):
+        n = left.pop()
+        component = reach(n, forward) & reach(n, backward)
+        left -= component
+        if len(component) > len(best):
+            best = component
+    for (nodeType, number) in nodes:
+        if (nodeType, number) not in best:
+            node = layout.intersections[number] if nodeType == Info.INTERSECTION else layout.crossroads[number]
+            x, y = node.getPositions()[0]
+            problems.append(f'{nodeType} at ({x}, {y}) cannot be reached from every other junction.')
+    return problems
+
+
+def export(grid, filename):
+    """
+    Write the grid as a .lay file and return the parsed Layout with the
+    problems found by `validate`.
+    """
+    layoutText = grid.toText()
+    layout = Layout(layoutText)
+    with open(filename, 'w') as f:
+        for row in layoutText:
+            f.write(row + "\n")
+    return layout, validate(grid, layout)
+
+
+class App:
+    def __init__(self, master, output='', geometry=''):
+        """Initialize the application and setup the UI components."""
+        self.master = master
+        self.output = output
+
+        self.frame1 = Frame(master)
+        self.frame1.pack()
+        self.frame2 = Frame(master)
+        self.frame2.pack()
+
+        # Grid size and window dimensions
+        self.gridSize = 20
+        self.WID = 400
+        self.HEI = 300
+
+        if geometry:
+            geoStr_splited = geometry.split("x")
+            self.WID = int(geoStr_splited[0])
+            self.HEI = int(geoStr_splited[1])
+
+        self.vGrid = self.HEI // self.gridSize
+        self.hGrid = self.WID // self.gridSize
+        # Keep large maps on screen by shrinking the cells.
+        self.gridSize = max(1, min(self.gridSize, 1200 // max(self.hGrid, 1), 800 // max(self.vGrid, 1)))
+
+        # The grid model, drawn into a single image
+        self.grid = EditorGrid(self.vGrid, self.hGrid)
+        self.image = PhotoImage(master=master, width=self.hGrid * self.gridSize, height=self.vGrid * self.gridSize)
+        self.image.put(COLORS[EMPTY], to=(0, 0, self.hGrid * self.gridSize, self.vGrid * self.gridSize))
+
+        # Setup the canvas for drawing
+        self.canvas = Canvas(self.frame1, width=self.hGrid * self.gridSize, height=self.vGrid * self.gridSize)
+        self.canvas.create_image(0, 0, anchor=NW, image=self.image)
+        self.canvas.bind("<Button-1>", self.press)
+        self.canvas.bind("<B1-Motion>", self.drag)
+        self.canvas.bind("<ButtonRelease-1>", self.release)
+        self.canvas.pack()
+
+        # Tools
+        self.value = IntVar(value=ROAD)
+        self.tool = StringVar(value="brush")
+        self.radius = IntVar(value=0)
+        self.rectItem = None
+
+        Radiobutton(self.frame2, text="Road", variable=self.value, value=ROAD).grid(row=0, column=0)
+        Radiobutton(self.frame2, text="Crossroad", variable=self.value, value=CROSSROAD).grid(row=0, column=1)
+        Radiobutton(self.frame2, text="Erase", variable=self.value, value=EMPTY).grid(row=0, column=2)
+        Radiobutton(self.frame2, text="Brush", variable=self.tool, value="brush").grid(row=1, column=0)
+        Radiobutton(self.frame2, text="Rectangle", variable=self.tool, value="rect").grid(row=1, column=1)
+        Scale(self.frame2, from_=0, to=5, orient=HORIZONTAL, label="Brush radius", variable=self.radius).grid(row=1, column=2)
+
+        self.toggleButton = Button(self.frame2, text="Toggle", command=self.toggleColor)
+        self.toggleButton.grid(row=0, column=3)
+
+        self.saveButton = Button(self.frame2, text="Save", command=self.saveGrid)
+        self.saveButton.grid(row=1, column=3)
+
+    def toggleColor(self):
+        """Toggle between drawing roads and erasing."""
+        self.value.set(EMPTY if self.value.get() != EMPTY else ROAD)
+
+    def cellAt(self, event):
+        return int(event.y / self.gridSize), int(event.x / self.gridSize)
+
+    def paint(self, cells, value):
+        gLen = self.gridSize
+        color = COLORS[value]
+        for i, j in cells:
+            self.image.put(color, to=(j * gLen, i * gLen, (j + 1) * gLen, (i + 1) * gLen))
+
+    def press(self, event):
+        self.start = self.cellAt(event)
+        if self.tool.get() == "brush":
+            self.drag(event)
+
+    def drag(self, event):
+        """Paint with the brush, or show the rectangle being drawn."""
+        i, j = self.cellAt(event)
+        if self.tool.get() == "brush":
+            self.paint(self.grid.brush(i, j, self.radius.get(), self.value.get()), self.value.get())
+            return
+        gLen = self.gridSize
+        (i0, j0) = self.start
+        coords = (min(j0, j) * gLen, min(i0, i) * gLen, (max(j0, j) + 1) * gLen, (max(i0, i) + 1) * gLen)
+        if self.rectItem is None:
+            self.rectItem = self.canvas.create_rectangle(coords, outline="#c33", dash=(3, 3))
+        else:
+            self.canvas.coords(self.rectItem, coords)
+
+    def release(self, event):
+        if self.tool.get() != "rect":
+            return
+        i, j = self.cellAt(event)
+        (i0, j0) = self.start
+        self.paint(self.grid.fillRect(i0, j0, i, j, self.value.get()), self.value.get())
+        if self.rectItem is not None:
+            self.canvas.delete(self.rectItem)
+            self.rectItem = None
+
+    def saveGrid(self):
+        """Export the grid as a layout file, reporting any problems found."""
+        filename = self.output or filedialog.asksaveasfilename(
+            initialdir=LAYOUTS, defaultextension=".lay", filetypes=[("Layouts", "*.lay")])
+        if not filename:
+            return
+        layout, problems = export(self.grid, filename)
+        summary = (f'{filename}: {len(layout.roads)} roads, {len(layout.intersections)} intersections, '
+                   f'{len(layout.crossroads)} crossroads')
+        print(summary)
+        if problems:
+            for p in problems:
+                print(p)
+            messagebox.showwarning("Map Editor", summary + "\n\n" + "\n".join(problems[:20]))
+        else:
+            messagebox.showinfo("Map Editor", summary)
+
+
+def main(argv=None):
+    """
+    > python map_editor.py 800x600 traffic_flow/layouts/my_map.lay
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    root = Tk()
+    root.title("Map Editor v1.0")
+    app = App(root, argv[1] if len(argv) > 1 else '', argv[0] if argv else '')
+    root.mainloop()
+
+
+if __name__ == '__main__':
+    main()
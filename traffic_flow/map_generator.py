@@ -0,0 +1,272 @@
+# map_generator.py
+
+import sys
+from optparse import OptionParser
+from random import Random
+from time import time
+
+from .layout import Layout
+
+# Expansion of one editor cell into a 2x2 block of layout characters, keyed by
+# the occupied neighbours in the order East, South, West, North.
+ROAD_DICT = {
+    "0001": "SNCC", "0010": "WCEC", "0100": "CCSN", "1000": "CWCE",
+    "1010": "WWEE", "0101": "SNSN", "1100": "SWSE", "1001": "SNEE",
+    "0110": "WWSN", "0011": "WNEN"
+}
+INTERSECTION = "IIII"
+CROSSROAD = "CCCC"
+FIELD = "%%%%"
+
+
+def countNeighbors(stateGrids, i, j):
+    """Count the neighboring cells that are filled (1) or empty (0)."""
+    count = 0
+    sideStr = ""
+    fourSide = [(i, j + 1), (i + 1, j), (i, j - 1), (i - 1, j)]
+    for x, y in fourSide:
+        if 0 <= x < len(stateGrids) and 0 <= y < len(stateGrids[0]):
+            if stateGrids[x][y] != 0:
+                count += 1
+                sideStr += "1"
+            else:
+                sideStr += "0"
+    return count, sideStr
+
+
+def isJunction(stateGrids, i, j):
+    """A filled cell with three or more filled neighbours becomes a node."""
+    return stateGrids[i][j] != 0 and countNeighbors(stateGrids, i, j)[0] >= 3
+
+
+def expandGrid(stateGrids, crossroads=()):
+    """
+    Expand a grid of road cells into layout text using the map editor rules.
+    Junction cells listed in `crossroads` become crossroads instead of intersections.
+    """
+    crossroads = set(crossroads)
+    rows = len(stateGrids)
+    cols = len(stateGrids[0])
+    layoutText = []
+
+    for i in range(rows):
+        top = []
+        bottom = []
+        for j in range(cols):
+            roadType = FIELD
+            if stateGrids[i][j] != 0:
+                count, sideStr = countNeighbors(stateGrids, i, j)
+                if count >= 3:
+                    roadType = CROSSROAD if (i, j) in crossroads else INTERSECTION
+                else:
+                    roadType = ROAD_DICT.get(sideStr, FIELD)
+            top.append(roadType[0:2])
+            bottom.append(roadType[2:4])
+        layoutText.append("".join(top))
+        layoutText.append("".join(bottom))
+
+    return layoutText
+
+
+def pickCrossroads(stateGrids, ratio, rng, candidates=None):
+    """Choose which junction cells become crossroads instead of intersections."""
+    if candidates is None:
+        candidates = [(i, j) for i in range(len(stateGrids)) for j in range(len(stateGrids[0]))
+                      if isJunction(stateGrids, i, j)]
+    return [c for c in candidates if rng.random() < ratio]
+
+
+def emptyGrid(rows, cols):
+    return [[0] * cols for _ in range(rows)]
+
+
+def drawLine(stateGrids, start, end):
+    """Fill a horizontal or vertical line of cells between two points (inclusive)."""
+    (i0, j0), (i1, j1) = start, end
+    if i0 == i1:
+        for j in range(min(j0, j1), max(j0, j1) + 1):
+            stateGrids[i0][j] = 1
+    elif j0 == j1:
+        for i in range(min(i0, i1), max(i0, i1) + 1):
+            stateGrids[i][j0] = 1
+    else:
+        raise Exception(f'Line {start} -> {end} is not axis aligned.')
+
+
+def checkSpacing(name, value):
+    if value < 1:
+        raise Exception(f'{name} must leave at least one empty cell between roads.')
+
+
+def gridPattern(rows, cols, block=3, crossroads=0.0, seed=None):
+    """
+    A rows x cols lattice of streets with `block` empty cells between parallel streets.
+    Returns the editor cell grid and the junctions that become crossroads.
+    """
+    checkSpacing('block', block)
+    step = block + 1
+    stateGrids = emptyGrid((rows - 1) * step + 3, (cols - 1) * step + 3)
+    for r in range(rows):
+        drawLine(stateGrids, (1 + r * step, 1), (1 + r * step, 1 + (cols - 1) * step))
+    for c in range(cols):
+        drawLine(stateGrids, (1, 1 + c * step), (1 + (rows - 1) * step, 1 + c * step))
+    return stateGrids, pickCrossroads(stateGrids, crossroads, Random(seed))
+
+
+def arterialPattern(rows, cols, arterialEvery=4, block=3, crossroads=1.0, seed=None):
+    """
+    A lattice of local streets where every `arterialEvery`-th street (and the
+    border) is an arterial. Junctions on an arterial are always intersections;
+    `crossroads` is the share of local-only junctions that get no lights.
+    """
+    stateGrids, _ = gridPattern(rows, cols, block)
+    step = block + 1
+    local = [(1 + r * step, 1 + c * step) for r in range(1, rows - 1) for c in range(1, cols - 1)
+             if r % arterialEvery != 0 and c % arterialEvery != 0]
+    return stateGrids, pickCrossroads(stateGrids, crossroads, Random(seed), local)
+
+
+def ringPattern(rings, spacing=4, spokes=1, crossroads=0.0, seed=None):
+    """
+    Concentric square rings `spacing` cells apart, joined by a central cross and
+    `spokes` extra radial links per side between neighbouring rings.
+    """
+    checkSpacing('spacing', spacing - 1)
+    step = spacing
+    size = 2 * rings * step + 3
+    centre = size // 2
+    stateGrids = emptyGrid(size, size)
+
+    for k in range(1, rings + 1):
+        lo, hi = centre - k * step, centre + k * step
+        drawLine(stateGrids, (lo, lo), (lo, hi))
+        drawLine(stateGrids, (hi, lo), (hi, hi))
+        drawLine(stateGrids, (lo, lo), (hi, lo))
+        drawLine(stateGrids, (lo, hi), (hi, hi))
+    drawLine(stateGrids, (centre - rings * step, centre), (centre + rings * step, centre))
+    drawLine(stateGrids, (centre, centre - rings * step), (centre, centre + rings * step))
+
+    for k in range(1, rings):
+        inner, outer = k * step, (k + 1) * step
+        # Offsets along a side, kept away from corners and the central cross.
+        offsets = [o for o in range(-inner + 2, inner - 1, max(2, (2 * inner) // (spokes + 1)))
+                   if abs(o) >= 2][:spokes]
+        for o in offsets:
+            drawLine(stateGrids, (centre - outer, centre + o), (centre - inner, centre + o))
+            drawLine(stateGrids, (centre + inner, centre - o), (centre + outer, centre - o))
+            drawLine(stateGrids, (centre - o, centre - outer), (centre - o, centre - inner))
+            drawLine(stateGrids, (centre + o, centre + inner), (centre + o, centre + outer))
+
+    return stateGrids, pickCrossroads(stateGrids, crossroads, Random(seed))
+
+
+def randomPattern(rows, cols, block=3, extra=0.3, crossroads=0.0, seed=None):
+    """
+    A random connected planar network: a random spanning tree over a rows x cols
+    lattice of nodes plus each remaining lattice edge with probability `extra`.
+    """
+    checkSpacing('block', block)
+    rng = Random(seed)
+    step = block + 1
+    stateGrids = emptyGrid((rows - 1) * step + 3, (cols - 1) * step + 3)
+
+    edges = []
+    for r in range(rows):
+        for c in range(cols):
+            if c + 1 < cols:
+                edges.append(((r, c), (r, c + 1)))
+            if r + 1 < rows:
+                edges.append(((r, c), (r + 1, c)))
+    rng.shuffle(edges)
+
+    parent = {}
+
+    def find(n):
+        while parent.get(n, n) != n:
+            parent[n] = parent.get(parent[n], parent[n])
+            n = parent[n]
+        return n
+
+    for a, b in edges:
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[ra] = rb
+        elif rng.random() >= extra:
+            continue
+        drawLine(stateGrids, (1 + a[0] * step, 1 + a[1] * step), (1 + b[0] * step, 1 + b[1] * step))
+
+    return stateGrids, pickCrossroads(stateGrids, crossroads, rng)
+
+
+PATTERNS = {
+    'grid': gridPattern,
+    'arterial': arterialPattern,
+    'ring': ringPattern,
+    'random': randomPattern,
+}
+
+
+def generateText(pattern, **kwargs):
+    """Build layout text for one of the PATTERNS."""
+    stateGrids, crossroads = PATTERNS[pattern](**kwargs)
+    return expandGrid(stateGrids, crossroads)
+
+
+def generateLayout(pattern, **kwargs):
+    """Build a parsed Layout for one of the PATTERNS."""
+    return Layout(generateText(pattern, **kwargs))
+
+
+def parseArgs(argv):
+    parser = OptionParser(usage='python map_generator.py -p grid -r 40 -c 40 -o traffic_flow/layouts/grid40.lay')
+    parser.add_option('-p', '--pattern', dest='pattern', type='choice', choices=sorted(PATTERNS), default='grid')
+    parser.add_option('-r', '--rows', dest='rows', type='int', default=10)
+    parser.add_option('-c', '--cols', dest='cols', type='int', default=10)
+    parser.add_option('-b', '--block', dest='block', type='int', default=3)
+    parser.add_option('--arterial', dest='arterialEvery', type='int', default=4)
+    parser.add_option('--extra', dest='extra', type='float', default=0.3)
+    parser.add_option('--crossroads', dest='crossroads', type='float', default=None)
+    parser.add_option('--seed', dest='seed', type='int', default=None)
+    parser.add_option('-o', '--output', dest='output', type='str', default='')
+
+    options, otherjunk = parser.parse_args(argv)
+    if otherjunk:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+
+    kwargs = {'seed': options.seed}
+    if options.crossroads is not None:
+        kwargs['crossroads'] = options.crossroads
+    if options.pattern == 'ring':
+        kwargs.update(rings=options.rows, spacing=options.block + 1)
+    else:
+        kwargs.update(rows=options.rows, cols=options.cols, block=options.block)
+    if options.pattern == 'arterial':
+        kwargs['arterialEvery'] = options.arterialEvery
+    if options.pattern == 'random':
+        kwargs['extra'] = options.extra
+    return options.pattern, kwargs, options.output
+
+
+def main(argv=None):
+    """
+    > python map_generator.py -p arterial -r 60 -c 60 -o traffic_flow/layouts/arterial60.lay
+    """
+    pattern, kwargs, output = parseArgs(sys.argv[1:] if argv is None else argv)
+    startTime = time()
+    layoutText = generateText(pattern, **kwargs)
+
+    if output == '':
+        for row in layoutText:
+            sys.stdout.write(row + "\n")
+    else:
+        with open(output, 'w') as f:
+            for row in layoutText:
+                f.write(row + "\n")
+        l = Layout(layoutText)
+        print(f'{output}: {l.width}x{l.height}, {sum(r.getDistance() for r in l.roads)} road cells, '
+              f'{len(l.roads)} roads, {len(l.intersections)} intersections, '
+              f'{len(l.crossroads)} crossroads ({time() - startTime:.2f}s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+# metrics.py
+
+import csv
+import json
+import sys
+from array import array
+
+MAGIC = b'TFMETRICS1\n'
+ROAD_COLUMNS = ('occupancy', 'inflow', 'outflow', 'queue')
+
+
+class RoadMetrics(object):
+    """
+    Time series of a running simulation, sampled every `every` ticks.
+
+    For every road: the cars on it, the cars that entered and left it since the
+    previous sample and the queue (cars standing back to back from the end of
+    the road). For every intersection: the cars that crossed it since the
+    previous sample.
+
+    Samples go into fixed-size ring buffers holding the last `capacity`
+    samples; nothing is allocated while the simulation runs. Road buffers are
+    stored sample-major, so sample `s` of road `r` is at `s * roads + r`.
+    """
+
+    def __init__(self, carMap, every=10, capacity=4096):
+        self.cm = carMap
+        self.every = every
+        self.capacity = capacity
+        self.roadN = len(carMap.roads)
+        self.inRoads = [it.getInRoads() for it in carMap.intersections]
+        self.intersectionN = len(self.inRoads)
+
+        self.ticks = array('i', [0]) * capacity
+        self.columns = {}
+        for name in ROAD_COLUMNS:
+            self.columns[name] = array('i', [0]) * (capacity * self.roadN)
+        self.throughput = array('i', [0]) * (capacity * self.intersectionN)
+        self.lastIn = array('i', [0]) * self.roadN
+        self.lastOut = array('i', [0]) * self.roadN
+        self.reset()
+
+    def reset(self):
+        """Forget every sample; flows are counted from the current state."""
+        self.count = 0
+        self.lastIn[:] = array('i', self.cm.inflow)
+        self.lastOut[:] = array('i', self.cm.outflow)
+
+    def sample(self, tick):
+        cm = self.cm
+        roadN = self.roadN
+        slot = self.count % self.capacity
+        base = slot * roadN
+        self.ticks[slot] = tick
+
+        occupancy, queue = self.columns['occupancy'], self.columns['queue']
+        inflow, outflow = self.columns['inflow'], self.columns['outflow']
+        lastIn, lastOut = self.lastIn, self.lastOut
+        cmIn, cmOut, cmOcc, data = cm.inflow, cm.outflow, cm.occupancy, cm.data
+        for r in range(roadN):
+            k = base + r
+            occupancy[k] = cmOcc[r]
+            inflow[k] = cmIn[r] - lastIn[r]
+            outflow[k] = cmOut[r] - lastOut[r]
+            lastIn[r] = cmIn[r]
+            lastOut[r] = cmOut[r]
+
+            cells = data[r]
+            j = len(cells) - 1
+            while j >= 0 and cells[j] is not None:
+                j -= 1
+            queue[k] = len(cells) - 1 - j
+
+        base = slot * self.intersectionN
+        for n, roads in enumerate(self.inRoads):
+            total = 0
+            for r in roads:
+                total += outflow[slot * roadN + r]
+            self.throughput[base + n] = total
+        self.count += 1
+
+    def samples(self):
+        return min(self.count, self.capacity)
+
+    def order(self):
+        """Ring slots from the oldest sample to the newest."""
+        n = self.samples()
+        first = self.count - n
+        return [(first + s) % self.capacity for s in range(n)]
+
+    def ordered(self, buf, width):
+        """Copy of `buf` with samples in chronological order."""
+        n = self.samples()
+        start = (self.count - n) % self.capacity
+        if start + n <= self.capacity:
+            return buf[start * width:(start + n) * width]
+        return buf[start * width:] + buf[:(start + n - self.capacity) * width]
+
+    def tables(self):
+        """Every column in chronological order: name -> (array, width)."""
+        result = {'tick': (self.ordered(self.ticks, 1), 1)}
+        for name in ROAD_COLUMNS:
+            result[name] = (self.ordered(self.columns[name], self.roadN), self.roadN)
+        result['throughput'] = (self.ordered(self.throughput, self.intersectionN), self.intersectionN)
+        return result
+
+    def save(self, filename):
+        """
+        Write the columns as raw machine integers after a one-line JSON header,
+        so `loadMetrics` can read them back without parsing values.
+        """
+        tables = self.tables()
+        header = {
+            'byteorder': sys.byteorder,
+            'every': self.every,
+            'samples': self.samples(),
+            'roads': self.roadN,
+            'intersections': self.intersectionN,
+            'columns': [],
+        }
+        offset = 0
+        for name, (buf, width) in tables.items():
+            size = len(buf) * buf.itemsize
+            header['columns'].append({'name': name, 'typecode': buf.typecode, 'width': width,
+                                      'offset': offset, 'bytes': size})
+            offset += size
+
+        with open(filename, 'wb') as f:
+            f.write(MAGIC)
+            f.write(json.dumps(header).encode() + b'\n')
+            for buf, _ in tables.values():
+                buf.tofile(f)
+
+    def saveCSV(self, prefix):
+        """Write `<prefix>_roads.csv` and `<prefix>_intersections.csv`, one row per sample and road."""
+        roadN, intersectionN = self.roadN, self.intersectionN
+        with open(prefix + '_roads.csv', 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(('tick', 'road') + ROAD_COLUMNS)
+            for slot in self.order():
+                tick = self.ticks[slot]
+                for r in range(roadN):
+                    k = slot * roadN + r
+                    writer.writerow([tick, r] + [self.columns[name][k] for name in ROAD_COLUMNS])
+        with open(prefix + '_intersections.csv', 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(('tick', 'intersection', 'throughput'))
+            for slot in self.order():
+                tick = self.ticks[slot]
+                for n in range(intersectionN):
+                    writer.writerow((tick, n, self.throughput[slot * intersectionN + n]))
+
+
+def loadMetrics(filename):
+    """
+    Read a file written by `RoadMetrics.save`.
+    Returns the header and a dict of column name -> array.
+    """
+    with open(filename, 'rb') as f:
+        if f.readline() != MAGIC:
+            raise Exception(f'{filename} is not a metrics file.')
+        header = json.loads(f.readline())
+        body = f.read()
+
+    columns = {}
+    for c in header['columns']:
+        buf = array(c['typecode'])
+        buf.frombytes(body[c['offset']:c['offset'] + c['bytes']])
+        if header['byteorder'] != sys.byteorder:
+            buf.byteswap()
+        columns[c['name']] = buf
+    return header, columns
+
+
+if __name__ == '__main__':
+    """
+    > python metrics.py saved/metrics.bin
+    """
+    header, columns = loadMetrics(sys.argv[1])
+    roadN = header['roads']
+    print(f"{header['samples']} samples every {header['every']} ticks, "
+          f"{roadN} roads, {header['intersections']} intersections")
+    for s, tick in enumerate(columns['tick']):
+        cars = sum(columns['occupancy'][s * roadN:(s + 1) * roadN])
+        queued = sum(columns['queue'][s * roadN:(s + 1) * roadN])
+        print(f'{tick}\t{cars} cars\t{queued} queued')
@@ -0,0 +1,485 @@
+# partition.py
+
+from array import array
+from collections import defaultdict
+from multiprocessing import Pipe, Process
+
+from .game import Info
+from .shared import SharedArrays
+from .simulate import RouteTable
+
+
+class Region(object):
+    """
+    The part of the map simulated by one worker.
+
+    A region owns a set of nodes and every road that ends at one of them, so all
+    cars competing for the first cell of a road are always in the same region.
+    Only two kinds of values cross a boundary during a tick:
+    - whether the first cell of a road becomes free (sent upstream), and
+    - the smallest car number waiting to enter a road (sent downstream), which
+      decides who goes first exactly like `Simulation.moveCarRecursively` does.
+    """
+
+    EMPTY = 'empty'
+    LEAVES = 'leaves'
+    STAYS = 'stays'
+    DEPENDS = 'depends'
+
+    def __init__(self, spec):
+        self.number = spec['number']
+        self.shared = SharedArrays.attach(spec['shared'])
+        self.owner = self.shared['owner']
+        self.routes = self.shared['routes']
+        self.length = spec['length']
+        self.isLight = spec['isLight']
+        self.remoteStart = spec['remoteStart']
+        self.boundaryOut = spec['boundaryOut']
+        self.geneInfo = spec['geneInfo']
+        self.noKey = spec['noKey']
+
+        self.onRoad = {r: [] for r in self.length}
+        self.active = set()
+        self.index = {}
+        self.stepLeft = {}
+        self.cursor = {}
+
+        for (car, r, i, stepLeft, cursor) in spec['cars']:
+            self.place(car, r, i, stepLeft, cursor)
+        for r in self.active:
+            self.onRoad[r].sort(key=lambda c: -self.index[c])
+
+    def place(self, car, r, i, stepLeft, cursor):
+        self.index[car] = i
+        self.stepLeft[car] = stepLeft
+        self.cursor[car] = cursor
+        self.onRoad[r].append(car)
+        self.active.add(r)
+
+    def handle(self, msg):
+        if msg[0] == 'tick':
+            for (car, stepLeft, cursor) in msg[2]:
+                self.place(car, self.routes[cursor], 0, stepLeft, cursor)
+            self.prepare(msg[1])
+        elif msg[0] == 'inputs':
+            self.receive(msg[1], msg[2])
+        elif msg[0] == 'force':
+            for s in self.pending:
+                for r in self.groups[s]:
+                    self.leave[r] = False
+            self.pending.clear()
+        self.resolve()
+        return self.report()
+
+    def prepare(self, tick):
+        """Split every road into blocks of adjacent cars and find who waits at each node."""
+        self.tick = tick
+        self.head = {}
+        self.full = {}
+        self.blockMin = {}
+        self.tailState = {}
+        self.leave = {}
+        self.groups = defaultdict(list)
+        self.contendFor = {}
+        self.keys = {}
+        self.availIn = {}
+        self.keyIn = {}
+        self.waiters = defaultdict(list)
+        self.sentTail = set()
+        self.sentKey = set()
+        self.queue = []
+
+        index = self.index
+        for r in self.active:
+            cars = self.onRoad[r]
+            d = self.length[r]
+            front = cars[0]
+            headAtEnd = index[front] == d - 1
+            if headAtEnd:
+                k = 1
+                while k < len(cars) and index[cars[k]] == d - 1 - k:
+                    k += 1
+                self.head[r] = front
+                self.full[r] = k == d
+                self.blockMin[r] = min(cars[:k])
+
+            tail = cars[-1]
+            if index[tail] != 0:
+                self.tailState[r] = self.EMPTY
+                continue
+            j = len(cars) - 1
+            while j > 0 and index[cars[j - 1]] == index[cars[j]] + 1:
+                j -= 1
+            if j == 0 and headAtEnd:
+                self.tailState[r] = self.DEPENDS
+            elif self.stepLeft[cars[j]] == 0:
+                self.tailState[r] = self.STAYS
+            else:
+                self.tailState[r] = self.LEAVES
+
+        for r, car in self.head.items():
+            if self.stepLeft[car] == 0 or (self.isLight[r] and not self.geneInfo.isGreen(r, tick)):
+                self.leave[r] = False
+                continue
+            s = self.routes[self.cursor[car] + 1]
+            self.groups[s].append(r)
+            self.contendFor[r] = s
+
+        self.pending = set(self.groups)
+        self.queue.extend(('g', s) for s in self.groups)
+        self.queue.extend(('k', r) for r in self.contendFor)
+
+    def receive(self, availIn, keyIn):
+        for s, v in availIn.items():
+            self.availIn[s] = v
+            self.queue.extend(self.waiters.pop(('a', s), ()))
+        for r, v in keyIn.items():
+            self.keyIn[r] = v
+            self.queue.extend(self.waiters.pop(('i', r), ()))
+
+    def resolve(self):
+        """Settle every group and key whose inputs are known, waking waiters as values appear."""
+        queue = self.queue
+        while queue:
+            item = queue.pop()
+            if item[0] == 'g':
+                if item[1] in self.pending and self.resolveGroup(item[1]):
+                    self.pending.discard(item[1])
+                    queue.extend(self.waiters.pop(item, ()))
+            elif item[1] not in self.keys and self.resolveKey(item[1]):
+                queue.extend(self.waiters.pop(item, ()))
+
+    def avail(self, s):
+        """Whether the first cell of road s is free for entering cars, or a dependency to wait on."""
+        if self.owner[s] != self.number:
+            v = self.availIn.get(s)
+            return ('a', s) if v is None else v
+        state = self.tailState.get(s, self.EMPTY)
+        if state == self.DEPENDS:
+            if s in self.leave:
+                return self.leave[s]
+            return ('g', self.contendFor[s])
+        return state != self.STAYS
+
+    def resolveGroup(self, s):
+        """Decide which of the cars waiting to enter road s get in, in visiting order."""
+        a = self.avail(s)
+        if a is False:
+            for r in self.groups[s]:
+                self.leave[r] = False
+            return True
+        if a is not True:
+            self.waiters[a].append(('g', s))
+            return False
+        for r in self.groups[s]:
+            if r not in self.keys:
+                self.waiters[('k', r)].append(('g', s))
+                return False
+
+        available = True
+        for r in sorted(self.groups[s], key=self.keys.get):
+            self.leave[r] = available
+            if available:
+                # A car that arrives on the first cell frees it again at once.
+                available = self.stepLeft[self.head[r]] == 1
+        return True
+
+    def resolveKey(self, r):
+        """The smallest car number whose move waits on the car at the end of road r."""
+        key = self.blockMin[r]
+        if self.full[r]:
+            if r in self.remoteStart:
+                v = self.keyIn.get(r)
+                if v is None:
+                    self.waiters[('i', r)].append(('k', r))
+                    return False
+                key = min(key, v)
+            else:
+                for q in self.groups.get(r, ()):
+                    if q not in self.keys:
+                        self.waiters[('k', q)].append(('k', r))
+                        return False
+                    key = min(key, self.keys[q])
+        self.keys[r] = key
+        return True
+
+    def report(self):
+        """Newly known boundary values, plus the moves once every local decision is made."""
+        tailOut = {}
+        for s in self.remoteStart:
+            if s not in self.sentTail:
+                v = self.avail(s)
+                if v is True or v is False:
+                    tailOut[s] = v
+                    self.sentTail.add(s)
+        keyOut = {}
+        for s in self.boundaryOut:
+            if s not in self.sentKey:
+                contenders = self.groups.get(s, ())
+                if all(r in self.keys for r in contenders):
+                    keyOut[s] = min([self.keys[r] for r in contenders], default=self.noKey)
+                    self.sentKey.add(s)
+        if self.pending:
+            return tailOut, keyOut, None
+        return tailOut, keyOut, self.apply()
+
+    def apply(self):
+        """Move every car according to the decisions of this tick."""
+        tick = self.tick
+        index = self.index
+        stepLeft = self.stepLeft
+        arrivals = []
+        emigrants = defaultdict(list)
+
+        for r in list(self.active):
+            cars = self.onRoad[r]
+            stay = []
+            i = 0
+            while i < len(cars):
+                j = i + 1
+                while j < len(cars) and index[cars[j]] == index[cars[j - 1]] - 1:
+                    j += 1
+                if i == 0 and r in self.head:
+                    moves = self.leave[r]
+                    start = 1
+                else:
+                    moves = stepLeft[cars[i]] != 0
+                    start = i
+                if not moves:
+                    stay.extend(cars[i:j])
+                else:
+                    for c in cars[start:j]:
+                        index[c] += 1
+                        stepLeft[c] -= 1
+                        if stepLeft[c] == 0:
+                            arrivals.append((c, tick))
+                            self.forget(c)
+                        else:
+                            stay.append(c)
+                i = j
+            self.onRoad[r] = stay
+            if not stay:
+                self.active.discard(r)
+
+        for s, roads in self.groups.items():
+            for r in roads:
+                if not self.leave[r]:
+                    continue
+                c = self.head[r]
+                stepLeft[c] -= 1
+                self.cursor[c] += 1
+                if stepLeft[c] == 0:
+                    arrivals.append((c, tick))
+                    self.forget(c)
+                elif self.owner[s] == self.number:
+                    index[c] = 0
+                    self.onRoad[s].append(c)
+                    self.active.add(s)
+                else:
+                    emigrants[self.owner[s]].append((c, stepLeft[c], self.cursor[c]))
+                    self.forget(c)
+
+        return emigrants, arrivals
+
+    def forget(self, car):
+        del self.index[car], self.stepLeft[car], self.cursor[car]
+
+    def close(self):
+        self.owner = self.routes = None
+        self.shared.close()
+
+
+def work(conn, spec):
+    """Worker process loop: answer the coordinator until told to stop."""
+    region = Region(spec)
+    while True:
+        msg = conn.recv()
+        if msg[0] == 'stop':
+            break
+        conn.send(region.handle(msg))
+    region.close()
+    conn.close()
+
+
+class LocalWorker(object):
+    """A Region driven in the coordinator's own process, with the same interface as a pipe."""
+
+    def __init__(self, spec):
+        self.region = Region(spec)
+
+    def send(self, msg):
+        if msg[0] == 'stop':
+            self.region.close()
+            self.reply = None
+        else:
+            self.reply = self.region.handle(msg)
+
+    def recv(self):
+        return self.reply
+
+
+class PartitionedSimulation(object):
+    """
+    A simulation of cars moving through a map, split across worker processes.
+    The results are identical to `Simulation`: same arrival tick for every car.
+    """
+
+    def __init__(self, startEndList, carMap, workers=2, processes=True):
+        """
+        Initialize the simulation with the list of car routes and the map.
+        - `workers`: number of regions the road graph is split into.
+        - `processes`: run each region in its own process, or all in this one.
+        """
+        self.carN = len(startEndList)
+        self.cm = carMap
+        self.regionOf = partitionNodes(carMap, workers)
+        roads = carMap.roads
+        graph = carMap.graph
+        owner = [self.regionOf[r.getEnd()] for r in roads]
+        self.owner = owner
+        self.startRegion = [self.regionOf[r.getStart()] for r in roads]
+
+        # Routes and road owners go to the workers through shared memory; a car
+        # only carries its position in the route buffer.
+        routes = RouteTable(carMap)
+        cars = [[] for _ in range(workers)]
+        taken = set()
+        for i in range(self.carN):
+            start, end = startEndList[i]
+            roadIndex = carMap.getRoadIndex(*start)
+            if roadIndex in taken:
+                raise Exception(f'Position {start} has been occupied.')
+            taken.add(roadIndex)
+            offset, last, stepLeft, remaining, finalRemaining = routes.lookup(start, end)
+            r, index = roadIndex
+            cars[owner[r]].append((i, r, index, stepLeft, offset))
+        self.shared = SharedArrays.create({'owner': array('i', owner), 'routes': routes.roads})
+
+        nodes = [(Info.INTERSECTION, n.number, n) for n in carMap.intersections] + \
+                [(Info.CROSSROAD, n.number, n) for n in carMap.crossroads]
+        self.workers = []
+        self.processes = []
+        for w in range(workers):
+            owned = [(t, num, n) for (t, num, n) in nodes if self.regionOf[(t, num)] == w]
+            mine = [r.number for r in roads if owner[r.number] == w]
+            spec = {
+                'number': w,
+                'shared': self.shared.descriptor,
+                'length': {r: graph.length[r] for r in mine},
+                'isLight': {r: bool(graph.isLight[r]) for r in mine},
+                'remoteStart': set(r for r in mine if self.startRegion[r] != w),
+                'boundaryOut': [s for (_, _, n) in owned for s in n.getOutRoads() if owner[s] != w],
+                'geneInfo': carMap.geneInfo,
+                'noKey': self.carN,
+                'cars': cars[w],
+            }
+            if processes:
+                conn, child = Pipe()
+                p = Process(target=work, args=(child, spec), daemon=True)
+                p.start()
+                child.close()
+                self.processes.append(p)
+                self.workers.append(conn)
+            else:
+                self.workers.append(LocalWorker(spec))
+
+        self.timeStamps = [0] * self.carN
+        self.carCnt = self.carN
+        self.tick = 0
+
+    def run(self, limit):
+        """
+        Run the simulation until every car arrives or `limit` ticks pass.
+        Returns (total, average) like `Simulation.run`, or (-1, -1) on timeout.
+        """
+        immigrants = [[] for _ in self.workers]
+        try:
+            while self.carCnt:
+                if self.tick > limit:
+                    return (-1, -1)
+                self.tick += 1
+                immigrants = self.step(immigrants)
+        finally:
+            self.close()
+
+        total_time = sum(self.timeStamps)
+        return total_time, float(total_time) / self.carN
+
+    def step(self, immigrants):
+        """Run one tick over all regions and return the cars each region receives next tick."""
+        workers = self.workers
+        for w, conn in enumerate(workers):
+            conn.send(('tick', self.tick, immigrants[w]))
+        waiting = set(range(len(workers)))
+        nextImmigrants = [[] for _ in workers]
+
+        while True:
+            availIn = [{} for _ in workers]
+            keyIn = [{} for _ in workers]
+            progress = False
+            for w in sorted(waiting):
+                tailOut, keyOut, moves = workers[w].recv()
+                for s, v in tailOut.items():
+                    availIn[self.startRegion[s]][s] = v
+                for s, v in keyOut.items():
+                    keyIn[self.owner[s]][s] = v
+                if tailOut or keyOut or moves is not None:
+                    progress = True
+                if moves is not None:
+                    waiting.discard(w)
+                    emigrants, arrivals = moves
+                    for dest, batch in emigrants.items():
+                        nextImmigrants[dest].extend(batch)
+                    for car, tick in arrivals:
+                        self.timeStamps[car] = tick
+                    self.carCnt -= len(arrivals)
+            if not waiting:
+                return nextImmigrants
+            # Values still unknown after a silent round can only come from a loop of
+            # full roads, where no car moves.
+            for w in waiting:
+                if progress:
+                    workers[w].send(('inputs', availIn[w], keyIn[w]))
+                else:
+                    workers[w].send(('force',))
+
+    def close(self):
+        for conn in self.workers:
+            conn.send(('stop',))
+        for p in self.processes:
+            p.join()
+        self.workers = []
+        self.processes = []
+        if self.shared is not None:
+            self.shared.close()
+            self.shared = None
+
+
+def partitionNodes(carMap, parts):
+    """Split the nodes of the map into `parts` strips of equal size along its longer side."""
+    nodes = [((Info.INTERSECTION, n.number), n.getPositions()[0]) for n in carMap.intersections] + \
+            [((Info.CROSSROAD, n.number), n.getPositions()[0]) for n in carMap.crossroads]
+    axis = 0 if carMap.mapInfo.width >= carMap.mapInfo.height else 1
+    nodes.sort(key=lambda n: (n[1][axis], n[1][1 - axis]))
+    return {key: i * parts // len(nodes) for i, (key, _) in enumerate(nodes)}
+
+
+if __name__ == '__main__':
+    from time import time
+    from random import sample, seed
+    from .car import CarMap
+    from .ga import Gene, GeneInfo
+    from .map_generator import generateLayout
+    from .simulate import Simulation
+
+    seed(1)
+    mapLayout = generateLayout('grid', rows=20, cols=20)
+    geneInfo = GeneInfo(Gene(mapLayout.getTrafficLights()))
+    cells = [p for r in mapLayout.roads for p in r.getPositions()]
+    cars = list(zip(sample(cells, 1500), sample(cells, 1500)))
+    cars = [(s, e) for (s, e) in cars if s != e]
+
+    startTime = time()
+    print(Simulation(cars, CarMap(mapLayout, geneInfo)).run(False, 1000), f'{time() - startTime:.2f}s')
+    startTime = time()
+    print(PartitionedSimulation(cars, CarMap(mapLayout, geneInfo), 4).run(1000), f'{time() - startTime:.2f}s')
@@ -0,0 +1,275 @@
+# reroute.py
+
+import heapq
+from collections import OrderedDict
+
+
+INF = float('inf')
+
+
+class RouteTree(object):
+    """
+    The cheapest cost from every node to one destination node, with the road
+    to take from each. Costs count every road entered; the destination road,
+    which starts at the destination node, is not counted, like
+    `CarMap.getDirection`. All the destination roads starting at one node
+    share its tree.
+    """
+
+    def __init__(self, dest, costs, roadStart, roadEnd, inRoads, outRoads):
+        self.dest = dest
+        self.costs = costs
+        self.roadStart = roadStart
+        self.roadEnd = roadEnd
+        self.inRoads = inRoads
+        self.outRoads = outRoads
+        n = len(inRoads)
+        self.h = [INF] * n
+        self.nxt = [-1] * n
+        self.h[dest] = 0
+        self.version = 0
+        self.relax([(0, dest)])
+
+    def relax(self, heap):
+        """Dijkstra over the reversed node graph from the nodes in `heap`."""
+        h, nxt, costs, roadStart, inRoads = self.h, self.nxt, self.costs, self.roadStart, self.inRoads
+        heapq.heapify(heap)
+        while heap:
+            (hx, x) = heapq.heappop(heap)
+            if hx != h[x]:
+                continue
+            for r in inRoads[x]:
+                u = roadStart[r]
+                cand = costs[r] + hx
+                if cand < h[u]:
+                    h[u] = cand
+                    nxt[u] = r
+                    heapq.heappush(heap, (cand, u))
+
+    def update(self, changes):
+        """
+        Repair the tree after road costs changed; `changes` holds (road, old cost).
+        Only nodes whose path used a more expensive road are recomputed, and
+        cheaper roads are spread to the nodes before them.
+        """
+        h, nxt, costs, roadStart, roadEnd = self.h, self.nxt, self.costs, self.roadStart, self.roadEnd
+
+        affected = set()
+        stack = [roadStart[r] for (r, old) in changes if costs[r] > old and nxt[roadStart[r]] == r]
+        while stack:
+            x = stack.pop()
+            if x in affected:
+                continue
+            affected.add(x)
+            stack.extend(roadStart[r] for r in self.inRoads[x] if nxt[roadStart[r]] == r)
+
+        heap = []
+        for x in affected:
+            h[x] = INF
+            nxt[x] = -1
+        for x in affected:
+            for r in self.outRoads[x]:
+                e = roadEnd[r]
+                if e not in affected and costs[r] + h[e] < h[x]:
+                    h[x] = costs[r] + h[e]
+                    nxt[x] = r
+            if h[x] < INF:
+                heap.append((h[x], x))
+        for (r, old) in changes:
+            u, e = roadStart[r], roadEnd[r]
+            if costs[r] < old and u not in affected and costs[r] + h[e] < h[u]:
+                h[u] = costs[r] + h[e]
+                nxt[u] = r
+                heap.append((h[u], u))
+        self.relax(heap)
+
+    def cost(self, road, destRoad):
+        """The cost of taking `road` on the way to `destRoad`, which starts at the destination node."""
+        if road == destRoad:
+            return 0
+        return self.costs[road] + self.h[self.roadEnd[road]]
+
+    def path(self, start, destRoad):
+        """The roads from `start` to `destRoad`, following the tree."""
+        result = [start]
+        if start == destRoad:
+            return result
+        x = self.roadEnd[start]
+        while x != self.dest:
+            result.append(self.nxt[x])
+            x = self.roadEnd[result[-1]]
+        result.append(destRoad)
+        return result
+
+
+class Router(object):
+    """
+    Lets cars change their route at intersections and crossroads when the roads
+    ahead fill up.
+
+    A road costs its length plus `weight` for every car on it, read from
+    `CarMap.occupancy`. Every `interval` ticks the roads whose cost moved by at
+    least `threshold` are applied in one batch, at most `maxUpdates` of them,
+    largest change first.
+
+    A car decides once per node it reaches, the first time it waits at the end
+    of a road, and only if a road of its planned route got more expensive since
+    its last decision. One RouteTree is kept per destination node for the
+    `maxTrees` most recently used ones. Trees are repaired when used rather than
+    on every batch, and at most `maxRepairs` trees are built or repaired per
+    tick; a car finding its tree out of date past that keeps its route and
+    decides on a later tick if it still waits.
+    """
+
+    def __init__(self, carMap, weight=1, interval=10, threshold=2, maxUpdates=200, maxTrees=256, maxRepairs=8):
+        self.cm = carMap
+        self.weight = weight
+        self.interval = interval
+        self.threshold = threshold
+        self.maxUpdates = maxUpdates
+        self.maxTrees = maxTrees
+        self.maxRepairs = maxRepairs
+
+        graph = carMap.graph
+        self.lengths = graph.length.tolist()
+        self.succ = graph.successorLists()
+        self.roadStart = graph.roadStart.tolist()
+        self.roadEnd = graph.roadEnd.tolist()
+        self.inRoads = [[] for _ in range(graph.nodeN)]
+        self.outRoads = [[] for _ in range(graph.nodeN)]
+        for r in range(graph.roadN):
+            self.inRoads[self.roadEnd[r]].append(r)
+            self.outRoads[self.roadStart[r]].append(r)
+        self.costs = list(self.lengths)
+        self.trees = OrderedDict()
+        self.reset()
+
+    def reset(self):
+        """
+        Go back to empty-road costs before a new simulation. Trees are dropped so
+        that a run never depends on the runs before it.
+        """
+        self.costs[:] = self.lengths
+        self.trees.clear()
+        # Batch k of cost changes, as (road, old cost), is history[k - base - 1].
+        self.version = 0
+        self.base = 0
+        self.history = []
+        self.raised = [0] * len(self.costs)
+        self.decided = {}
+        self.checked = {}
+        self.budget = self.maxRepairs
+        self.reroutes = 0
+        self.builds = 0
+        self.repairs = 0
+
+    def tree(self, dest):
+        """The up-to-date tree of node `dest`, or None once this tick's repairs are spent."""
+        tree = self.trees.get(dest)
+        if tree is not None and tree.version == self.version:
+            self.trees.move_to_end(dest)
+            return tree
+        if self.budget == 0:
+            return None
+        self.budget -= 1
+        changes = None if tree is None or tree.version < self.base else self.changesSince(tree.version)
+        # Past a tenth of the roads most of the tree is affected: building it again is cheaper.
+        if changes is None or 10 * len(changes) > len(self.costs):
+            tree = RouteTree(dest, self.costs, self.roadStart, self.roadEnd, self.inRoads, self.outRoads)
+            self.trees[dest] = tree
+            self.builds += 1
+            if len(self.trees) > self.maxTrees:
+                self.trees.popitem(last=False)
+        else:
+            tree.update(changes)
+            self.repairs += 1
+        self.trees.move_to_end(dest)
+        tree.version = self.version
+        return tree
+
+    def changesSince(self, version):
+        """The roads changed after batch `version`, with their cost at that time."""
+        changes = {}
+        for batch in self.history[version - self.base:]:
+            for (r, old) in batch:
+                changes.setdefault(r, old)
+        return list(changes.items())
+
+    def update(self, tick):
+        """Refresh road costs from the live occupancy once per interval."""
+        self.budget = self.maxRepairs
+        if tick % self.interval:
+            return
+        occupancy = self.cm.occupancy
+        changes = []
+        for r, old in enumerate(self.costs):
+            new = self.lengths[r] + self.weight * occupancy[r]
+            if abs(new - old) >= self.threshold:
+                changes.append((abs(new - old), r, new))
+        if len(changes) > self.maxUpdates:
+            changes.sort(reverse=True)
+            del changes[self.maxUpdates:]
+
+        applied = []
+        for (_, r, new) in changes:
+            applied.append((r, self.costs[r]))
+            self.costs[r] = new
+        self.applyChanges(applied)
+
+    def applyChanges(self, changes):
+        """Record a batch of (road, old cost); the trees catch up when next used."""
+        if not changes:
+            return
+        self.version += 1
+        self.history.append(changes)
+        for (r, old) in changes:
+            if self.costs[r] > old:
+                self.raised[r] = self.version
+        # Batches no kept tree needs any more are dropped.
+        oldest = min((tree.version for tree in self.trees.values()), default=self.version)
+        if oldest > self.base:
+            del self.history[:oldest - self.base]
+            self.base = oldest
+
+    def reroute(self, car):
+        """
+        Called when a car waits at the end of a road. Once per node, and if a
+        road it plans to take got more expensive, switches its remaining route
+        if another road out of the node is now strictly cheaper. Returns the
+        next road to take.
+        """
+        route = car.route
+        cursor = car.cursor
+        planned = route[cursor + 1]
+        if self.decided.get(car) == cursor:
+            return planned
+        checked = self.checked.get(car, 0)
+        if checked == self.version or all(self.raised[route[k]] <= checked for k in range(cursor + 1, car.last)):
+            self.decided[car] = cursor
+            self.checked[car] = self.version
+            return planned
+
+        current = route[cursor]
+        destRoad = route[car.last]
+        tree = self.tree(self.roadStart[destRoad])
+        if tree is None:
+            return planned
+        self.decided[car] = cursor
+        self.checked[car] = self.version
+        best = planned
+        bestCost = tree.cost(planned, destRoad)
+        for s in self.succ[current]:
+            cost = tree.cost(s, destRoad)
+            if cost < bestCost:
+                best, bestCost = s, cost
+        if best == planned:
+            return planned
+
+        path = tree.path(best, destRoad)
+        offset = car.routes.add([current] + path)
+        car.route = car.routes.roads
+        stepLeft = 1 + sum(self.lengths[r] for r in path[:-1]) + car.finalRemaining
+        car.setRoute(offset, offset + len(path), stepLeft, 1, car.finalRemaining)
+        self.decided[car] = offset
+        self.reroutes += 1
+        return best
@@ -0,0 +1,364 @@
+# shared.py
+
+from array import array
+from multiprocessing import shared_memory
+
+from .game import Info
+from .layout import RoadGraph
+
+ALIGN = 8
+
+
+class SharedBlock(shared_memory.SharedMemory):
+    """
+    A shared memory block that may be dropped while views into it still
+    exist; the mapping then goes away with the last view.
+    """
+
+    def close(self):
+        try:
+            super().close()
+        except BufferError:
+            pass
+
+
+class SharedArrays(object):
+    """
+    Named flat arrays packed into one `multiprocessing.shared_memory` block.
+
+    The creating process builds it from a dict of `array.array`; other processes
+    attach with the small picklable `descriptor` and read the arrays through
+    read-only memoryviews, without copying or unpickling them.
+    """
+
+    def __init__(self, shm, descriptor, owner):
+        self.shm = shm
+        self.descriptor = descriptor
+        self.owner = owner
+        self.views = {}
+        buf = shm.buf
+        for name, (typecode, offset, length) in descriptor['arrays'].items():
+            size = array(typecode).itemsize
+            self.views[name] = buf[offset:offset + length * size].cast(typecode).toreadonly()
+
+    @classmethod
+    def create(cls, arrays, meta=None):
+        layout = {}
+        offset = 0
+        for name, values in arrays.items():
+            layout[name] = (values.typecode, offset, len(values))
+            offset += (len(values) * values.itemsize + ALIGN - 1) // ALIGN * ALIGN
+        shm = SharedBlock(create=True, size=max(offset, 1))
+        for name, values in arrays.items():
+            start = layout[name][1]
+            shm.buf[start:start + len(values) * values.itemsize] = values.tobytes()
+        descriptor = {'name': shm.name, 'arrays': layout, 'meta': meta or {}}
+        return cls(shm, descriptor, True)
+
+    @classmethod
+    def attach(cls, descriptor):
+        shm = SharedBlock(name=descriptor['name'])
+        return cls(shm, descriptor, False)
+
+    def __getitem__(self, name):
+        return self.views[name]
+
+    @property
+    def meta(self):
+        return self.descriptor['meta']
+
+    def close(self):
+        """
+        Drop the views; the creator also frees the block. Views handed out
+        earlier stay readable until they are dropped.
+        """
+        self.views = {}
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def shareLayout(layout):
+    """
+    Pack the topology of a Layout (or CarMap): road cells and directions,
+    node cells, in/out roads and the map grid. Nodes are numbered
+    intersections first, then crossroads.
+    """
+    nodes = list(layout.intersections) + list(layout.crossroads)
+    intersectionN = len(layout.intersections)
+
+    def nodeId(info):
+        return info[1] if info[0] == Info.INTERSECTION else intersectionN + info[1]
+
+    a = dict((name, array('i')) for name in
+             ('roadOffset', 'cellX', 'cellY', 'roadStart', 'roadEnd',
+              'nodeOffset', 'nodeX', 'nodeY', 'inOffset', 'inRoads', 'outOffset', 'outRoads', 'grid'))
+    a['ways'] = array('B')
+    a['gridKind'] = array('b')
+
+    a['roadOffset'].append(0)
+    for road in layout.roads:
+        for (x, y) in road.getPositions():
+            a['cellX'].append(x)
+            a['cellY'].append(y)
+        a['ways'].extend(ord(w) for w in road.ways)
+        a['roadOffset'].append(len(a['cellX']))
+        a['roadStart'].append(nodeId(road.getStart()))
+        a['roadEnd'].append(nodeId(road.getEnd()))
+
+    for name in ('nodeOffset', 'inOffset', 'outOffset'):
+        a[name].append(0)
+    for node in nodes:
+        for (x, y) in node.getPositions():
+            a['nodeX'].append(x)
+            a['nodeY'].append(y)
+        a['inRoads'].extend(node.getInRoads())
+        a['outRoads'].extend(node.getOutRoads())
+        a['nodeOffset'].append(len(a['nodeX']))
+        a['inOffset'].append(len(a['inRoads']))
+        a['outOffset'].append(len(a['outRoads']))
+
+    mapInfo = layout.mapInfo
+    kinds = {None: 0, Info.FIELD: 1, Info.INTERSECTION: 2, Info.CROSSROAD: 3, Info.ROAD: 4}
+    for x in range(mapInfo.width):
+        for y in range(mapInfo.height):
+            info = mapInfo.get(x, y)
+            if info is None or info == Info.FIELD:
+                a['gridKind'].append(kinds[info])
+                a['grid'].append(-1)
+            else:
+                a['gridKind'].append(kinds[info[0]])
+                a['grid'].append(info[1])
+
+    meta = {'width': mapInfo.width, 'height': mapInfo.height, 'intersections': intersectionN}
+    return SharedArrays.create(a, meta)
+
+
+class SharedInfo(object):
+    """`game.Info` read from a shared grid."""
+
+    KINDS = (None, Info.FIELD, Info.INTERSECTION, Info.CROSSROAD, Info.ROAD)
+
+    def __init__(self, arrays):
+        self.width = arrays.meta['width']
+        self.height = arrays.meta['height']
+        self.kind = arrays['gridKind']
+        self.number = arrays['grid']
+
+    def get(self, x, y):
+        k = x * self.height + y
+        kind = self.KINDS[self.kind[k]]
+        if kind is None or kind == Info.FIELD:
+            return kind
+        return (kind, self.number[k])
+
+
+class SharedRoad(object):
+    """`game.Road` whose cells live in shared memory."""
+
+    def __init__(self, layout, number):
+        self.number = number
+        self.first = layout.arrays['roadOffset'][number]
+        self.distance = layout.arrays['roadOffset'][number + 1] - self.first
+        self.x = layout.arrays['cellX']
+        self.y = layout.arrays['cellY']
+        self.ways = layout.arrays['ways']
+        self.start = layout.nodeInfo(layout.arrays['roadStart'][number])
+        self.end = layout.nodeInfo(layout.arrays['roadEnd'][number])
+
+    def getPositions(self):
+        return [(self.x[k], self.y[k]) for k in range(self.first, self.first + self.distance)]
+
+    def getStart(self):
+        return self.start
+
+    def getEnd(self):
+        return self.end
+
+    def getDistance(self):
+        return self.distance
+
+    def getIndexOfRoad(self, pos):
+        return self.getPositions().index(pos)
+
+    def getPosByIndex(self, index):
+        if 0 <= index < self.distance:
+            k = self.first + index
+            return (self.x[k], self.y[k])
+        return None
+
+    def getWayByIndex(self, index):
+        if 0 <= index < self.distance:
+            return chr(self.ways[self.first + index])
+        return None
+
+
+class SharedNode(object):
+    """`game.Intersection` or `game.Crossroad` whose road lists live in shared memory."""
+
+    def __init__(self, layout, number, nodeId):
+        a = layout.arrays
+        self.number = number
+        self.positions = (a['nodeOffset'][nodeId], a['nodeOffset'][nodeId + 1])
+        self.x = a['nodeX']
+        self.y = a['nodeY']
+        self.inRoads = a['inRoads'][a['inOffset'][nodeId]:a['inOffset'][nodeId + 1]]
+        self.outRoads = a['outRoads'][a['outOffset'][nodeId]:a['outOffset'][nodeId + 1]]
+
+    def getPositions(self):
+        return [(self.x[k], self.y[k]) for k in range(*self.positions)]
+
+    def getInRoads(self):
+        return self.inRoads
+
+    def getOutRoads(self):
+        return self.outRoads
+
+
+class SharedLayout(object):
+    """
+    A Layout attached from `shareLayout(...).descriptor`, usable wherever
+    CarMap, Simulation or the routers expect a Layout.
+    """
+
+    def __init__(self, descriptor):
+        self.arrays = SharedArrays.attach(descriptor)
+        meta = self.arrays.meta
+        self.width = meta['width']
+        self.height = meta['height']
+        self.intersectionN = meta['intersections']
+        self.mapInfo = SharedInfo(self.arrays)
+        nodeN = len(self.arrays['nodeOffset']) - 1
+        self.intersections = [SharedNode(self, n, n) for n in range(self.intersectionN)]
+        self.crossroads = [SharedNode(self, n, self.intersectionN + n) for n in range(nodeN - self.intersectionN)]
+        self.roads = [SharedRoad(self, r) for r in range(len(self.arrays['roadStart']))]
+        self.graph = None
+
+    def nodeInfo(self, nodeId):
+        if nodeId < self.intersectionN:
+            return (Info.INTERSECTION, nodeId)
+        return (Info.CROSSROAD, nodeId - self.intersectionN)
+
+    def getTrafficLights(self):
+        return [(i.number, list(i.getInRoads())) for i in self.intersections]
+
+    def compile(self):
+        if self.graph is None:
+            self.graph = RoadGraph(self)
+        return self.graph
+
+    def getLightPositions(self):
+        return [(i.getPositions(), [self.roads[r].getPosByIndex(self.roads[r].getDistance() - 1) for r in i.getInRoads()])
+                for i in self.intersections]
+
+    def close(self):
+        self.intersections = self.crossroads = self.roads = []
+        self.mapInfo = None
+        self.arrays.close()
+
+
+def shareScenario(routes, startEndList):
+    """
+    Pack the cars of a scenario and the routes they use from a filled
+    `simulate.RouteTable`, so workers skip every shortest-path search.
+    """
+    a = dict((name, array('i')) for name in
+             ('startX', 'startY', 'endX', 'endY',
+              'entryStart', 'entryEnd', 'entryLoop', 'entryOffset', 'entryLast', 'entryTotal'))
+    for (sx, sy), (ex, ey) in startEndList:
+        a['startX'].append(sx)
+        a['startY'].append(sy)
+        a['endX'].append(ex)
+        a['endY'].append(ey)
+    for (startRoad, endRoad, loop), (offset, last, total) in routes.entries.items():
+        a['entryStart'].append(startRoad)
+        a['entryEnd'].append(endRoad)
+        a['entryLoop'].append(int(loop))
+        a['entryOffset'].append(offset)
+        a['entryLast'].append(last)
+        a['entryTotal'].append(total)
+    a['routes'] = routes.roads
+    return SharedArrays.create(a)
+
+
+class SharedScenario(object):
+    """Cars and routes attached from `shareScenario(...).descriptor`."""
+
+    def __init__(self, descriptor):
+        self.arrays = SharedArrays.attach(descriptor)
+
+    def startEndList(self):
+        a = self.arrays
+        return list(zip(zip(a['startX'], a['startY']), zip(a['endX'], a['endY'])))
+
+    def entries(self):
+        a = self.arrays
+        keys = zip(a['entryStart'], a['entryEnd'], (bool(v) for v in a['entryLoop']))
+        values = zip(a['entryOffset'], a['entryLast'], a['entryTotal'])
+        return dict(zip(keys, values))
+
+    def close(self):
+        self.arrays.close()
+
+
+# The layout and scenario attached by a worker process, set up once by
+# attachShared, like sweep.LAYOUTS.
+WORKER = {}
+
+
+def attachShared(layoutDescriptor, scenarioDescriptor):
+    """
+    Pool initializer: attach the layout and scenario once per worker and
+    build the CarMap, routes and Scenario every evaluateShared call reuses.
+    """
+    from .car import CarMap
+    from .simulate import RouteTable, Scenario
+
+    mapLayout = SharedLayout(layoutDescriptor)
+    scenario = SharedScenario(scenarioDescriptor)
+    carMap = CarMap(mapLayout, None)
+    routes = RouteTable(carMap, scenario)
+    WORKER['layout'] = mapLayout
+    WORKER['scenario'] = scenario
+    WORKER['lights'] = mapLayout.getTrafficLights()
+    WORKER['evaluator'] = Scenario(carMap, scenario.startEndList(), routes=routes)
+
+
+def evaluateShared(geneStr, limit=10000):
+    """Worker side: evaluate one gene on the layout and scenario of `attachShared`."""
+    from .ga import Gene
+
+    if 'evaluator' not in WORKER:
+        raise Exception('evaluateShared runs in a pool started with initializer=attachShared.')
+    return WORKER['evaluator'].evaluate(Gene(WORKER['lights'], False, geneStr), limit)
+
+
+if __name__ == '__main__':
+    """
+    > python shared.py
+    """
+    from multiprocessing import Pool
+    from random import sample, seed
+    from time import time
+    from .car import CarMap
+    from .ga import Gene
+    from .map_generator import generateLayout
+    from .simulate import RouteTable
+
+    seed(1)
+    mapLayout = generateLayout('grid', rows=20, cols=20)
+    cells = [p for r in mapLayout.roads for p in r.getPositions()]
+    cars = [(s, e) for (s, e) in zip(sample(cells, 1500), sample(cells, 1500)) if s != e]
+    routes = RouteTable(CarMap(mapLayout, None))
+    for (start, end) in cars:
+        routes.lookup(start, end)
+
+    layoutBlock = shareLayout(mapLayout)
+    scenarioBlock = shareScenario(routes, cars)
+    genes = [Gene(mapLayout.getTrafficLights()).geneStr for _ in range(8)]
+    startTime = time()
+    with Pool(4, attachShared, (layoutBlock.descriptor, scenarioBlock.descriptor)) as pool:
+        results = pool.starmap(evaluateShared, [(g, 1000) for g in genes])
+    print(results, f'{time() - startTime:.2f}s')
+    layoutBlock.close()
+    scenarioBlock.close()
@@ -0,0 +1,540 @@
+# simulate.py
+
+from array import array
+from time import sleep
+from .car import CarMap
+from .ga import GeneInfo
+
+class RouteTable(object):
+    """
+    Every route of a simulation stored once in a flat integer buffer of road
+    numbers. Cars going from the same start road to the same end road share
+    one entry, so `CarMap.getDirection` runs once per pair.
+    """
+
+    def __init__(self, carMap, shared=None):
+        """
+        - `shared`: an optional `shared.SharedScenario`; its routes are used in
+          place without copying.
+        """
+        self.cm = carMap
+        self.lengths = carMap.graph.length.tolist()
+        if shared is None:
+            self.roads = array('i')
+            self.entries = {}
+        else:
+            self.roads = shared.arrays['routes']
+            self.entries = shared.entries()
+        self.paths = {}
+
+    def writable(self):
+        """Copy a shared, read-only buffer so routes can be appended."""
+        if not isinstance(self.roads, array):
+            self.roads = array('i', self.roads)
+
+    def add(self, roads):
+        """Append a route and return its offset in the buffer."""
+        self.writable()
+        offset = len(self.roads)
+        self.roads.extend(roads)
+        return offset
+
+    def truncate(self, length):
+        """Drop the routes appended after the buffer held `length` roads, e.g. by rerouting."""
+        if len(self.roads) > length:
+            del self.roads[length:]
+            self.entries = dict((k, e) for k, e in self.entries.items() if e[0] < length)
+            self.paths = dict((k, e) for k, e in self.paths.items() if e[0] < length)
+
+    def lookup(self, start, end):
+        """
+        Find the route from `start` to `end`.
+        Returns (offset, last, stepLeft, remaining, finalRemaining) for a new car.
+        """
+        (startRoad, si) = self.cm.getRoadIndex(*start)
+        (endRoad, ei) = self.cm.getRoadIndex(*end)
+        key = (startRoad, endRoad, startRoad == endRoad and si > ei)
+        entry = self.entries.get(key)
+        if entry is None:
+            distance, result = self.cm.getDirection(start, end)
+            offset = self.add([r for (r, _) in result])
+            entry = (offset, offset + len(result) - 1, sum(self.lengths[r] for (r, _) in result))
+            self.entries[key] = entry
+        return self.position(entry, startRoad, si, endRoad, ei)
+
+    def follow(self, roads, si, ei):
+        """Like `lookup`, for the given `roads` from cell `si` of the first to cell `ei` of the last."""
+        key = tuple(roads)
+        entry = self.paths.get(key)
+        if entry is None:
+            offset = self.add(roads)
+            entry = (offset, offset + len(roads) - 1, sum(self.lengths[r] for r in roads))
+            self.paths[key] = entry
+        return self.position(entry, roads[0], si, roads[-1], ei)
+
+    def position(self, entry, startRoad, si, endRoad, ei):
+        offset, last, total = entry
+        stepLeft = total - si - self.lengths[endRoad] + ei
+        remaining = ei if offset == last else self.lengths[startRoad] - si
+        return offset, last, stepLeft, remaining, ei
+
+
+class Car(object):
+    """
+    A car in simulation.
+    The route is a slice [cursor, last] of the shared RouteTable buffer.
+    """
+
+    def __init__(self, idd, routes, start, end):
+        self.routes = routes
+        self.lengths = routes.lengths
+        self.setRoute(*routes.lookup(start, end))
+        # Read after the lookup, which may have copied a shared buffer to add the route.
+        self.route = routes.roads
+        self.timeStamp = 0
+
+    def setRoute(self, offset, last, stepLeft, remaining, finalRemaining):
+        self.cursor = offset
+        self.last = last
+        self.stepLeft = stepLeft
+        self.remaining = remaining
+        self.finalRemaining = finalRemaining
+
+    def isArrived(self):
+        """Check if the car has arrived."""
+        return self.stepLeft == 0
+
+    def nextRoad(self):
+        """
+        Determine the next road for the car.
+        Returns the ID of the next road or -1 if no road change is needed.
+        """
+        if self.remaining == 1 and self.cursor != self.last:
+            return self.route[self.cursor + 1]  # ID of next road
+        return -1  # No need to change road
+
+    def move(self):
+        """Move the car to the next position."""
+        self.stepLeft -= 1
+        if self.remaining == 1:
+            self.cursor += 1  # Move to next road
+            if self.cursor < self.last:
+                self.remaining = self.lengths[self.route[self.cursor]]
+            else:
+                self.remaining = self.finalRemaining
+        else:
+            self.remaining -= 1
+
+class Simulation(object):
+    """
+    A simulation of cars moving through a map.
+    """
+
+    def __init__(self, startEndList, carMap, router=None, metrics=None, routes=None):
+        """
+        Initialize the simulation with the list of car routes and the map.
+        - `router`: an optional `reroute.Router` letting cars avoid congestion.
+        - `metrics`: an optional `metrics.RoadMetrics` sampled while running.
+        - `routes`: an optional prepared `RouteTable`, e.g. one attached from
+          shared memory.
+        """
+        self.carN = len(startEndList)
+        self.cm = carMap
+        self.router = router
+        self.metrics = metrics
+        if router is not None:
+            router.reset()
+        self.cm.initialCars([startEndList[i][0] for i in range(self.carN)])
+
+        self.routes = routes if routes is not None else RouteTable(carMap)
+        self.cars = []
+        for i in range(self.carN):
+            self.cars.append(Car(i, self.routes, startEndList[i][0], startEndList[i][1]))
+
+        self.carCnt = self.carN
+        self.tick = 0
+        # Cars sleep on a red light, or on a sleeping car in front of them, only
+        # without a router: rerouting may pick another road on every attempt.
+        self.sleeping = router is None
+        self.resetActive()
+        if metrics is not None:
+            metrics.reset()
+
+    def resetActive(self):
+        """Make every car that has not arrived active again."""
+        self.active = [i for i in range(self.carN) if not self.cars[i].isArrived()]
+        self.asleep = bytearray(self.carN)
+        self.lightWaiter = {}
+        self.waiters = {}
+        self.woken = []
+        self.changed = False
+
+    def run(self, delay, limit, sec=0.1):
+        """
+        Run the simulation.
+        - `delay`: Whether to pause the simulation between ticks.
+        - `limit`: The maximum number of ticks before stopping the simulation.
+        - `sec`: The delay in seconds between each tick (default is 0.1).
+        """
+        if not self.runTicks(delay, limit, sec):
+            return (-1, -1)
+        self.cm.clearAllCars()
+        return self.totalTime()
+
+    def runTicks(self, delay, limit, sec=0.1):
+        """Advance until every car arrives; returns False if `limit` ticks pass first."""
+        while self.carCnt:
+            if self.tick > limit:
+                return False
+
+            if delay:
+                sleep(sec)
+
+            self.step()
+        return True
+
+    def step(self):
+        """Advance the simulation by one tick."""
+        self.tick += 1
+        self.cm.updateTrafficLights(self.tick)
+        if self.router is not None:
+            self.router.update(self.tick)
+
+        if self.sleeping:
+            for r in self.cm.turnedGreen:
+                i = self.lightWaiter.pop(r, None)
+                if i is not None:
+                    self.wake(i)
+            if self.woken:
+                self.active = sorted(self.active + self.woken)
+                self.woken = []
+
+        for i in self.active:
+            self.moveCarRecursively(i)
+
+        if self.changed:
+            asleep, cars = self.asleep, self.cars
+            self.active = [i for i in self.active if not asleep[i] and not cars[i].isArrived()]
+            self.changed = False
+
+        if self.metrics is not None and self.tick % self.metrics.every == 0:
+            self.metrics.sample(self.tick)
+
+    def totalTime(self):
+        """Total and average travel time once every car has arrived."""
+        total_time = 0
+        for i in range(self.carN):
+            total_time += self.cars[i].timeStamp
+            # Uncomment to print car travel times:
+            # print("Car", i, "takes", self.cars[i].timeStamp, "ticks.")
+        
+        return total_time, float(total_time) / self.carN
+
+    def capture(self):
+        """
+        The state after the current tick, for `restore`: the counters, the
+        sleeping cars, the green roads and one flat array holding, for every
+        car, its route position, time stamp and cell (road -1 once arrived).
+        Routes, the router and metrics are not kept.
+        """
+        state = array('i', [v for car, c in zip(self.cars, self.cm.cars)
+                            for v in (car.cursor, car.stepLeft, car.remaining, car.timeStamp) +
+                            (c.roadIndex if c.display else (-1, 0))])
+        return (self.tick, self.carCnt, array('i', self.active), bytes(self.asleep), dict(self.lightWaiter),
+                dict((k, tuple(v)) for k, v in self.waiters.items()), self.cm.greens, state)
+
+    def restore(self, snapshot):
+        """Go back to a state taken by `capture` from this simulation."""
+        (self.tick, self.carCnt, active, asleep, lightWaiter, waiters, greens, state) = snapshot
+        cm = self.cm
+        for c in cm.cars:
+            if c.display:
+                r, i = c.roadIndex
+                cm.data[r][i] = None
+                cm.occupancy[r] -= 1
+        roads = cm.roads
+        for k, (car, c) in enumerate(zip(self.cars, cm.cars)):
+            (car.cursor, car.stepLeft, car.remaining, car.timeStamp, r, i) = state[6 * k: 6 * k + 6]
+            c.display = r >= 0
+            if c.display:
+                road = roads[r]
+                c.pos = road.getPosByIndex(i)
+                c.way = road.getWayByIndex(i)
+                c.roadIndex = (r, i)
+                cm.data[r][i] = c
+                cm.occupancy[r] += 1
+        cm.countDetectors()
+        cm.greens = greens
+        self.active = list(active)
+        self.asleep = bytearray(asleep)
+        self.lightWaiter = dict(lightWaiter)
+        self.waiters = dict((k, list(v)) for k, v in waiters.items())
+        self.woken = []
+        self.changed = False
+
+    def wake(self, i):
+        """Wake car `i` and every car sleeping behind it."""
+        stack = [i]
+        while stack:
+            i = stack.pop()
+            self.asleep[i] = 0
+            self.woken.append(i)
+            stack.extend(self.waiters.pop(i, ()))
+
+    def sleep(self, i, state):
+        """
+        Take car `i` out of the active cars if it cannot move before a light
+        turns green: it waits at a red light, or behind a sleeping car.
+        """
+        if state == CarMap.BLOCKED_BY_TRAFFIC_LIGHT:
+            self.lightWaiter[self.cm.cars[i].roadIndex[0]] = i
+        elif state[0] == CarMap.BLOCKED_BY_OTHER_CAR and self.asleep[state[1]]:
+            self.waiters.setdefault(state[1], []).append(i)
+        else:
+            return
+        self.asleep[i] = 1
+        self.changed = True
+
+    def makeAMove(self, i, nextRoad):
+        """
+        Move the car to the next road or along the current road.
+        """
+        if nextRoad == -1:
+            return self.cm.move(i)
+        return self.cm.moveTo(i, nextRoad, self.tick)
+
+    def moveCarRecursively(self, i):
+        """
+        Move the car recursively until it reaches its destination or a block is encountered.
+        A sleeping car would be blocked anyway and is left alone.
+        """
+        car = self.cars[i]
+        if car.isArrived() or car.timeStamp == self.tick or self.asleep[i]:
+            return
+
+        car.timeStamp = self.tick
+        nextRoad = car.nextRoad()
+        if nextRoad != -1 and self.router is not None:
+            nextRoad = self.router.reroute(car)
+        state = self.makeAMove(i, nextRoad)
+
+        if state[0] == CarMap.BLOCKED_BY_OTHER_CAR:
+            # If blocked, try moving again after resolving the block
+            self.moveCarRecursively(state[1])
+            state = self.makeAMove(i, nextRoad)
+
+        if state[0] == CarMap.SUCCESS:
+            car.move()
+            if car.isArrived():
+                self.cm.remove(i)
+                self.carCnt -= 1
+                self.changed = True
+        elif self.sleeping:
+            self.sleep(i, state)
+
+
+class Trajectory(object):
+    """
+    Snapshots of one evaluation, taken every `every` ticks. Past `capacity`
+    snapshots every other one is dropped and the interval doubles, so a long
+    run keeps at most `capacity` of them, spread over all of it.
+    """
+
+    def __init__(self, every, capacity, snapshots=()):
+        self.every = every
+        self.capacity = capacity
+        self.snapshots = list(snapshots)
+
+    def add(self, snapshot):
+        self.snapshots.append(snapshot)
+        if len(self.snapshots) > self.capacity:
+            self.every *= 2
+            self.snapshots = [s for s in self.snapshots if s[0] % self.every == 0]
+
+    def before(self, tick):
+        """The latest snapshot taken before `tick`, or None."""
+        for snapshot in reversed(self.snapshots):
+            if snapshot[0] < tick:
+                return snapshot
+        return None
+
+    def prefix(self, tick):
+        """A new trajectory sharing the snapshots up to `tick`."""
+        return Trajectory(self.every, self.capacity, [s for s in self.snapshots if s[0] <= tick])
+
+
+class Scenario(object):
+    """
+    A map and a set of cars prepared once and evaluated against many genes.
+
+    Routes and the initial occupancy are computed a single time; before each
+    evaluation the cars are put back on their start cells in O(cars) instead
+    of building a new Simulation.
+
+    With `snapshotEvery`, every evaluation keeps a Trajectory of snapshots.
+    A gene whose lights agree with an evaluated gene up to some tick starts
+    from the latest snapshot before it, as the cars moved the same way until
+    then. `keep` chooses the trajectories worth keeping, e.g. the parents of
+    the next generation; at most `snapshotGenes` are kept in any case.
+    """
+
+    def __init__(self, carMap, startEndList, router=None, controller=None, metrics=None, routes=None,
+                 snapshotEvery=None, snapshotLimit=32, snapshotGenes=64):
+        """
+        - `controller`: optional callable (carMap, gene) returning the light
+          controller to use, e.g. `controller.ActuatedController`; by default
+          the gene's fixed cycles are used.
+        - `metrics`: optional `metrics.RoadMetrics`, holding the samples of the
+          latest evaluation.
+        - `routes`: an optional prepared `RouteTable`.
+        - `snapshotEvery`, `snapshotLimit`: the interval and the number of
+          snapshots of a Trajectory; only for fixed cycles without a router
+          or metrics, whose state is not in a snapshot.
+        """
+        if snapshotEvery is not None and (router is not None or controller is not None or metrics is not None):
+            raise Exception('Snapshots need fixed light cycles without a router or metrics.')
+        self.cm = carMap
+        self.controller = controller
+        self.sim = Simulation(startEndList, carMap, router, metrics, routes)
+        self.startCars = [(c.pos, c.way, c.roadIndex) for c in carMap.cars]
+        self.startRoutes = [(c.cursor, c.last, c.stepLeft, c.remaining, c.finalRemaining) for c in self.sim.cars]
+        self.routeLength = len(self.sim.routes.roads)
+        self.dirty = False
+        self.snapshotEvery = snapshotEvery
+        self.snapshotLimit = snapshotLimit
+        self.snapshotGenes = snapshotGenes
+        self.trajectories = {}
+        self.resumedTicks = 0
+        self.simulatedTicks = 0
+
+    def reset(self):
+        """Put every car back where it started."""
+        cm = self.cm
+        sim = self.sim
+        for car in cm.cars:
+            if car.display:
+                r, i = car.roadIndex
+                cm.data[r][i] = None
+                cm.occupancy[r] -= 1
+        for car, (pos, way, roadIndex), simCar, route in zip(cm.cars, self.startCars, sim.cars, self.startRoutes):
+            car.pos = pos
+            car.way = way
+            car.roadIndex = roadIndex
+            car.display = True
+            r, i = roadIndex
+            cm.data[r][i] = car
+            cm.occupancy[r] += 1
+            simCar.setRoute(*route)
+            simCar.timeStamp = 0
+        cm.countDetectors()
+
+        if sim.router is not None:
+            # Routes appended by rerouting are dropped.
+            sim.routes.truncate(self.routeLength)
+            sim.router.reset()
+        if sim.metrics is not None:
+            sim.metrics.reset()
+        sim.carCnt = sim.carN
+        sim.tick = 0
+        sim.resetActive()
+        self.dirty = False
+
+    def evaluate(self, gene, limit=10000, parents=None):
+        """
+        Simulate the cars under `gene` from their start state.
+        Returns (total, average) like `Simulation.run`, or (-1, -1) on timeout.
+        - `parents`: the gene strings `gene` was bred from; with snapshots,
+          only their trajectories are searched for a state to resume from
+          instead of every one kept.
+        """
+        geneInfo = GeneInfo(gene)
+        if self.snapshotEvery is None:
+            if self.dirty:
+                self.reset()
+            finished = self.runFrom(geneInfo, gene, limit)
+        else:
+            snapshot, trajectory = self.resumePoint(geneInfo, limit, parents)
+            if snapshot is not None:
+                self.sim.restore(snapshot)
+                self.resumedTicks += snapshot[0]
+            elif self.dirty:
+                self.reset()
+            self.trajectories.pop(gene.geneStr, None)
+            self.trajectories[gene.geneStr] = (geneInfo, trajectory)
+            while len(self.trajectories) > self.snapshotGenes:
+                del self.trajectories[next(iter(self.trajectories))]
+            finished = self.runFrom(geneInfo, gene, limit, trajectory)
+        if not finished:
+            return (-1, -1)
+        return self.sim.totalTime()
+
+    def runFrom(self, geneInfo, gene, limit, trajectory=None):
+        """Run `gene` from the current state, adding a snapshot to `trajectory` every `every` ticks."""
+        self.dirty = True
+        self.cm.updateGeneInfo(geneInfo)
+        if self.controller is not None:
+            self.cm.setController(self.controller(self.cm, gene))
+        sim = self.sim
+        startTick = sim.tick
+        if trajectory is None:
+            finished = sim.runTicks(False, limit)
+        else:
+            finished = True
+            while sim.carCnt:
+                if sim.tick > limit:
+                    finished = False
+                    break
+                sim.step()
+                if sim.tick % trajectory.every == 0:
+                    trajectory.add(sim.capture())
+        self.simulatedTicks += sim.tick - startTick
+        return finished
+
+    def race(self, geneInfo, gene, until, snapshot=None):
+        """
+        Run `gene` from `snapshot`, or from the start, up to tick `until`.
+        Returns (total, finished, snapshot): the total travel time once every
+        car arrived, else a lower bound of it, counting each car still
+        driving as arriving after its remaining cells, and the state to go on
+        from.
+        """
+        if snapshot is not None:
+            self.sim.restore(snapshot)
+        elif self.dirty:
+            self.reset()
+        sim = self.sim
+        if self.runFrom(geneInfo, gene, until):
+            return sim.totalTime()[0], True, None
+        tick = sim.tick
+        total = sum(car.timeStamp if car.isArrived() else tick + car.stepLeft for car in sim.cars)
+        return total, False, sim.capture()
+
+    def resumePoint(self, geneInfo, limit, parents=None):
+        """
+        The latest snapshot the gene of `geneInfo` can start from, or None,
+        and a new Trajectory holding the snapshots before it.
+        """
+        if parents is None:
+            candidates = self.trajectories.values()
+        else:
+            candidates = [self.trajectories[p] for p in parents if p in self.trajectories]
+        best, source = None, None
+        for (other, trajectory) in candidates:
+            if not trajectory.snapshots or (best is not None and trajectory.snapshots[-1][0] <= best[0]):
+                continue
+            snapshot = trajectory.before(other.firstDifference(geneInfo, limit, best[0] if best else 0))
+            if snapshot is not None and (best is None or snapshot[0] > best[0]):
+                best, source = snapshot, trajectory
+        if best is None:
+            return None, Trajectory(self.snapshotEvery, self.snapshotLimit)
+        return best, source.prefix(best[0])
+
+    def keep(self, geneStrs):
+        """Forget the trajectories of every gene but those of `geneStrs`."""
+        geneStrs = set(geneStrs)
+        self.trajectories = dict((k, v) for k, v in self.trajectories.items() if k in geneStrs)
+
+
+if __name__ == '__main__':
+    # Run the simulation with a simple car route
+    Simulation([((7, 4), (10, 4))], CarMap('face')).run()
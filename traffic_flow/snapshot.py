@@ -0,0 +1,121 @@
+# snapshot.py
+
+import threading
+from array import array
+from time import monotonic, sleep
+
+WAYS = 'NESW'
+
+
+class Snapshot(object):
+    """
+    The state of a simulation after one tick, never changed once published.
+    - `cars`: x, y and direction (index into WAYS) of every car still driving,
+      flattened into one integer array.
+    - `lights`: one byte per traffic light of `CarMap.trafficlights`, 1 if green.
+    """
+
+    __slots__ = ('tick', 'cars', 'lights')
+
+    def __init__(self, tick, cars, lights):
+        self.tick = tick
+        self.cars = cars
+        self.lights = lights
+
+    def carStates(self):
+        """(x, y, way) of every car."""
+        cars = self.cars
+        for k in range(0, len(cars), 3):
+            yield cars[k], cars[k + 1], WAYS[cars[k + 2]]
+
+    @classmethod
+    def capture(cls, tick, carMap):
+        cars = array('i')
+        for car in carMap.cars:
+            if car.display:
+                x, y = car.pos
+                cars.extend((x, y, WAYS.index(car.way)))
+        greens = carMap.greens
+        lights = bytes((greens >> tl.number) & 1 for tl in carMap.trafficlights)
+        return cls(tick, cars, lights)
+
+
+class SnapshotBuffer(object):
+    """
+    A double buffer of snapshots between the simulation thread and the UI:
+    the simulation builds the next snapshot while the UI draws the current one.
+
+    A snapshot is captured only when the previous one has been read, so the
+    simulation does no extra work while the UI is between frames. The reader
+    always gets the newest complete snapshot; since snapshots are immutable and
+    swapped under a lock, it never sees a half-updated tick.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.front = None
+        self.wanted = True
+        self.done = False
+        self.result = None
+
+    def offer(self, tick, carMap):
+        """Called by the simulation after every tick."""
+        if not self.wanted:
+            return
+        snapshot = Snapshot.capture(tick, carMap)
+        with self.lock:
+            self.front = snapshot
+            self.wanted = False
+
+    def latest(self):
+        """The newest snapshot (None before the first tick); asks for a new one."""
+        with self.lock:
+            self.wanted = True
+            return self.front
+
+    def finish(self, result):
+        self.result = result
+        self.done = True
+
+
+class SimulationThread(threading.Thread):
+    """
+    Runs a Simulation in the background and publishes its state to a
+    SnapshotBuffer.
+    - `rate`: ticks per second, or None to run as fast as possible.
+    - `onFinish`: called with the (total, average) result at the end.
+    """
+
+    def __init__(self, simulation, snapshots, limit=100000, rate=None, onFinish=None):
+        threading.Thread.__init__(self, daemon=True)
+        self.simulation = simulation
+        self.snapshots = snapshots
+        self.limit = limit
+        self.rate = rate
+        self.onFinish = onFinish
+
+    def run(self):
+        sim = self.simulation
+        snapshots = self.snapshots
+        start = monotonic()
+        firstTick = sim.tick
+        snapshots.offer(sim.tick, sim.cm)
+        while sim.carCnt and sim.tick <= self.limit:
+            if self.rate is not None:
+                wait = start + (sim.tick - firstTick) / self.rate - monotonic()
+                if wait > 0:
+                    sleep(wait)
+            sim.step()
+            snapshots.offer(sim.tick, sim.cm)
+
+        if sim.carCnt:
+            result = (-1, -1)
+        else:
+            sim.cm.clearAllCars()
+            result = sim.totalTime()
+        # Let the UI show the final state.
+        snapshots.wanted = True
+        snapshots.offer(sim.tick, sim.cm)
+        snapshots.finish(result)
+        if self.onFinish is not None:
+            self.onFinish(result)
@@ -0,0 +1,166 @@
+# sweep.py
+
+import itertools
+import os
+import random
+import sqlite3
+import sys
+from multiprocessing import Pool
+from optparse import OptionParser
+from time import time
+
+PARAMETERS = ('layout', 'cars', 'amount', 'generations', 'seed', 'reroute', 'actuated')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    layout TEXT, cars INTEGER, amount INTEGER, generations INTEGER, seed INTEGER,
+    reroute INTEGER, actuated INTEGER,
+    stop TEXT, best REAL, evaluations INTEGER, setup REAL, wall REAL, worker INTEGER, finished REAL,
+    UNIQUE (layout, cars, amount, generations, seed, reroute, actuated)
+);
+CREATE TABLE IF NOT EXISTS generations (
+    run INTEGER REFERENCES runs (id),
+    generation INTEGER,
+    best REAL, min REAL, q25 REAL, median REAL, q75 REAL, max REAL,
+    evaluations INTEGER, timeouts INTEGER, diversity REAL, stagnation INTEGER,
+    wall REAL, simulate REAL, selection REAL, elapsed REAL,
+    PRIMARY KEY (run, generation)
+);
+"""
+
+# Layouts already parsed by this worker process, by name.
+LAYOUTS = {}
+
+
+def openDatabase(filename):
+    db = sqlite3.connect(filename)
+    db.executescript(SCHEMA)
+    return db
+
+
+def grid(layouts, cars, amounts, generations, seeds, reroute=(0,), actuated=(0,)):
+    """Every combination of the parameter lists, as dicts keyed by PARAMETERS."""
+    return [dict(zip(PARAMETERS, values)) for values in
+            itertools.product(layouts, cars, amounts, generations, seeds, reroute, actuated)]
+
+
+def pending(db, combinations):
+    """The combinations without a finished run in the database."""
+    done = set(db.execute(f"SELECT {', '.join(PARAMETERS)} FROM runs"))
+    return [c for c in combinations if tuple(c[p] for p in PARAMETERS) not in done]
+
+
+def runOne(params):
+    """
+    Worker side: one GA run. The layout is parsed once per worker; cars and
+    genes are drawn from `seed`, so a combination always gives the same run.
+    """
+    from .layout import getLayout
+    from .car import CarMap
+    from .demand import Demand
+    from .generation import Generation
+    from .reroute import Router
+    from .controller import ActuatedController
+
+    startTime = time()
+    mapLayout = LAYOUTS.get(params['layout'])
+    if mapLayout is None:
+        mapLayout = getLayout(params['layout'])
+        if mapLayout is None:
+            raise Exception(f"The layout '{params['layout']}' can't be found.")
+        mapLayout.compile()
+        LAYOUTS[params['layout']] = mapLayout
+
+    random.seed(params['seed'])
+    carmap = CarMap(mapLayout, None)
+    cars = Demand(mapLayout).uniform(params['cars'])
+    router = Router(carmap) if params['reroute'] else None
+    controller = ActuatedController if params['actuated'] else None
+    records = []
+    g = Generation(mapLayout, carmap, cars, params['amount'], params['generations'], router, controller,
+                   verbose=0, telemetry=records.append)
+    setup = time() - startTime
+    g.run()
+    summary = {'stop': g.stopReason, 'best': g.best, 'evaluations': g.evaluations,
+               'setup': setup, 'wall': time() - startTime, 'worker': os.getpid()}
+    return params, summary, [r for r in records if r['event'] == 'generation']
+
+
+def store(db, params, summary, records):
+    """Write one run and its generations in a single transaction."""
+    with db:
+        cursor = db.execute(
+            f"INSERT INTO runs ({', '.join(PARAMETERS)}, stop, best, evaluations, setup, wall, worker, finished) "
+            f"VALUES ({', '.join('?' * (len(PARAMETERS) + 7))})",
+            [params[p] for p in PARAMETERS] +
+            [summary['stop'], summary['best'], summary['evaluations'], summary['setup'], summary['wall'],
+             summary['worker'], time()])
+        run = cursor.lastrowid
+        db.executemany(
+            "INSERT INTO generations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(run, r['generation'], r['best'], r['fitness']['min'], r['fitness']['q25'], r['fitness']['median'],
+              r['fitness']['q75'], r['fitness']['max'], r['evaluations'], r['timeouts'], r['diversity'],
+              r['stagnation'], r['wall'], r['simulate'], r['select'], r['elapsed']) for r in records])
+
+
+def sweep(db, combinations, workers=None, verbose=1):
+    """
+    Run the combinations missing from the database on a pool of `workers`
+    processes; each run is stored as soon as it finishes, so an interrupted
+    sweep resumes where it stopped.
+    """
+    todo = pending(db, combinations)
+    if verbose:
+        print(f'{len(combinations) - len(todo)} of {len(combinations)} runs already done, {len(todo)} to go')
+    if not todo:
+        return 0
+    startTime = time()
+    with Pool(workers) as pool:
+        for k, (params, summary, records) in enumerate(pool.imap_unordered(runOne, todo), start=1):
+            store(db, params, summary, records)
+            if verbose:
+                print(f"[{k}/{len(todo)}] {' '.join(f'{p}={params[p]}' for p in PARAMETERS)}: "
+                      f"best {summary['best']}, {summary['stop']}, {summary['wall']:.2f}s")
+    if verbose:
+        print(f'{len(todo)} runs in {time() - startTime:.2f}s')
+    return len(todo)
+
+
+def parseArgs(argv):
+    def ints(text):
+        return [int(v) for v in text.split(',')]
+
+    parser = OptionParser()
+    parser.add_option('-l', '--layouts', dest='layouts', type='str', default='single_cross')
+    parser.add_option('-n', '--numbers', dest='numbers', type='str', default='10')
+    parser.add_option('-a', '--amounts', dest='amounts', type='str', default='20')
+    parser.add_option('-g', '--generations', dest='generations', type='str', default='20')
+    parser.add_option('--seeds', dest='seeds', type='str', default='1')
+    parser.add_option('--reroute', dest='reroute', type='str', default='0')
+    parser.add_option('--actuated', dest='actuated', type='str', default='0')
+    parser.add_option('-j', '--workers', dest='workers', type='int', default=None)
+    parser.add_option('--db', dest='db', type='str', default='saved/sweep.db')
+    parser.add_option('-q', '--quiet', action='store_false', dest='verbose', default=True)
+
+    options, otherjunk = parser.parse_args(argv)
+    if otherjunk:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    combinations = grid(options.layouts.split(','), ints(options.numbers), ints(options.amounts),
+                        ints(options.generations), ints(options.seeds), ints(options.reroute), ints(options.actuated))
+    return options, combinations
+
+
+def main(argv=None):
+    """
+    > python sweep.py -l grids,complex -n 50,100 -a 10,20 -g 10 --seeds 1,2,3 -j 4
+    > sqlite3 saved/sweep.db "SELECT layout, cars, AVG(best) FROM runs GROUP BY layout, cars"
+    """
+    options, combinations = parseArgs(sys.argv[1:] if argv is None else argv)
+    db = openDatabase(options.db)
+    sweep(db, combinations, options.workers, options.verbose)
+    db.close()
+
+
+if __name__ == '__main__':
+    main()